@@ -17,8 +17,8 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
-from wok.control.base import Resource
-from wok.control.utils import UrlSubNode
+from wok.control.base import Collection, Resource
+from wok.control.utils import model_fn, UrlSubNode
 
 CIOIGNORE_REQUESTS = {
     'POST': {
@@ -37,6 +37,51 @@ class CIOIgnore(Resource):
         self.params = ['devices']
         self.remove = self.generate_action_handler_task('remove', self.params)
         self.log_map = CIOIGNORE_REQUESTS
+        self.devices = CIOIgnoreDevices(model)
+
+    @property
+    def data(self):
+        return self.info
+
+
+class CIOIgnoreDevices(Collection):
+    """
+    Collection of ranges of devices in ignore list
+    """
+    def __init__(self, model):
+        super(CIOIgnoreDevices, self).__init__(model)
+        self.admin_methods = ['GET']
+        self.role_key = "administration"
+        self.resource = CIOIgnoreDevice
+
+    def _get_resources(self, flag_filter):
+        """
+        get_list returns the info dict of each range, which is set to the
+        resource to avoid a lookup for each of them
+        """
+        try:
+            get_list = getattr(self.model, model_fn(self, 'get_list'))
+            idents = get_list(*self.model_args, **flag_filter)
+            res_list = []
+            for ident in idents:
+                args = self.resource_args + [ident['device']]
+                res = self.resource(self.model, *args)
+                res.info = ident
+                res_list.append(res)
+            return res_list
+        except AttributeError:
+            return []
+
+
+class CIOIgnoreDevice(Resource):
+    """
+    Device ID or range of device IDs queried in ignore list
+    """
+    def __init__(self, model, ident):
+        super(CIOIgnoreDevice, self).__init__(model, ident)
+        self.admin_methods = ['GET']
+        self.role_key = "administration"
+        self.uri_fmt = "/cio_ignore/devices/%s"
 
     @property
     def data(self):
@@ -17,6 +17,8 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
+import cherrypy
+
 from wok.control.base import Collection, Resource
 from wok.control.utils import model_fn, UrlSubNode
 
@@ -33,6 +35,11 @@ FCLUNS_REQUESTS = {
         'default': "GS390XSTG0004L"},
 }
 
+FCLUNSBULK_REQUESTS = {
+    'POST': {
+        'add': "GS390XSTG0006L"},
+}
+
 FCLUN_REQUESTS = {
     'DELETE': {'default': "GS390XSTG0005L"}
 }
@@ -71,6 +78,20 @@ class FCLUNs(Collection):
         self.admin_methods = ['GET', 'POST', 'DELETE']
         self.resource = FCLUN
         self.log_map = FCLUNS_REQUESTS
+        self.bulk = FCLUNsBulk(model)
+
+    def get(self, filter_params):
+        group = filter_params.pop('group', None)
+        if group is not None:
+            filter_params['_group'] = group
+        # match the fields in the model, so they are applied before the
+        # LUNs are paged
+        filters = dict((key, filter_params.pop(key))
+                       for key in filter_params.keys()
+                       if not key.startswith('_'))
+        if filters:
+            filter_params['_filters'] = filters
+        return super(FCLUNs, self).get(filter_params)
 
     def _get_resources(self, flag_filter):
         """
@@ -83,6 +104,9 @@ class FCLUNs(Collection):
         try:
             get_list = getattr(self.model, model_fn(self, 'get_list'))
             idents = get_list(*self.model_args, **flag_filter)
+            total = getattr(idents, 'total', None)
+            if total is not None:
+                cherrypy.response.headers['X-Total-Count'] = str(total)
             res_list = []
             for ident in idents:
                 # internal text, get_list changes ident to unicode for sorted
@@ -95,6 +119,24 @@ class FCLUNs(Collection):
             return []
 
 
+class FCLUNsBulk(Resource):
+    """
+    Resource for adding multiple FC LUNs at once
+    """
+
+    def __init__(self, model):
+        super(FCLUNsBulk, self).__init__(model)
+        self.role_key = 'host'
+        self.admin_methods = ['GET', 'POST']
+        self.uri_fmt = "/fcluns/bulk/%s"
+        self.add = self.generate_action_handler_task('add', ['luns'])
+        self.log_map = FCLUNSBULK_REQUESTS
+
+    @property
+    def data(self):
+        return self.info
+
+
 class FCLUN(Resource):
     """
     Resource representing a single LUN
@@ -106,6 +148,23 @@ class FCLUN(Resource):
         self.admin_methods = ['GET', 'POST', 'DELETE']
         self.uri_fmt = "/fcluns/%s"
         self.log_map = FCLUN_REQUESTS
+        self.paths = FCLUNPaths(model, ident)
+
+    @property
+    def data(self):
+        return self.info
+
+
+class FCLUNPaths(Resource):
+    """
+    Resource representing the paths to the disk of a LUN
+    """
+
+    def __init__(self, model, ident):
+        super(FCLUNPaths, self).__init__(model, ident)
+        self.role_key = 'host'
+        self.admin_methods = ['GET']
+        self.uri_fmt = "/fcluns/%s/paths"
 
     @property
     def data(self):
@@ -0,0 +1,42 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM Corp, 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import cherrypy
+
+from wok.control.base import Resource
+from wok.control.utils import model_fn, UrlSubNode
+
+
+@UrlSubNode("metrics")
+class Metrics(Resource):
+    """
+    Resource exposing the plugin metrics in the Prometheus text format
+    """
+
+    def __init__(self, model):
+        super(Metrics, self).__init__(model)
+        self.role_key = 'administration'
+        self.admin_methods = ['GET']
+
+    def get(self):
+        # text exposition format instead of JSON, as scraped by Prometheus
+        lookup = getattr(self.model, model_fn(self, 'lookup'))
+        cherrypy.response.headers['Content-Type'] = \
+            'text/plain; version=0.0.4; charset=utf-8'
+        return lookup(*self.model_args)
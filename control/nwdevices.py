@@ -17,6 +17,8 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
+import cherrypy
+
 from wok.control.base import Collection, Resource
 from wok.control.utils import model_fn, UrlSubNode
 
@@ -29,6 +31,13 @@ NWDEVICE_REQUESTS = {
     }
 }
 
+NWDEVICESBULK_REQUESTS = {
+    'POST': {
+        'configure': "GS390XIONW0004L",
+        'unconfigure': "GS390XIONW0005L",
+    }
+}
+
 
 @UrlSubNode('nwdevices', True)
 class NetworkDevices(Collection):
@@ -37,11 +46,25 @@ class NetworkDevices(Collection):
         self.role_key = 'administration'
         self.admin_methods = ['GET']
         self.resource = NetworkDevice
+        self.bulk = NetworkDevicesBulk(model)
+
+    def get(self, filter_params):
+        # match the fields in the model, so they are applied before the
+        # devices are paged
+        filters = dict((key, filter_params.pop(key))
+                       for key in filter_params.keys()
+                       if not key.startswith('_'))
+        if filters:
+            filter_params['_filters'] = filters
+        return super(NetworkDevices, self).get(filter_params)
 
     def _get_resources(self, flag_filter):
         try:
             get_list = getattr(self.model, model_fn(self, 'get_list'))
             idents = get_list(*self.model_args, **flag_filter)
+            total = getattr(idents, 'total', None)
+            if total is not None:
+                cherrypy.response.headers['X-Total-Count'] = str(total)
             res_list = []
             for ident in idents:
                 args = self.resource_args + [ident]
@@ -73,3 +96,26 @@ class NetworkDevice(Resource):
     @property
     def data(self):
         return self.info
+
+
+class NetworkDevicesBulk(Resource):
+    """
+    Resource for actions on multiple network devices at once
+    """
+    def __init__(self, model):
+        super(NetworkDevicesBulk, self).__init__(model)
+        self.role_key = 'administration'
+        self.admin_methods = ['GET', 'POST']
+        self.uri_fmt = '/nwdevices/bulk/%s'
+        self.configure = self.generate_action_handler_task(
+            'configure', ['devices', 'osa_portno'])
+        self.unconfigure = self.generate_action_handler_task(
+            'unconfigure', ['devices'])
+
+        # set user log messages and make sure all parameters are present
+        self.log_map = NWDEVICESBULK_REQUESTS
+        self.log_args.update({'osa_portno': ''})
+
+    @property
+    def data(self):
+        return self.info
@@ -17,6 +17,8 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
+import cherrypy
+
 from wok.control.base import Collection, Resource
 from wok.control.utils import model_fn, UrlSubNode
 
@@ -28,6 +30,13 @@ STORAGEDEVICE_REQUESTS = {
     }
 }
 
+STORAGEDEVICESBULK_REQUESTS = {
+    'POST': {
+        'online': "GS390XIOST0003L",
+        'offline': "GS390XIOST0004L",
+    }
+}
+
 
 @UrlSubNode('storagedevices', True)
 class StorageDevices(Collection):
@@ -40,6 +49,17 @@ class StorageDevices(Collection):
         self.role_key = 'administration'
         self.admin_methods = ['GET']
         self.resource = StorageDevice
+        self.bulk = StorageDevicesBulk(model)
+
+    def get(self, filter_params):
+        # match the fields in the model, so they are applied before the
+        # devices are paged
+        filters = dict((key, filter_params.pop(key))
+                       for key in filter_params.keys()
+                       if not key.startswith('_'))
+        if filters:
+            filter_params['_filters'] = filters
+        return super(StorageDevices, self).get(filter_params)
 
     def _get_resources(self, flag_filter):
         """
@@ -52,6 +72,9 @@ class StorageDevices(Collection):
         try:
             get_list = getattr(self.model, model_fn(self, 'get_list'))
             idents = get_list(*self.model_args, **flag_filter)
+            total = getattr(idents, 'total', None)
+            if total is not None:
+                cherrypy.response.headers['X-Total-Count'] = str(total)
             res_list = []
             for ident in idents:
                 # internal text, get_list changes ident to unicode for sorted
@@ -84,3 +107,23 @@ class StorageDevice(Resource):
         :return: dict of containing device info
         """
         return self.info
+
+
+class StorageDevicesBulk(Resource):
+    """
+    Resource for actions on multiple storage devices at once
+    """
+    def __init__(self, model):
+        super(StorageDevicesBulk, self).__init__(model)
+        self.role_key = 'administration'
+        self.admin_methods = ['GET', 'POST']
+        self.uri_fmt = "/storagedevices/bulk/%s"
+        self.online = self.generate_action_handler_task('online',
+                                                        ['devices'])
+        self.offline = self.generate_action_handler_task('offline',
+                                                         ['devices'])
+        self.log_map = STORAGEDEVICESBULK_REQUESTS
+
+    @property
+    def data(self):
+        return self.info
@@ -17,12 +17,19 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
-from wok.control.base import SimpleCollection
-from wok.control.utils import UrlSubNode
+import cherrypy
+import hashlib
+import json
+
+from cherrypy.lib import cptools
+from wok import template
+from wok.control.base import Collection, Resource
+from wok.control.utils import get_class_name, model_fn, UrlSubNode
+from wok.exception import UnauthorizedError
 
 
 @UrlSubNode("lstapes")
-class TapeDevs(SimpleCollection):
+class TapeDevs(Collection):
     """
     Collections representing the Tape devices on the system
     """
@@ -31,3 +38,51 @@ class TapeDevs(SimpleCollection):
         super(TapeDevs, self).__init__(model)
         self.role_key = 'host'
         self.admin_methods = ['GET']
+        self.resource = TapeDev
+
+    def _get_resources(self, flag_filter):
+        """
+        get_list returns the info dict of each tape device, which is set to
+        the resource to avoid a lookup for each of them
+        """
+        try:
+            get_list = getattr(self.model, model_fn(self, 'get_list'))
+            idents = get_list(*self.model_args, **flag_filter)
+            res_list = []
+            for ident in idents:
+                args = self.resource_args + [ident['Generic']]
+                res = self.resource(self.model, *args)
+                res.info = ident
+                res_list.append(res)
+            return res_list
+        except AttributeError:
+            return []
+
+
+class TapeDev(Resource):
+    """
+    Resource representing a single tape device
+    """
+
+    def __init__(self, model, ident):
+        super(TapeDev, self).__init__(model, ident)
+        self.role_key = 'host'
+        self.admin_methods = ['GET']
+        self.uri_fmt = "/lstapes/%s"
+
+    def get(self):
+        # answer 304 Not Modified to authorized pollers sending the ETag of
+        # the attributes they already have in If-None-Match
+        self.lookup()
+        if not self.is_authorized():
+            raise UnauthorizedError('WOKAPI0009E')
+
+        data = self.data
+        etag = hashlib.md5(json.dumps(data, sort_keys=True)).hexdigest()
+        cherrypy.response.headers['ETag'] = '"%s"' % etag
+        cptools.validate_etags()
+        return template.render(get_class_name(self), data)
+
+    @property
+    def data(self):
+        return self.info
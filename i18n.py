@@ -35,6 +35,7 @@ messages = {
     "GS390XIOST004E": _("Failed to bring device %(device)s offline. Error = %(error)s"),
     "GS390XIOST005E": _("Failed to add zfcp device in zfcp.conf file. Device = %(device)s"),
     "GS390XIOST006E": _("Failed to remove device from zfcp.conf file. Device = %(device)s"),
+    "GS390XIOST007E": _("Devices must be a non-empty list of device IDs or ranges of device IDs"),
 
     "GS390XIONW001E": _("Failed to bring network device %(device)s online. Error = %(error)s"),
     "GS390XIONW002E": _("Failed to persist network device %(device)s in "
@@ -49,6 +50,11 @@ messages = {
     "GS390XIONW008E": _("Failed to configure osa port for OSA Express network card '%(device)s. Error: %(error)s' "),
     "GS390XIONW009E": _("Invalid OSA port number. OSA port number should be integer - either 0 or 1 "),
     "GS390XIONW010E": _("OSA port '%(osa_portno)s' is not available for OSA Express card '%(interface)s'"),
+    "GS390XIONW011E": _("Devices must be a non-empty list of network device IDs or interface names"),
+    "GS390XIONW012E": _("Failed to configure network devices %(device)s, configured devices: %(done)s. "
+                        "Error = %(error)s"),
+    "GS390XIONW013E": _("Failed to un-configure network devices %(device)s, un-configured devices: "
+                        "%(done)s. Error = %(error)s"),
 
     "GS390XIOIG001E": _("Failed to retrieve devices in ignored list = %(error)s"),
     "GS390XIOIG002E": _("Failed to remove devices from ignore list. "
@@ -75,6 +81,10 @@ messages = {
     "GS390XSTG00021": _("Unable to get sg dev for discovery lun, %(err)s"),
     "GS390XSTG00022": _("Invalid lun path provided"),
     "GS390XSTG00023": _("Storage device %(device)s not found"),
+    "GS390XSTG00024": _("LUNs must be a non empty list of objects with hbaId, remoteWwpn and lunId"),
+    "GS390XSTG00025": _("Failed to add %(count)s LUNs, %(err)s"),
+    "GS390XSTG00026": _("Invalid LUN grouping %(group)s, only 'multipath' is supported"),
+    "GS390XSTG00027": _("Tape device %(device)s not found"),
 
     # These messages (ending with L) are for user log purposes
     "GS390XIOIG0001L": _("Remove i/o devices '%(devices)s' from ignore list"),
@@ -82,12 +92,17 @@ messages = {
     "GS390XIONW0001L": _("Configure network i/o device '%(ident)s' with osa port '%(osa_portno)s'"),
     "GS390XIONW0002L": _("Un-configure network i/o device '%(ident)s'"),
     "GS390XIONW0003L": _("Update action for network i/o device '%(ident)s'"),
+    "GS390XIONW0004L": _("Configure network i/o devices '%(devices)s' with osa port '%(osa_portno)s'"),
+    "GS390XIONW0005L": _("Un-configure network i/o devices '%(devices)s'"),
 
     "GS390XIOST0001L": _("Bring storage i/o device '%(ident)s' online"),
     "GS390XIOST0002L": _("Bring storage i/o device '%(ident)s' offline"),
+    "GS390XIOST0003L": _("Bring storage i/o devices '%(devices)s' online"),
+    "GS390XIOST0004L": _("Bring storage i/o devices '%(devices)s' offline"),
     "GS390XSTG0001L": _("Enable lun scan"),
     "GS390XSTG0002L": _("Disable lun scan"),
     "GS390XSTG0003L": _("Trigger lun scan"),
     "GS390XSTG0004L": _("Add lun '%(hbaId)s' : '%(remoteWwpn)s': '%(lunId)s'"),
     "GS390XSTG0005L": _("Remove lun '%(ident)s'"),
+    "GS390XSTG0006L": _("Add luns '%(luns)s'"),
 }
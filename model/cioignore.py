@@ -18,13 +18,26 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
-from wok.asynctask import AsyncTask
+import bisect
+import re
+import threading
+import time
+
+from executor import run_command
+from metrics import AsyncTask
+from model_utils import single_flight
 from wok.exception import InvalidParameter, OperationFailed
 from wok.model.tasks import TaskModel
-from wok.utils import run_command, wok_log
+from wok.utils import wok_log
 
 CIO_IGNORE = "cio_ignore"
 IGNORED_DEVICES = 'ignored_devices'
+# maximum number of device ids or ranges passed to a single cio_ignore -r
+CIO_IGNORE_BATCH_SIZE = 64
+DEVICE_ID_PATTERN = r'^(?:([0-9a-fA-F])\.([0-3])\.)?(?:0x)?([0-9a-fA-F]{1,4})$'
+# seconds after which the ignore list is read again even if it was not
+# changed through this plugin
+CIO_IGNORE_CACHE_TTL = 30
 
 
 class CIOIgnoreModel(object):
@@ -36,23 +49,19 @@ class CIOIgnoreModel(object):
         self.objstore = kargs.get('objstore')
         self.task = TaskModel(**kargs)
 
+    @single_flight
     def lookup(self, name):
         """
         method to retrieve device IDs in ignore list
         :return: returns dictionary with key as 'ignored_devices
                 and value as list of device ids(single device id
-                or range of device ids)
+                or range of device ids) and key as 'count' and value
+                as number of devices in ignore list
         """
-        devices = {}
-        command = [CIO_IGNORE, '-l']
-        out, err, rc = run_command(command)
-        if rc:
-            wok_log.error('failed to retrieve ignore list '
-                          'using \'cio_ignore -l\'. Error: %s' % err.strip())
-            raise OperationFailed('GS390XIOIG001E', {'error': err.strip()})
-        devices[IGNORED_DEVICES] = _parse_ignore_output(out)
+        ignore_list = ignore_list_cache.get()
         wok_log.info('Successfully retrieved devices from ignore list')
-        return devices
+        return {IGNORED_DEVICES: list(ignore_list.entries),
+                'count': ignore_list.count()}
 
     def remove(self, name, devices):
         """
@@ -73,9 +82,174 @@ class CIOIgnoreModel(object):
         return self.task.lookup(taskid)
 
 
+class CIOIgnoreDevicesModel(object):
+    """
+    model class for devices in ignore list
+    """
+
+    def __init__(self, **kargs):
+        pass
+
+    def get_list(self):
+        """
+        :return: list of info of the merged ranges of ignored devices,
+                 in the format of CIOIgnoreDeviceModel.lookup()
+        """
+        devices = []
+        for device_range in ignore_list_cache.get().ranges:
+            device = _format_device_range(device_range)
+            devices.append({'device': device, 'ignored': True,
+                            'ignored_devices': [device],
+                            'count': _range_size(device_range)})
+        return devices
+
+
+class CIOIgnoreDeviceModel(object):
+    """
+    model class for the part of ignore list within a device ID or
+    a range of device IDs
+    """
+
+    def __init__(self, **kargs):
+        pass
+
+    def lookup(self, device):
+        """
+        :param device: device ID or range of device IDs
+        :return: dictionary with the device ID or range, whether all its
+                 devices are ignored, the ranges of ignored devices within
+                 it and the number of ignored devices within it
+        """
+        first, last = _validate_device_range(device)
+        ranges = ignore_list_cache.get().intersection(first, last)
+        count = sum(_range_size(r) for r in ranges)
+        return {'device': _format_device_range((first, last)),
+                'ignored': count == _range_size((first, last)),
+                'ignored_devices': [_format_device_range(r) for r in ranges],
+                'count': count}
+
+
+class IgnoreList(object):
+    """
+    Ignore list parsed into a sorted list of disjoint ranges of
+    (cssid, ssid, devno) tuples, answering queries by binary search
+    """
+
+    def __init__(self, entries):
+        """
+        :param entries: device IDs and ranges as listed by cio_ignore -l
+        """
+        self.entries = entries
+        ranges = []
+        for entry in entries:
+            device_range = _parse_device_range(str(entry))
+            if device_range:
+                ranges.append(device_range)
+            else:
+                wok_log.error('Unable to parse ignore list entry %s' % entry)
+        self.ranges = _merge_ranges(ranges)
+        self._firsts = [first for first, last in self.ranges]
+        self._counts = [0]
+        for device_range in self.ranges:
+            self._counts.append(self._counts[-1] + _range_size(device_range))
+
+    def intersection(self, first, last):
+        """
+        :return: ranges of ignored devices between first and last device
+        """
+        index = max(bisect.bisect_right(self._firsts, first) - 1, 0)
+        ranges = []
+        for range_first, range_last in self.ranges[index:]:
+            if range_first > last:
+                break
+            if range_last >= first:
+                ranges.append((max(range_first, first),
+                               min(range_last, last)))
+        return ranges
+
+    def count(self):
+        """
+        :return: number of ignored devices
+        """
+        return self._counts[-1]
+
+
+class IgnoreListCache(object):
+    """
+    Ignore list read by cio_ignore -l, kept until the ignore list is
+    changed through this plugin or CIO_IGNORE_CACHE_TTL expires
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def get(self):
+        with self._lock:
+            if self._entry is not None:
+                timestamp, ignore_list = self._entry
+                if time.time() - timestamp < CIO_IGNORE_CACHE_TTL:
+                    return ignore_list
+            ignore_list = IgnoreList(_get_ignore_list())
+            self._entry = (time.time(), ignore_list)
+            return ignore_list
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+
+
+# shared by all the models reading the ignore list
+ignore_list_cache = IgnoreListCache()
+
+
+def invalidate_ignore_list():
+    ignore_list_cache.invalidate()
+
+
+def _get_ignore_list():
+    """
+    :return: list of device IDs and ranges in ignore list
+    """
+    command = [CIO_IGNORE, '-l']
+    out, err, rc = run_command(command)
+    if rc:
+        wok_log.error('failed to retrieve ignore list '
+                      'using \'cio_ignore -l\'. Error: %s' % err.strip())
+        raise OperationFailed('GS390XIOIG001E', {'error': err.strip()})
+    return _parse_ignore_output(out)
+
+
+def _validate_device_range(device):
+    """
+    :param device: device ID or range of device IDs
+    :return: first and last device as returned by _parse_device_range()
+    """
+    if isinstance(device, unicode):
+        device = device.encode('utf-8')
+    device = str(device).replace(' ', '')
+    device_range = _parse_device_range(device)
+    if device_range is None:
+        wok_log.error("Invalid device id. Device: %s" % device)
+        raise InvalidParameter("GS390XINVINPUT",
+                               {'reason': 'invalid device id: %s' % device})
+    return device_range
+
+
+def _range_size(device_range):
+    return device_range[1][2] - device_range[0][2] + 1
+
+
 def _remove_devices(cb, devices):
     """
     Remove one or more device IDs from blacklist.
+    Device IDs and ranges are merged into minimal ranges which are
+    removed with as few cio_ignore calls as possible. If a call fails,
+    its ranges are removed one by one to find the failing ones, and the
+    device IDs and ranges given within a failing range are removed one
+    by one, failures being reported with the devices as given.
+    Entries which are not device IDs or ranges of device IDs are passed
+    to cio_ignore as they are, one by one.
     :param devices: List of devices IDs. It can have range of device IDs
                     Ex: ['0.0.0120', '0.0.1230-0.0.1300', '0.0.001']
                     device ID format:
@@ -91,24 +265,52 @@ def _remove_devices(cb, devices):
         failed_devices = {}
         devices = [x.encode('utf-8') if isinstance(x, unicode)
                    else str(x) for x in devices]
+        ranges = []
+        others = []
         for device in devices:
             if device and not device.isspace():
+                entry = device
                 if '-' in device:
                     # if range, remove space if any before or after '-'
                     device = device.replace(' ', '')
-                command = [CIO_IGNORE, '-r', device]
-                out, err, rc = run_command(command)
-                if rc:
-                    wok_log.error('failed to remove device(s): %s, from'
-                                  ' ignore list. Error: %s'
-                                  % (device, err.strip()))
-                    err = err.strip().split(':')[-1].strip()
-                    failed_devices[device] = err
+                device_range = _parse_device_range(device)
+                if device_range:
+                    ranges.append((device_range, entry))
+                else:
+                    others.append(device)
             else:
                 failed_devices[device] = 'device ID is required'
                 wok_log.error('failed to remove device since'
                               ' device id is empty')
 
+        # device IDs and ranges given by the caller within each merged
+        # range, to attribute the failure of a range to them
+        merged = _merge_ranges([parsed for parsed, _ in ranges])
+        entries = dict((_format_device_range(r), []) for r in merged)
+        firsts = [first for first, last in merged]
+        for device_range, device in sorted(set(ranges)):
+            index = bisect.bisect_right(firsts, device_range[0]) - 1
+            entries[_format_device_range(merged[index])].append(
+                (device, device_range))
+
+        batches = [[other] for other in others]
+        merged = [_format_device_range(r) for r in merged]
+        batches.extend(merged[i:i + CIO_IGNORE_BATCH_SIZE]
+                       for i in range(0, len(merged), CIO_IGNORE_BATCH_SIZE))
+        done = 0
+        for batch in batches:
+            err = _run_cio_ignore_remove(batch)
+            if err is not None:
+                for device in batch:
+                    if len(batch) > 1:
+                        err = _run_cio_ignore_remove([device])
+                    if err is not None:
+                        failed_devices.update(_get_failed_entries(
+                            device, err, entries.get(device)))
+            done += len(batch)
+            cb('Removed %d of %d device IDs or ranges from ignore list'
+               % (done, len(others) + len(merged)))
+
         if failed_devices:
             # to handle unicode charater
             str_failed_devices = ', '.join('%s: %s' % (device, err)
@@ -125,6 +327,106 @@ def _remove_devices(cb, devices):
            ' list' % str_devices, True)
     except Exception as e:
         cb(e.message, False)
+    finally:
+        invalidate_ignore_list()
+
+
+def _get_failed_entries(device, err, entries):
+    """
+    Find the device IDs and ranges given by the caller which failed to be
+    removed when the removal of a merged range failed
+    :param device: merged range, or entry which is not a device ID
+    :param err: error of the removal of device
+    :param entries: list of (device ID or range given by the caller,
+                    parsed range) tuples within the merged range, None if
+                    device is not a merged range
+    :return: dictionary of the errors of the failed entries
+    """
+    if entries is None:
+        return {device: err}
+    if len(entries) == 1:
+        return {entries[0][0]: err}
+    failed = {}
+    for entry, device_range in entries:
+        err = _run_cio_ignore_remove([_format_device_range(device_range)])
+        if err is not None:
+            failed[entry] = err
+    return failed
+
+
+def _run_cio_ignore_remove(devices):
+    """
+    Run cio_ignore -r for a list of device IDs or ranges
+    :param devices: list of device IDs or ranges
+    :return: None on success, otherwise the error reported by cio_ignore
+    """
+    command = [CIO_IGNORE, '-r', ','.join(devices)]
+    out, err, rc = run_command(command)
+    if rc:
+        wok_log.error('failed to remove device(s): %s, from'
+                      ' ignore list. Error: %s'
+                      % (command[2], err.strip()))
+        return err.strip().split(':')[-1].strip()
+    return None
+
+
+def _parse_device_id(device):
+    """
+    Parse a device ID in one of the formats accepted by cio_ignore
+    :param device: device ID. Ex: "0.0.0190", "190", "0x190" or "0190"
+    :return: tuple (cssid, ssid, devno) or None if device is not
+             a device ID
+    """
+    match = re.match(DEVICE_ID_PATTERN, device.strip())
+    if match is None:
+        return None
+    cssid, ssid, devno = match.groups()
+    return int(cssid or '0', 16), int(ssid or '0'), int(devno, 16)
+
+
+def _parse_device_range(device):
+    """
+    Parse a device ID or a range of device IDs
+    :param device: device ID or range. Ex: "0.0.0190" or "190-0x1a0"
+    :return: tuple of first and last device as returned by
+             _parse_device_id() or None if device is not a device ID or
+             a valid range
+    """
+    first, sep, last = device.partition('-')
+    first = _parse_device_id(first)
+    last = _parse_device_id(last) if sep else first
+    if first is None or last is None or first[:2] != last[:2] or \
+            first > last:
+        return None
+    return first, last
+
+
+def _merge_ranges(ranges):
+    """
+    Merge overlapping and adjacent ranges of device IDs
+    :param ranges: list of ranges as returned by _parse_device_range()
+    :return: sorted list of disjoint ranges
+    """
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and merged[-1][1][:2] == first[:2] and \
+                first[2] <= merged[-1][1][2] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def _format_device_id(device):
+    return '%x.%x.%04x' % device
+
+
+def _format_device_range(device_range):
+    first, last = device_range
+    if first == last:
+        return _format_device_id(first)
+    return _format_device_id(first) + '-' + _format_device_id(last)
 
 
 def _parse_ignore_output(cmd_out):
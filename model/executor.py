@@ -0,0 +1,179 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM Corp, 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import os
+import threading
+import time
+
+from metrics import MetricsRegistry, registry
+from model_utils import SingleFlight
+from wok.exception import TimeoutExpired
+from wok.utils import run_command as _run_command, wok_log
+
+
+# exit code returned for a command killed on timeout, as by timeout(1)
+COMMAND_TIMEOUT_RC = 124
+DEFAULT_COMMAND_TIMEOUT = 120
+DEFAULT_COMMAND_CONCURRENCY = 4
+# timeout in seconds and maximum number of concurrent executions by tool
+COMMAND_POLICIES = {
+    'lscss': (60, 2),
+    'znetconf': (60, 2),
+    'lszfcp': (60, 2),
+    'sg_luns': (30, 8),
+    'sg_inq': (30, 8),
+    'cio_ignore': (60, 2),
+    'chccwdev': (300, 4),
+    'multipath': (60, 1),
+    'udevadm': (180, 8),
+    'zipl': (300, 1),
+    'rescan-scsi-bus.sh': (600, 1)}
+# commands which only read the system state, identical invocations of
+# these running at the same time share a single execution
+READ_ONLY_COMMANDS = [
+    ['lscss'],
+    ['znetconf', '-c'],
+    ['znetconf', '-u'],
+    ['lszfcp'],
+    ['sg_luns'],
+    ['sg_inq'],
+    ['cio_ignore', '-l'],
+    ['udevadm', 'settle']]
+
+
+def get_tool(cmd):
+    return os.path.basename(cmd[0])
+
+
+def is_read_only(cmd):
+    args = [get_tool(cmd)] + list(cmd[1:])
+    return any(args[:len(prefix)] == prefix for prefix in READ_ONLY_COMMANDS)
+
+
+class CommandExecutor(object):
+    """
+    Runs the external commands of the plugin with a timeout and a bounded
+    number of concurrent executions per tool, coalescing identical read
+    only commands issued at the same time and keeping timing statistics.
+    """
+
+    def __init__(self, policies=None):
+        """
+        :param policies: dictionary of (timeout, concurrency) by tool,
+                         COMMAND_POLICIES by default
+        """
+        self._policies = COMMAND_POLICIES if policies is None else policies
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._flight = SingleFlight()
+        self.metrics = MetricsRegistry()
+        self._duration = self.metrics.histogram(
+            'gingers390x_command_duration_seconds',
+            'Duration of the external commands', ['command'])
+        self._exit_codes = self.metrics.counter(
+            'gingers390x_command_exit_codes_total',
+            'Exit codes of the external commands', ['command', 'code'])
+        self._coalesced = self.metrics.counter(
+            'gingers390x_command_coalesced_total',
+            'Commands which got the result of an identical running command',
+            ['command'])
+
+    def _get_policy(self, tool):
+        return self._policies.get(tool, (DEFAULT_COMMAND_TIMEOUT,
+                                         DEFAULT_COMMAND_CONCURRENCY))
+
+    def _get_semaphore(self, tool):
+        with self._lock:
+            semaphore = self._semaphores.get(tool)
+            if semaphore is None:
+                semaphore = threading.Semaphore(self._get_policy(tool)[1])
+                self._semaphores[tool] = semaphore
+            return semaphore
+
+    def run(self, cmd, timeout=None, silent=False, out_cb=None,
+            env_vars=None):
+        """
+        Run a command, see wok.utils.run_command
+        :param timeout: seconds after which the command is killed, the
+                        timeout of the tool by default
+        :return: tuple of output, error and return code, which is
+                 COMMAND_TIMEOUT_RC if the command was killed on timeout
+        """
+        if out_cb is None and env_vars is None and is_read_only(cmd):
+            executed = []
+
+            def execute():
+                executed.append(cmd)
+                return self._execute(cmd, timeout, silent, out_cb, env_vars)
+
+            result = self._flight.do((tuple(cmd), timeout), execute)
+            if not executed:
+                self._coalesced.inc(command=get_tool(cmd))
+            return result
+        return self._execute(cmd, timeout, silent, out_cb, env_vars)
+
+    def _execute(self, cmd, timeout, silent, out_cb, env_vars):
+        tool = get_tool(cmd)
+        if timeout is None:
+            timeout = self._get_policy(tool)[0]
+        with self._get_semaphore(tool):
+            start = time.time()
+            try:
+                result = _run_command(cmd, timeout=timeout, silent=silent,
+                                      out_cb=out_cb, env_vars=env_vars)
+            except TimeoutExpired:
+                wok_log.error('Command "%s" killed after %s seconds'
+                              % (' '.join(cmd), timeout))
+                result = ('', 'Command timed out after %s seconds' % timeout,
+                          COMMAND_TIMEOUT_RC)
+            self._duration.observe(time.time() - start, command=tool)
+        self._exit_codes.inc(command=tool, code=result[2])
+        return result
+
+    def get_stats(self):
+        """
+        :return: dictionary by tool of the latency histogram, the counts
+                 of the exit codes and the number of coalesced calls
+        """
+        stats = {}
+
+        def get_tool_stats(tool):
+            return stats.setdefault(tool, {'latency': None, 'exit_codes': {},
+                                           'coalesced': 0})
+
+        for (tool,), sample in self._duration.items():
+            get_tool_stats(tool)['latency'] = {
+                'buckets': sample.get_buckets(), 'count': sample.count,
+                'sum': sample.sum}
+        for (tool, code), count in self._exit_codes.items():
+            get_tool_stats(tool)['exit_codes'][int(code)] = count
+        for (tool,), count in self._coalesced.items():
+            get_tool_stats(tool)['coalesced'] = count
+        return stats
+
+
+command_executor = CommandExecutor()
+registry.add_collector(command_executor.metrics.collect)
+
+
+def run_command(cmd, timeout=None, silent=False, out_cb=None, env_vars=None):
+    """
+    Run a command through the plugin command executor
+    """
+    return command_executor.run(cmd, timeout, silent, out_cb, env_vars)
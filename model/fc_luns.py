@@ -18,11 +18,13 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
-import threading
 import utils
 
-from wok.asynctask import AsyncTask
+from metrics import AsyncTask
+from model_utils import get_page, single_flight
+from uevent import device_state, FCLUN_SUBSYSTEMS
 from wok.exception import (InvalidOperation,
+                           InvalidParameter,
                            MissingParameter,
                            NotFoundError,
                            OperationFailed
@@ -30,8 +32,6 @@ from wok.exception import (InvalidOperation,
 from wok.model.tasks import TaskModel
 from wok.utils import wok_log
 
-fc_lock = threading.RLock()
-
 
 class LUNScanModel(object):
     """
@@ -66,6 +66,8 @@ class LUNScanModel(object):
         """
         Trigger LUN scanning
         """
+        utils.invalidate_lun_inventory(self.objstore)
+        device_state.invalidate(*FCLUN_SUBSYSTEMS)
         taskid = AsyncTask('/plugins/gingers390/lunscan/trigger',
                            utils.trigger_lun_scan, {}).id
 
@@ -78,7 +80,7 @@ class FCLUNsModel(object):
     """
 
     def __init__(self, **kargs):
-        pass
+        self.objstore = kargs.get('objstore')
 
     def create(self, params):
         if utils.is_lun_scan_enabled()['current']:
@@ -108,26 +110,109 @@ class FCLUNsModel(object):
         utils.validate_wwpn_or_lun(lunId)
 
         try:
-            fc_lock.acquire()
             utils.add_lun(hbaId, wwpn, lunId)
         except OperationFailed as e:
             wok_log.error("Adding LUN failed")
             raise OperationFailed("GS390XSTG00003", {'err': e})
         finally:
-            fc_lock.release()
+            utils.invalidate_lun_inventory(self.objstore, hbaId, wwpn)
+            device_state.invalidate(*FCLUN_SUBSYSTEMS)
 
         lun_path = hbaId + ":" + wwpn + ":" + lunId
         return lun_path
 
-    def get_list(self):
+    @single_flight
+    def get_list(self, _filters=None, _offset=None, _limit=None,
+                 _fields=None, _group=None, _search=None, _sort=None):
+        """
+        :param _group: 'multipath' to list a single entry for all the paths
+                       of a multipath device
+        :param _search: phrase one of the returned keys has to contain
+        :param _sort: LUN info keys to sort the LUNs by
+        """
+        if _group not in (None, 'multipath'):
+            raise InvalidParameter("GS390XSTG00026", {'group': _group})
         try:
-            fc_lock.acquire()
-            return utils.get_luns()
+            luns = device_state.get('fcluns', FCLUN_SUBSYSTEMS,
+                                    lambda: utils.get_luns(self.objstore))
         except OperationFailed as e:
             wok_log.error("Fetching list of LUNs failed")
             raise OperationFailed("GS390XSTG00007", {'err': e})
-        finally:
-            fc_lock.release()
+        if _group == 'multipath':
+            luns = utils.group_multipath_luns(luns)
+        return get_page(luns, _filters, _offset, _limit, _fields, _search,
+                        _sort)
+
+
+class FCLUNsBulkModel(object):
+    """
+    Model for adding multiple FC LUNs at once
+    """
+
+    def __init__(self, **kargs):
+        self.objstore = kargs.get('objstore')
+        self.task = TaskModel(**kargs)
+
+    def lookup(self, name):
+        return {}
+
+    def add(self, name, luns):
+        """
+        Add LUNs and persist them in background
+        :param luns: list of dictionaries with the hbaId, remoteWwpn and
+                     lunId of every LUN
+        :return: task json
+        """
+        if utils.is_lun_scan_enabled()['current']:
+            wok_log.error(
+                "Lun scan is enabled. Cannot add/remove LUNs manually.")
+            raise InvalidOperation("GS390XSTG00009")
+
+        if not isinstance(luns, list) or not luns:
+            raise InvalidParameter("GS390XSTG00024")
+        lun_paths = []
+        for lun in luns:
+            if not isinstance(lun, dict) or \
+                    any(key not in lun
+                        for key in ['hbaId', 'remoteWwpn', 'lunId']):
+                wok_log.error("Invalid LUN for bulk add, %s", lun)
+                raise InvalidParameter("GS390XSTG00024")
+            utils.validate_hba_id(lun['hbaId'])
+            utils.validate_wwpn_or_lun(lun['remoteWwpn'])
+            utils.validate_wwpn_or_lun(lun['lunId'])
+            lun_paths.append((str(lun['hbaId']), str(lun['remoteWwpn']),
+                              str(lun['lunId'])))
+
+        wok_log.info('Create task for adding %d LUNs' % len(lun_paths))
+        taskid = AsyncTask('/plugins/gingers390x/fcluns/bulk/add',
+                           _bulk_add_luns, (self.objstore, lun_paths)).id
+        return self.task.lookup(taskid)
+
+
+def _bulk_add_luns(cb, params):
+    """
+    Task function adding LUNs with utils.add_luns(). LUNs which were added
+    are kept when others fail.
+    :param params: tuple of the object store and the list of
+                   (adapter, port, lun_id) tuples
+    """
+    objstore, luns = params
+    cb('Adding %d LUNs' % len(luns))
+    try:
+        added, failed = utils.add_luns(luns)
+        if failed:
+            error = ', '.join('%s: %s' % (':'.join(lun), failed[lun])
+                              for lun in sorted(failed))
+            raise OperationFailed("GS390XSTG00025",
+                                  {'count': len(failed), 'err': error})
+        wok_log.info('Successfully added %d LUNs' % len(added))
+        cb('Successfully added %d LUNs' % len(added), True)
+    except Exception as e:
+        cb(e.message, False)
+    finally:
+        for adapter, port in set(lun[:2] for lun in luns):
+            utils.invalidate_lun_inventory(objstore, adapter, port)
+        device_state.invalidate(*FCLUN_SUBSYSTEMS)
 
 
 class FCLUNModel(object):
@@ -136,12 +221,13 @@ class FCLUNModel(object):
     """
 
     def __init__(self, **kargs):
-        pass
+        self.objstore = kargs.get('objstore')
 
     def lookup(self, path):
         try:
             path_components = utils.validate_lun_path(path)
-            return utils.get_lun_info(*path_components)
+            return utils.get_lun_info(*path_components,
+                                      objstore=self.objstore)
         except ValueError:
             wok_log.error("Fetching LUN info failed, %s", path)
             raise NotFoundError("GS390XSTG00008", {'path': path})
@@ -153,11 +239,31 @@ class FCLUNModel(object):
             raise InvalidOperation("GS390XSTG00009")
 
         path_components = utils.validate_lun_path(path)
+        removed_luns = []
         try:
-            fc_lock.acquire()
-            utils.remove_lun(*path_components)
+            removed_luns = utils.remove_lun(*path_components)
         except OperationFailed as e:
             wok_log.error("Removing LUN failed")
             raise OperationFailed("GS390XSTG00002", {'err': e})
         finally:
-            fc_lock.release()
+            utils.invalidate_lun_inventory(self.objstore, *path_components[:2])
+            for lun in removed_luns:
+                utils.invalidate_lun_inventory(self.objstore, lun[0], lun[1])
+            device_state.invalidate(*FCLUN_SUBSYSTEMS)
+
+
+class FCLUNPathsModel(object):
+    """
+    Model representing the paths to the disk of a FC LUN
+    """
+
+    def __init__(self, **kargs):
+        pass
+
+    def lookup(self, path):
+        try:
+            path_components = utils.validate_lun_path(path)
+            return utils.get_lun_paths(*path_components)
+        except (IndexError, ValueError):
+            wok_log.error("Fetching LUN paths failed, %s", path)
+            raise NotFoundError("GS390XSTG00008", {'path': path})
@@ -0,0 +1,335 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM Corp, 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import contextlib
+import functools
+import inspect
+import threading
+import time
+import types
+
+from wok import asynctask
+
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                   10, 30, 60, 120, 300]
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _format_labels(names, values, extra=()):
+    labels = zip(names, values) + list(extra)
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', r'\\')
+                     .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels)
+
+
+class Metric(object):
+    """
+    Family of samples of a metric, one per combination of label values
+    """
+    metric_type = None
+
+    def __init__(self, name, text, labels=()):
+        self.name = name
+        self.text = text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def _get_key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def items(self):
+        """
+        :return: list of (label values, sample) tuples
+        """
+        with self._lock:
+            return sorted(self._samples.items())
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.text),
+                 '# TYPE %s %s' % (self.name, self.metric_type)]
+        for key, sample in self.items():
+            lines.extend(self._render_sample(key, sample))
+        return lines
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._get_key(labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + value
+
+    def _render_sample(self, key, value):
+        return ['%s%s %s' % (self.name, _format_labels(self.labels, key),
+                             _format_value(value))]
+
+
+class HistogramSample(object):
+    def __init__(self, buckets):
+        self.bounds = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_buckets(self):
+        """
+        :return: list of (upper bound, cumulative count) tuples, the
+                 last bound being '+Inf'
+        """
+        buckets = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + ['+Inf'], self.counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return buckets
+
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, text, labels=(), buckets=LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, text, labels)
+        self.buckets = list(buckets)
+
+    def observe(self, value, **labels):
+        key = self._get_key(labels)
+        with self._lock:
+            sample = self._samples.get(key)
+            if sample is None:
+                sample = self._samples[key] = HistogramSample(self.buckets)
+            sample.observe(value)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """
+        Observe the time spent in the with block
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start, **labels)
+
+    def _render_sample(self, key, sample):
+        lines = []
+        for bound, count in sample.get_buckets():
+            lines.append('%s_bucket%s %d' % (
+                self.name, _format_labels(self.labels, key,
+                                          [('le', _format_value(bound))]),
+                count))
+        labels = _format_labels(self.labels, key)
+        lines.append('%s_sum%s %s' % (self.name, labels,
+                                      _format_value(sample.sum)))
+        lines.append('%s_count%s %d' % (self.name, labels, sample.count))
+        return lines
+
+
+class MetricsRegistry(object):
+    """
+    Set of metrics rendered together in the Prometheus text format
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, text, labels=()):
+        return self._add(Counter(name, text, labels))
+
+    def histogram(self, name, text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, text, labels, buckets))
+
+    def add_collector(self, collector):
+        """
+        :param collector: function returning a list of metrics, called
+                          every time the metrics are collected
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self):
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for collector in collectors:
+            metrics.extend(collector())
+        return metrics
+
+    def render(self):
+        lines = []
+        for metric in self.collect():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+model_calls = registry.counter(
+    'gingers390x_model_calls_total', 'Calls of the model methods',
+    ['model', 'method'])
+model_errors = registry.counter(
+    'gingers390x_model_errors_total',
+    'Calls of the model methods which raised an exception',
+    ['model', 'method'])
+model_duration = registry.histogram(
+    'gingers390x_model_duration_seconds', 'Duration of the model methods',
+    ['model', 'method'])
+lun_discovery_duration = registry.histogram(
+    'gingers390x_lun_discovery_phase_seconds',
+    'Duration of the phases of the discovery of FC LUNs', ['phase'])
+lock_wait = registry.histogram(
+    'gingers390x_lock_wait_seconds', 'Time spent waiting for a lock',
+    ['lock'])
+task_queue_duration = registry.histogram(
+    'gingers390x_task_queue_seconds',
+    'Time between the creation of a task and the start of its work',
+    ['task'])
+task_duration = registry.histogram(
+    'gingers390x_task_duration_seconds', 'Duration of the tasks',
+    ['task', 'status'])
+
+
+def get_model_name(instance):
+    """
+    :return: name of a model as used by wok BaseModel to prefix its
+             methods, e.g. 'storagedevices' for StorageDevicesModel
+    """
+    name = instance.__class__.__name__
+    if name.endswith('Model'):
+        name = name[:-len('Model')]
+    return name.lower()
+
+
+def _instrument_method(func, model, method):
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        model_calls.inc(model=model, method=method)
+        start = time.time()
+        try:
+            return func(self, *args, **kwargs)
+        except Exception:
+            model_errors.inc(model=model, method=method)
+            raise
+        finally:
+            model_duration.observe(time.time() - start, model=model,
+                                   method=method)
+    return wrapper
+
+
+def instrument_model(instance):
+    """
+    Count and time the calls of the public methods of a model instance
+    :return: the instance
+    """
+    model = get_model_name(instance)
+    for name, method in inspect.getmembers(instance, inspect.ismethod):
+        if name.startswith('_') or method.im_self is not instance:
+            continue
+        setattr(instance, name, types.MethodType(
+            _instrument_method(method.im_func, model, name), instance))
+    return instance
+
+
+@contextlib.contextmanager
+def timed_lock(lock, name):
+    """
+    Hold a lock, observing the time spent waiting for it
+    :param lock: lock to acquire
+    :param name: value of the lock label
+    """
+    start = time.time()
+    lock.acquire()
+    lock_wait.observe(time.time() - start, lock=name)
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+class AsyncTask(asynctask.AsyncTask):
+    """
+    wok AsyncTask observing the time its work waited to start and the
+    time it ran
+    """
+
+    def __init__(self, target_uri, fn, *args, **kwargs):
+        created = time.time()
+        # e.g. nwdevices/configure for /plugins/gingers390x/nwdevices/
+        # <device>/configure
+        parts = target_uri.strip('/').split('/')[2:] or ['unknown']
+        task = '%s/%s' % (parts[0], parts[-1])
+
+        def timed_fn(cb, *fn_args):
+            start = time.time()
+            task_queue_duration.observe(start - created, task=task)
+            status = {}
+
+            def status_cb(message, success=None):
+                if success is not None:
+                    status['value'] = 'finished' if success else 'failed'
+                return cb(message, success)
+
+            try:
+                result = fn(status_cb, *fn_args)
+                status.setdefault('value', 'finished')
+                return result
+            finally:
+                task_duration.observe(time.time() - start, task=task,
+                                      status=status.get('value', 'failed'))
+
+        super(AsyncTask, self).__init__(target_uri, timed_fn, *args,
+                                        **kwargs)
+
+
+class MetricsModel(object):
+    """
+    Model of the plugin metrics in the Prometheus text exposition format
+    """
+
+    def __init__(self, **kargs):
+        pass
+
+    def lookup(self, name):
+        return registry.render()
@@ -23,6 +23,8 @@ import os
 from wok.basemodel import BaseModel
 from wok.objectstore import ObjectStore
 from wok.plugins.gingers390x import config
+from wok.plugins.gingers390x.model.metrics import instrument_model
+from wok.plugins.gingers390x.model.uevent import device_state
 from wok.utils import import_module, listPathModules
 
 
@@ -50,7 +52,7 @@ class Model(BaseModel):
         # Import task model from Wok
         instances = get_instances('wok.model.tasks')
         for instance in instances:
-            models.append(instance(**kargs))
+            models.append(instrument_model(instance(**kargs)))
 
         # Import all gingers390x plugin models
         this = os.path.basename(__file__)
@@ -64,6 +66,10 @@ class Model(BaseModel):
                 'wok.plugins.gingers390x.model.' + mod_name
             )
             for instance in instances:
-                models.append(instance(**kargs))
+                # count and time the calls of every model method
+                models.append(instrument_model(instance(**kargs)))
+
+        # keep device listings warm between kernel uevents
+        device_state.start()
 
         return super(Model, self).__init__(models)
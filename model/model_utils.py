@@ -19,13 +19,30 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
 
+import contextlib
+import copy
+import errno
+import fcntl
+import functools
 import glob
+import itertools
+import json
+import os
 import re
+import threading
 
-from wok.exception import OperationFailed
+from metrics import timed_lock
+from wok.exception import InvalidParameter, OperationFailed
 from wok.utils import wok_log
 
 
+# patterns for single devices are built per device, so keep a bounded
+# number of parsers
+TABLE_PARSER_CACHE_SIZE = 64
+TABLE_LAYOUT_CACHE_SIZE = 16
+_table_parsers = {}
+
+
 def get_directories(path_pattern):
     """
     this is a method to get list of directories in given directory path
@@ -91,19 +108,8 @@ def get_row_data(command_output, header_pattern, value_pattern):
                 "POM": "ff", "CHPIDs": "b0b10d00 00000000"
     }, the first match to the value_pattern
     """
-    header = re.search(header_pattern, command_output, re.M | re.I)
-    value = re.search(value_pattern, command_output, re.M | re.I)
-    row_data = {}
-    if header is None or not header.group():
-        wok_log.error("header is empty for given pattern")
-        raise OperationFailed("GS390XREG0001E",
-                              {'reason': "header is empty for given pattern"})
-    elif value:
-        if (header.group() != value.group()) and \
-                (len(header.groups()) == len(value.groups())):
-                for cnt in range(1, len(header.groups())+1):
-                    row_data[header.group(cnt)] = value.group(cnt)
-    return row_data
+    return get_table_parser(header_pattern, value_pattern).get_row(
+        command_output)
 
 
 def get_rows_info(cmd_output, hdr_pattern, val_pattern, unique_col=None,
@@ -156,48 +162,568 @@ def get_rows_info(cmd_output, hdr_pattern, val_pattern, unique_col=None,
      ]depending on format_data
 
     """
-    command_out = cmd_output.strip().split("\n")
-    if unique_col is not None:
-        devices = {}
-    else:
+    parser = get_table_parser(hdr_pattern, val_pattern)
+    if unique_col is None:
         devices = []
-
-    if (hdr_index > len(command_out)-1) or \
-            (val_start_index > len(command_out)-1):
+        for row_data in parser.iter_rows(cmd_output, hdr_index,
+                                         val_start_index):
+            # format the row data if callback format function is not None
+            if format_data:
+                row_data = format_data(row_data)
+            devices.append(row_data)
         return devices
 
-    header = re.search(hdr_pattern, command_out[hdr_index], re.M | re.I)
-    if header is None or not header.group():
-        wok_log.error("header is empty for given pattern")
-        raise OperationFailed("GS390XREG0001E",
-                              {'reason': "header is empty for given pattern"})
-
-    value_pattern = re.compile(val_pattern, re.M | re.I)
-
-    for row in command_out[val_start_index:]:
-        value = re.search(value_pattern, row)
-        row_data = {}
-        if value:
-            if (header.group() != value.group()) and \
-                    (len(header.groups()) == len(value.groups())):
-                for cnt in range(1, len(header.groups())+1):
-                    row_data[header.group(cnt)] = value.group(cnt)
-
-                # Get the unique_col value if not return None,
-                # as format_data might does pop
-                if unique_col:
-                    key = row_data.get(unique_col)
-
-                # format the row data if callback format function is not None
-                if format_data:
-                    row_data = format_data(row_data)
-
-                # If unique col then return dictionary of dictionary
-                # else return list of dictionary
-                if unique_col:
-                    if not key:
-                        key = row_data[unique_col]
-                    devices[key] = row_data
-                else:
-                    devices.append(row_data)
+    devices = {}
+    for row_data in parser.iter_rows(cmd_output, hdr_index, val_start_index):
+        # Get the unique_col value if not return None,
+        # as format_data might does pop
+        key = row_data.get(unique_col)
+        if format_data:
+            row_data = format_data(row_data)
+        if not key:
+            key = row_data[unique_col]
+        devices[key] = row_data
     return devices
+
+
+class TableParser(object):
+    """
+    Parser for the table printed by a command like lscss or znetconf.
+    The header and row patterns are compiled once, and the column names
+    of the header lines already seen are kept, so parsing the output
+    again only has to match its rows.
+    """
+
+    def __init__(self, hdr_pattern, val_pattern):
+        """
+        :param hdr_pattern: regular expression for the header line, with
+                            a group for every column name
+        :param val_pattern: regular expression for a row, with a group
+                            for every column value
+        """
+        self.header_pattern = re.compile(hdr_pattern, re.M | re.I)
+        self.value_pattern = re.compile(val_pattern, re.M | re.I)
+        # rows never match a header with a different number of columns
+        self._same_width = (self.header_pattern.groups ==
+                            self.value_pattern.groups)
+        self._layouts = {}
+
+    def _match_header(self, text):
+        """
+        :param text: header line, or command output containing it
+        :return: tuple of the matched header text and the column names
+        """
+        header = self.header_pattern.search(text)
+        if header is None or not header.group():
+            wok_log.error("header is empty for given pattern")
+            raise OperationFailed("GS390XREG0001E",
+                                  {'reason': "header is empty for "
+                                             "given pattern"})
+        return header.group(), header.groups()
+
+    def _get_layout(self, header_line):
+        layout = self._layouts.get(header_line)
+        if layout is None:
+            layout = self._match_header(header_line)
+            if len(self._layouts) >= TABLE_LAYOUT_CACHE_SIZE:
+                self._layouts.clear()
+            self._layouts[header_line] = layout
+        return layout
+
+    def get_columns(self, cmd_output, hdr_index=0):
+        """
+        :return: tuple of the column names of the table
+        """
+        lines = cmd_output.strip().split("\n")
+        if hdr_index > len(lines) - 1:
+            return ()
+        return self._get_layout(lines[hdr_index])[1]
+
+    def get_row(self, cmd_output):
+        """
+        Parse the first row of the output matching the row pattern,
+        see get_row_data()
+        :return: dictionary of the column values
+        """
+        header_text, columns = self._match_header(cmd_output)
+        value = self.value_pattern.search(cmd_output)
+        if value and self._same_width and header_text != value.group():
+            return dict(zip(columns, value.groups()))
+        return {}
+
+    def iter_rows(self, cmd_output, hdr_index=0, val_start_index=2,
+                  as_tuple=False):
+        """
+        Parse the rows of the output lazily, see get_rows_info()
+        :param cmd_output: command output
+        :param hdr_index: index of the header line
+        :param val_start_index: index of the first row
+        :param as_tuple: yield tuples of the column values, in the order
+                         returned by get_columns(), instead of dictionaries
+        :return: generator of the rows matching the row pattern
+        """
+        lines = cmd_output.strip().split("\n")
+        if (hdr_index > len(lines) - 1) or \
+                (val_start_index > len(lines) - 1):
+            return
+        header_text, columns = self._get_layout(lines[hdr_index])
+        if not self._same_width:
+            return
+        search = self.value_pattern.search
+        for line in itertools.islice(lines, val_start_index, None):
+            value = search(line)
+            if value is None or value.group() == header_text:
+                continue
+            if as_tuple:
+                yield value.groups()
+            else:
+                yield dict(zip(columns, value.groups()))
+
+
+def get_table_parser(hdr_pattern, val_pattern):
+    """
+    :return: the TableParser for the given patterns, compiled on the
+             first use of the patterns
+    """
+    key = (hdr_pattern, val_pattern)
+    parser = _table_parsers.get(key)
+    if parser is None:
+        parser = TableParser(hdr_pattern, val_pattern)
+        if len(_table_parsers) >= TABLE_PARSER_CACHE_SIZE:
+            _table_parsers.clear()
+        _table_parsers[key] = parser
+    return parser
+
+
+def run_in_parallel(func, args_list, max_workers):
+    """
+    Run func once for every tuple of arguments in args_list using a
+    bounded pool of worker threads.
+    :param func: callable to be executed
+    :param args_list: list of argument tuples, one per call of func
+    :param max_workers: maximum number of threads running at a time
+    :return: list of results in the same order as args_list.
+             If any call raises an exception, the first one raised is
+             re-raised in the caller once all the workers are done.
+    """
+    results = [None] * len(args_list)
+    errors = []
+    if max_workers <= 1 or len(args_list) <= 1:
+        for index, args in enumerate(args_list):
+            results[index] = func(*args)
+        return results
+
+    pending = iter(range(len(args_list)))
+    pending_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with pending_lock:
+                index = next(pending, None)
+            if index is None:
+                return
+            try:
+                results[index] = func(*args_list[index])
+            except Exception as e:
+                errors.append(e)
+
+    workers = [threading.Thread(target=worker)
+               for _ in range(min(max_workers, len(args_list)))]
+    for thread in workers:
+        thread.setDaemon(True)
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
+
+
+class SingleFlight(object):
+    """
+    Runs a function once for all the callers asking for the same key at
+    the same time. Callers arriving while the function runs wait for it
+    and get a copy of its result, or the exception it raised.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """
+        :param key: hashable identifying the computation
+        :param func: function computing the result
+        :return: result of func
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event()}
+        if not leader:
+            call['done'].wait()
+            if 'error' in call:
+                raise call['error']
+            return copy.deepcopy(call['result'])
+
+        try:
+            call['result'] = func()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+
+def single_flight(method):
+    """
+    Decorator sharing the result of a model method between the
+    concurrent calls with the same arguments, see SingleFlight
+    """
+    flight = SingleFlight()
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = json.dumps([args, kwargs], sort_keys=True, default=repr)
+        return flight.do(key, lambda: method(self, *args, **kwargs))
+    return wrapper
+
+
+def _get_conf_entry(line):
+    """
+    :return: tuple of the fields of a configuration file line, with
+             hexadecimal numbers in a canonical form so 0x0 and
+             0x0000000000000000 match, or None for blank and comment lines
+    """
+    if isinstance(line, unicode):
+        line = line.encode('utf-8')
+    fields = line.split('#', 1)[0].split()
+    if not fields:
+        return None
+    return tuple('0x%x' % int(field, 16)
+                 if re.match(r'^0x[0-9a-fA-F]+$', field) else field.lower()
+                 for field in fields)
+
+
+class ConfFile(object):
+    """
+    Configuration file whose lines start with a device id, such as
+    /etc/dasd.conf and /etc/zfcp.conf. Its entries are indexed in memory
+    and read again only when the file changed. Changes are applied in a
+    single rewrite to a temporary file renamed over the file, holding a
+    lock within the plugin and an exclusive flock of the file against
+    other processes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._lines = []
+        self._entries = set()
+        self._devices = {}
+
+    def _set_lines(self, lines, signature):
+        self._lines = lines
+        self._signature = signature
+        self._entries = set()
+        self._devices = {}
+        for line in lines:
+            entry = _get_conf_entry(line)
+            if entry is not None:
+                self._entries.add(entry)
+                self._devices[entry[0]] = self._devices.get(entry[0], 0) + 1
+
+    def _refresh(self, force=False):
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            self._set_lines([], None)
+            return
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime)
+        if force or signature != self._signature:
+            with open(self.path) as conf:
+                self._set_lines(conf.read().splitlines(), signature)
+
+    @contextlib.contextmanager
+    def _flock(self):
+        """
+        Hold an exclusive flock of the file
+        :return: False if the file doesn't exist, so could not be locked
+        """
+        while True:
+            try:
+                conf = open(self.path, 'r')
+            except IOError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                yield False
+                return
+            try:
+                fcntl.flock(conf, fcntl.LOCK_EX)
+                # another writer may have renamed a new file over the one
+                # locked while waiting for the lock
+                try:
+                    replaced = os.stat(self.path).st_ino != \
+                        os.fstat(conf.fileno()).st_ino
+                except OSError:
+                    replaced = True
+                if not replaced:
+                    yield True
+                    return
+            finally:
+                conf.close()
+
+    def has_device(self, device):
+        """
+        :return: True if the file has any entry for the device
+        """
+        with timed_lock(self._lock, 'conf_file'):
+            self._refresh()
+            return _get_conf_entry(device)[0] in self._devices
+
+    def has_entry(self, line):
+        """
+        :return: True if the file has an entry matching the line
+        """
+        with timed_lock(self._lock, 'conf_file'):
+            self._refresh()
+            return _get_conf_entry(line) in self._entries
+
+    def update(self, add_lines=None, add_device_lines=None,
+               remove_devices=None, remove_lines=None):
+        """
+        Add and remove entries of the file in a single rewrite
+        :param add_lines: lines to add, unless a matching entry exists
+        :param add_device_lines: lines to add, unless the device they
+                                 start with has any entry
+        :param remove_devices: devices whose entries are all removed
+        :param remove_lines: lines whose matching entries are removed
+        :return: tuple of the lists of lines added and removed, which
+                 update(add_lines=removed, remove_lines=added) reverts
+        """
+        remove_devices = set(_get_conf_entry(device)[0]
+                             for device in remove_devices or [])
+        remove_entries = set(_get_conf_entry(line)
+                             for line in remove_lines or [])
+        with timed_lock(self._lock, 'conf_file'):
+            while True:
+                with self._flock() as locked:
+                    self._refresh(force=True)
+                    new_lines, added, removed = self._apply(
+                        add_lines or [], add_device_lines or [],
+                        remove_devices, remove_entries)
+                    if new_lines == self._lines:
+                        return added, removed
+                    if locked:
+                        self._write(new_lines)
+                        return added, removed
+                # the file doesn't exist yet, create it empty to lock it
+                # before writing the entries
+                open(self.path, 'a').close()
+
+    def _apply(self, add_lines, add_device_lines, remove_devices,
+               remove_entries):
+        """
+        :return: tuple of the lines of the file once the changes are
+                 applied, the lines added and the lines removed
+        """
+        new_lines = []
+        added = []
+        removed = []
+        entries = set()
+        devices = set()
+        for line in self._lines:
+            entry = _get_conf_entry(line)
+            if entry is not None and (entry[0] in remove_devices or
+                                      entry in remove_entries):
+                removed.append(line)
+                continue
+            new_lines.append(line)
+            if entry is not None:
+                entries.add(entry)
+                devices.add(entry[0])
+        for line in add_lines:
+            entry = _get_conf_entry(line)
+            if entry not in entries:
+                added.append(line)
+                entries.add(entry)
+                devices.add(entry[0])
+        for line in add_device_lines:
+            entry = _get_conf_entry(line)
+            if entry[0] not in devices:
+                added.append(line)
+                entries.add(entry)
+                devices.add(entry[0])
+        return new_lines + added, added, removed
+
+    def _write(self, lines):
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'w') as conf:
+            conf.write(''.join(line + '\n' for line in lines))
+            conf.flush()
+            os.fsync(conf.fileno())
+        os.chmod(tmp_file, os.stat(self.path).st_mode & 0o7777)
+        os.rename(tmp_file, self.path)
+        stat = os.stat(self.path)
+        self._set_lines(lines, (stat.st_ino, stat.st_size, stat.st_mtime))
+
+
+_conf_files = {}
+_conf_files_lock = threading.Lock()
+
+
+def get_conf_file(path):
+    """
+    :return: the ConfFile shared by all the users of the file at path
+    """
+    with _conf_files_lock:
+        conf_file = _conf_files.get(path)
+        if conf_file is None:
+            conf_file = _conf_files[path] = ConfFile(path)
+        return conf_file
+
+
+class Page(list):
+    """
+    List of the entries of a collection, remembering how many entries
+    the complete collection has
+    """
+
+    def __init__(self, entries=(), total=None):
+        super(Page, self).__init__(entries)
+        self.total = len(self) if total is None else total
+
+
+def _get_page_index(name, value):
+    if value is None:
+        return None
+    try:
+        index = int(value)
+    except (TypeError, ValueError):
+        index = -1
+    if index < 0:
+        raise InvalidParameter("GS390XINVINPUT",
+                               {'reason': '%s must be a non-negative '
+                                          'integer' % name})
+    return index
+
+
+def _match_filter(entry, key, value):
+    if key not in entry:
+        return False
+    field = entry[key]
+    if isinstance(field, list):
+        return any(_match_value(item, value) for item in field)
+    return _match_value(field, value)
+
+
+def _match_value(field, value):
+    if isinstance(value, list):
+        return any(_match_value(field, item) for item in value)
+    if field == value:
+        return True
+    if isinstance(field, basestring) and isinstance(value, basestring):
+        if field in value:
+            return True
+        try:
+            return re.match(value, field) is not None
+        except re.error:
+            return False
+    return False
+
+
+def match_filters(entry, filters):
+    """
+    Check if an entry of a collection matches all the filters, as wok
+    filters the resources of a collection: a field matches a value equal
+    to it, containing it or being a regular expression matching its
+    beginning, e.g. name=enc matches the name encf0.
+    :param entry: dictionary
+    :param filters: dictionary of key, value pairs. A list of values
+                    matches any of them, and a list field matches if
+                    any of its items does.
+    :return: True if all the filters match
+    """
+    return all(_match_filter(entry, key, value)
+               for key, value in filters.iteritems())
+
+
+def _search_entry(entry, phrase, fields=None):
+    keys = fields if fields else entry.keys()
+    for key in keys:
+        value = entry.get(key)
+        values = value if isinstance(value, list) else [value]
+        for item in values:
+            if item is None:
+                continue
+            if isinstance(item, str):
+                item = item.decode('utf-8', 'replace')
+            if phrase in unicode(item).lower():
+                return True
+    return False
+
+
+def _sort_entries(entries, sort):
+    if isinstance(sort, basestring):
+        sort = sort.split(',')
+    keys = [key.strip() for key in sort if key.strip().lstrip('-')]
+    # sort by the last key first, the sort is stable so the entries keep
+    # the order of the previous keys when they have equal values
+    for key in reversed(keys):
+        name = key.lstrip('-')
+        entries = sorted(entries, key=lambda entry: entry.get(name, ''),
+                         reverse=key.startswith('-'))
+    return entries
+
+
+def get_page(entries, filters=None, offset=None, limit=None, fields=None,
+             search=None, sort=None):
+    """
+    Select part of the entries of a collection.
+    Filters and the search phrase are applied first, then the remaining
+    entries are sorted, paged and reduced to the requested fields.
+    :param entries: list of dictionaries
+    :param filters: dictionary of key, value pairs an entry has to match,
+                    see match_filters()
+    :param offset: number of entries to skip
+    :param limit: maximum number of entries to return
+    :param fields: list or comma separated string of the keys to return
+                   for each entry
+    :param search: phrase one of the returned fields of an entry has to
+                   contain, ignoring the case
+    :param sort: list or comma separated string of the keys to sort the
+                 entries by, a key starting with '-' sorts descending
+    :return: Page of entries, its total is the number of entries
+             matching the filters and the search phrase
+    """
+    offset = _get_page_index('offset', offset)
+    limit = _get_page_index('limit', limit)
+    if fields:
+        if isinstance(fields, basestring):
+            fields = fields.split(',')
+        fields = [field.strip() for field in fields if field.strip()]
+    if filters:
+        entries = [entry for entry in entries
+                   if match_filters(entry, filters)]
+    if search:
+        phrase = unicode(search).lower()
+        entries = [entry for entry in entries
+                   if _search_entry(entry, phrase, fields)]
+    if sort:
+        entries = _sort_entries(entries, sort)
+    total = len(entries)
+    start = offset or 0
+    end = None if limit is None else start + limit
+    entries = entries[start:end]
+    if fields:
+        entries = [dict((key, entry[key]) for key in fields if key in entry)
+                   for entry in entries]
+    return Page(entries, total)
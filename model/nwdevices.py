@@ -21,14 +21,18 @@
 import augeas
 import os
 import re
+import threading
 
 import model_utils as utils
-from wok.asynctask import AsyncTask
+from executor import run_command
+from metrics import AsyncTask, timed_lock
+from model_utils import get_page, run_in_parallel, single_flight
+from uevent import device_state, NETWORK_SUBSYSTEMS
 from wok.exception import InvalidParameter, InvalidOperation
 from wok.exception import NotFoundError, OperationFailed
 from wok.model.tasks import TaskModel
 from wok.rollbackcontext import RollbackContext
-from wok.utils import run_command, wok_log
+from wok.utils import wok_log
 
 
 ZNETCONF_CMD = "znetconf"
@@ -50,6 +54,10 @@ ENCCW = 'enccw'
 OPTIONS = 'OPTIONS'
 
 ifcfg_path = 'etc/sysconfig/network-scripts/ifcfg-enccw<deviceid>'
+# augeas transform of the ifcfg files, the only files parsed by the
+# ifcfg session instead of all the files known by the augeas lenses
+IFCFG_LENS = 'Shellvars.lns'
+IFCFG_INCL = '/etc/sysconfig/network-scripts/ifcfg-*'
 
 UNCONF_HDR_PATTERN = r'('+re.escape(ZNETCONF_DEV_IDS) + r')\s+' \
                      r'('+re.escape(ZNETCONF_TYPE) + r')\s+' \
@@ -66,21 +74,45 @@ CONF_HDR_PATTERN = r'('+re.escape(ZNETCONF_DEV_IDS) + r')\s+' \
                    r'('+re.escape(ZNETCONF_STATE) + r')\s+$'
 
 SYSFS_TRIPLET_PATH = '/sys/bus/ccwgroup/drivers/qeth/'
+SYSFS_QETH_CCW_PATH = '/sys/bus/ccw/drivers/qeth/'
+BUS_ID_PATTERN = r'^\d\.\d\.[0-9a-fA-F]{4}$'
+# names of the devices listed by znetconf -c
+DEV_NAME_PATTERN = r'^\w+\d\.\d\.[0-9a-fA-F]{4}$'
+# card types of the devices listed by znetconf -u, by control unit type
+QETH_CARD_TYPES = {'1731/01': 'OSA (QDIO)'}
+# maximum number of network devices brought online or offline at a time
+# by the bulk actions, znetconf calls are also bounded by the executor
+NWDEVICES_BULK_WORKERS = 8
 
 
 class NetworkDevicesModel(object):
     def __init__(self, **kargs):
         pass
 
-    def get_list(self, _configured=None):
+    @single_flight
+    def get_list(self, _configured=None, _filters=None, _offset=None,
+                 _limit=None, _fields=None, _search=None, _sort=None):
         """
         :param _configured: True will list only the network devices
         which are configured. znetconf -c will be used
         False will list only network devices which are not configured yet.
         znetconf -u will be used
         If not given then it will fetch both the list of devices.
+        :param _filters: dictionary of values the devices have to match
+        :param _offset: number of devices to skip
+        :param _limit: maximum number of devices to return
+        :param _fields: device info keys to return
+        :param _search: phrase one of the returned keys has to contain
+        :param _sort: device info keys to sort the devices by
         :return: network OSA device info list.
         """
+        devices = device_state.get('nwdevices:%s' % _configured,
+                                   NETWORK_SUBSYSTEMS,
+                                   lambda: self._get_list(_configured))
+        return get_page(devices, _filters, _offset, _limit, _fields,
+                        _search, _sort)
+
+    def _get_list(self, _configured):
         wok_log.info('Fetching network devices. _configured '
                      '= %s' % _configured)
         if _configured is None:
@@ -189,12 +221,55 @@ class NetworkDeviceModel(object):
                      % (interface, params))
         if not _get_configured_devices(key=UNIQUE_COL_NAME).get(interface):
             raise InvalidOperation('GS390XIONW007E')
-        _update_osaport(interface, params)
+        try:
+            _update_osaport(interface, params)
+        finally:
+            device_state.invalidate(*NETWORK_SUBSYSTEMS)
         wok_log.info('End of NetworkDeviceModel.update(%s, %s) method'
                      % (interface, params))
         return interface
 
 
+class NetworkDevicesBulkModel(object):
+    """
+    Model class for actions on multiple network devices
+    """
+
+    def __init__(self, **kargs):
+        self.task = TaskModel(**kargs)
+
+    def lookup(self, name):
+        return {}
+
+    def configure(self, name, devices, osa_portno=None):
+        """
+        Configure network devices in background and persist them.
+        :param devices: list of network device ids or interface names
+                        Ex: ['0.0.f500', 'enccw0.0.f503']
+        :param osa_portno: osa port number of the devices
+        :return: task json
+        """
+        devices = _get_bulk_interfaces(devices)
+        wok_log.info('Create task for configuring %d network devices'
+                     % len(devices))
+        taskid = AsyncTask('/plugins/gingers390x/nwdevices/bulk/configure',
+                           _bulk_configure, (devices, osa_portno)).id
+        return self.task.lookup(taskid)
+
+    def unconfigure(self, name, devices):
+        """
+        Un-configure network devices in background and unpersist them.
+        :param devices: list of network device ids or interface names
+        :return: task json
+        """
+        devices = _get_bulk_interfaces(devices)
+        wok_log.info('Create task for un-configuring %d network devices'
+                     % len(devices))
+        taskid = AsyncTask('/plugins/gingers390x/nwdevices/bulk/unconfigure',
+                           _bulk_unconfigure, devices).id
+        return self.task.lookup(taskid)
+
+
 def _get_configured_devices(key=None):
     """
     :param key: key for which value is unique
@@ -202,6 +277,10 @@ def _get_configured_devices(key=None):
     Else returns dictionary of configured OSA device info with key as value
     of key passed
     """
+    devices = _get_sysfs_configured_devices()
+    if devices is not None:
+        wok_log.info('Retrieved configured devices from sysfs')
+        return _key_devices(devices, key)
     wok_log.info('Retrieving configured devices using znetconf -c')
     cmd = [ZNETCONF_CMD, '-c']
     output, err, rc = run_command(cmd)
@@ -249,6 +328,10 @@ def _get_unconfigured_devices(key=None):
     Else returns dictionary of un-configured OSA device info with key as value
     of key passed
     """
+    devices = _get_sysfs_unconfigured_devices()
+    if devices is not None:
+        wok_log.info('Retrieved un-configured devices from sysfs')
+        return _key_devices(devices, key)
     wok_log.info('Retrieving un-configured devices using znetconf -u')
     cmd = [ZNETCONF_CMD, '-u']
     output, err, rc = run_command(cmd)
@@ -288,6 +371,118 @@ def _get_unconfigured_devices(key=None):
     return unconfigured_devices
 
 
+def _key_devices(devices, key=None):
+    """
+    :param devices: list of device info
+    :param key: key for which value is unique
+    :return: devices if key is None, else dictionary of the devices with
+             value of key as key
+    """
+    if key:
+        return dict((device[key], device) for device in devices)
+    return devices
+
+
+def _read_sysfs_attr(path, attr):
+    with open(os.path.join(path, attr)) as attr_file:
+        return attr_file.read().strip()
+
+
+def _get_sysfs_configured_devices():
+    """
+    Read the qeth group devices from sysfs, as listed by znetconf -c
+    :return: list of device info in the format of _format_znetconf, or
+             None if it can not be read from sysfs and znetconf has
+             to be used
+    """
+    if not os.path.isdir(SYSFS_TRIPLET_PATH):
+        return None
+    devices = []
+    for device_id in sorted(os.listdir(SYSFS_TRIPLET_PATH)):
+        if not re.match(BUS_ID_PATTERN, device_id):
+            continue
+        path = SYSFS_TRIPLET_PATH + device_id
+        try:
+            device_ids = [os.path.basename(os.path.realpath(
+                os.path.join(path, 'cdev%d' % index))) for index in range(3)]
+            name = _read_sysfs_attr(path, 'if_name')
+            if not re.match(DEV_NAME_PATTERN, name):
+                continue
+            online = _read_sysfs_attr(path, 'online')
+            portno = _read_sysfs_attr(path, 'portno')
+            device = {'device_ids': device_ids,
+                      'name': name,
+                      'state': 'online' if online == '1' else 'offline',
+                      'card_type': _read_sysfs_attr(path, 'card_type'),
+                      'chpid': _read_sysfs_attr(path, 'chpid').upper(),
+                      'driver': 'qeth',
+                      'type': _read_sysfs_attr(path + '/cdev0', 'cutype'),
+                      'osa_portno': int(portno) if portno.isdigit()
+                      else 'n/a'}
+        except (IOError, OSError) as e:
+            wok_log.info('Failed to read network device %s from sysfs: %s'
+                         % (device_id, e))
+            return None
+        devices.append(device)
+    return devices
+
+
+def _get_sysfs_unconfigured_devices():
+    """
+    Read the qeth ccw devices which are not grouped yet from sysfs and
+    form triplets out of them, as listed by znetconf -u. A triplet is
+    made of three consecutive devices on the same CHPID, starting with
+    an even device number.
+    :return: list of device info in the format of _format_znetconf, or
+             None if it can not be read from sysfs and znetconf has
+             to be used
+    """
+    if not os.path.isdir(SYSFS_QETH_CCW_PATH):
+        return None
+    subchannels = []
+    for device_id in os.listdir(SYSFS_QETH_CCW_PATH):
+        if not re.match(BUS_ID_PATTERN, device_id):
+            continue
+        path = SYSFS_QETH_CCW_PATH + device_id
+        if os.path.exists(path + '/group_device'):
+            continue
+        try:
+            cu_type = _read_sysfs_attr(path, 'cutype')
+            chpid = _read_sysfs_attr(os.path.dirname(os.path.realpath(path)),
+                                     'chpids').split()[0].upper()
+        except (IOError, OSError, IndexError) as e:
+            wok_log.info('Failed to read network device %s from sysfs: %s'
+                         % (device_id, e))
+            return None
+        if cu_type in QETH_CARD_TYPES:
+            subchannels.append((chpid, device_id[:4], int(device_id[4:], 16),
+                                device_id, cu_type))
+    subchannels.sort()
+
+    devices = []
+    index = 0
+    while index + 2 < len(subchannels):
+        triplet = subchannels[index:index + 3]
+        read_dev = triplet[0]
+        if read_dev[2] % 2 == 0 and \
+                all(dev[:2] == read_dev[:2] and dev[4] == read_dev[4] and
+                    dev[2] == read_dev[2] + offset
+                    for offset, dev in enumerate(triplet)):
+            device_ids = [dev[3] for dev in triplet]
+            devices.append({'device_ids': device_ids,
+                            'name': device_ids[0],
+                            'state': 'Unconfigured',
+                            'card_type': QETH_CARD_TYPES[read_dev[4]],
+                            'chpid': read_dev[0],
+                            'driver': 'qeth',
+                            'type': read_dev[4],
+                            'osa_portno': 'n/a'})
+            index += 3
+        else:
+            index += 1
+    return sorted(devices, key=lambda device: device['name'])
+
+
 def _format_znetconf(device):
     """
     method to reform dictionary with new keys for znetconf devices
@@ -356,6 +551,8 @@ def _configure_interface(cb, params):
             cb('Successfully configured network device %s' % interface, True)
     except Exception as e:
         cb(e.message, False)
+    finally:
+        device_state.invalidate(*NETWORK_SUBSYSTEMS)
 
 
 def _unconfigure_interface(cb, interface):
@@ -377,6 +574,159 @@ def _unconfigure_interface(cb, interface):
         cb('Successfully un-configured network device %s' % interface, True)
     except Exception as e:
         cb(e.message, False)
+    finally:
+        device_state.invalidate(*NETWORK_SUBSYSTEMS)
+
+
+def _get_bulk_interfaces(devices):
+    """
+    Validate the network devices of a bulk action at once
+    :param devices: list of network device ids or interface names
+    :return: list of network device ids
+    """
+    if not isinstance(devices, list) or not devices:
+        raise InvalidParameter('GS390XIONW011E')
+    interfaces = []
+    for device in devices:
+        _validate_device(device)
+        if isinstance(device, unicode):
+            device = device.encode('utf-8')
+        interface = str(device).strip().replace(ENCCW, '')
+        if interface not in interfaces:
+            interfaces.append(interface)
+    known = set(name.replace(ENCCW, '') for name in
+                _get_configured_devices(key=UNIQUE_COL_NAME).keys() +
+                _get_unconfigured_devices(key=UNIQUE_COL_NAME).keys())
+    unknown = sorted(set(interfaces) - known)
+    if unknown:
+        wok_log.error('Given devices are not of type OSA. Devices: %s'
+                      % unknown)
+        raise NotFoundError('GS390XIONW006E', {'device': ', '.join(unknown)})
+    return interfaces
+
+
+def _get_result(func, *args):
+    """
+    :return: tuple of the result of func and None, or None and the
+             error message if func raised an exception
+    """
+    try:
+        return func(*args), None
+    except Exception as e:
+        return None, e.message
+
+
+def _report_bulk_result(cb, devices, failed, action, code):
+    """
+    Report the result of every device of a bulk action through the task
+    :param devices: network device ids
+    :param failed: dictionary of errors by network device id
+    :param action: 'configured' or 'un-configured'
+    :param code: error code raised if any device failed
+    """
+    done = [ENCCW + device for device in devices if device not in failed]
+    if failed:
+        error = ', '.join('%s%s: %s' % (ENCCW, device, failed[device])
+                          for device in sorted(failed))
+        wok_log.error('Failed bulk action on network devices. Error: %s'
+                      % error)
+        raise OperationFailed(code, {'device': ', '.join(
+            ENCCW + device for device in sorted(failed)),
+            'done': ', '.join(done) or '-', 'error': error})
+    cb('Successfully %s network devices %s' % (action, ', '.join(done)),
+       True)
+
+
+def _bulk_configure(cb, params):
+    """
+    Task function configuring and persisting network devices. znetconf
+    is run for several devices at a time and all the ifcfg files are
+    written with a single augeas save. Devices which were brought online
+    are brought back offline if they could not be persisted. Devices
+    already online on another port than the one requested fail.
+    :param params: tuple of list of network device ids and osa port number
+    """
+    devices, osa_portno = params
+    cb('')  # reset messages
+    try:
+        to_online = [device for device in devices
+                     if not _is_interface_online(device)]
+        results = run_in_parallel(
+            _get_result, [(_bring_online, device, osa_portno)
+                          for device in to_online], NWDEVICES_BULK_WORKERS)
+        failed = {}
+        ports = {}
+        for device, (port, error) in zip(to_online, results):
+            if error is None:
+                ports[device] = port
+            else:
+                failed[device] = error
+        brought_online = sorted(ports)
+        for device in devices:
+            if device in to_online:
+                continue
+            port = _get_osaport(device)
+            if isinstance(osa_portno, int) and port != osa_portno:
+                # the port of an online device is only changed through
+                # the update of its interface
+                failed[device] = 'already online on OSA port %s' % port
+            else:
+                ports[device] = port
+        if ports:
+            try:
+                with RollbackContext() as rollback:
+                    for device in brought_online:
+                        rollback.prependDefer(_bring_offline, device)
+                    for device in sorted(ports):
+                        if device in brought_online or not os.path.isfile(
+                                '/' + ifcfg_path.replace('<deviceid>',
+                                                         device)):
+                            _create_ifcfg_file(device)
+                    _write_ifcfg_params_list(ports)
+                    rollback.commitAll()
+            except Exception as e:
+                failed.update(dict.fromkeys(ports, e.message))
+        _report_bulk_result(cb, devices, failed, 'configured',
+                            'GS390XIONW012E')
+    except Exception as e:
+        cb(e.message, False)
+    finally:
+        device_state.invalidate(*NETWORK_SUBSYSTEMS)
+
+
+def _bulk_unconfigure(cb, devices):
+    """
+    Task function un-configuring and unpersisting network devices, with
+    znetconf run for several devices at a time. A device which was brought
+    offline is brought back online if it could not be unpersisted.
+    :param devices: list of network device ids
+    """
+    cb('')  # reset messages
+    try:
+        to_offline = [device for device in devices
+                      if _is_interface_online(device)]
+        results = run_in_parallel(
+            _get_result, [(_bring_offline, device) for device in to_offline],
+            NWDEVICES_BULK_WORKERS)
+        failed = dict((device, error) for device, (_, error)
+                      in zip(to_offline, results) if error is not None)
+        for device in devices:
+            if device in failed:
+                continue
+            try:
+                with RollbackContext() as rollback:
+                    if device in to_offline:
+                        rollback.prependDefer(_bring_online, device)
+                    _unpersist_interface(device)
+                    rollback.commitAll()
+            except Exception as e:
+                failed[device] = e.message
+        _report_bulk_result(cb, devices, failed, 'un-configured',
+                            'GS390XIONW013E')
+    except Exception as e:
+        cb(e.message, False)
+    finally:
+        device_state.invalidate(*NETWORK_SUBSYSTEMS)
 
 
 def _validate_device(interface):
@@ -537,6 +887,62 @@ def _unpersist_interface(interface):
                  'network device %s' % (ifcfg_file_path, interface))
 
 
+class IfcfgSession(object):
+    """
+    Augeas session parsing only the ifcfg files, kept open and shared
+    by the writes of network device attributes
+    """
+
+    def __init__(self, root='/'):
+        self._lock = threading.Lock()
+        self._root = root
+        self._parser = None
+
+    def _get_parser(self):
+        if self._parser is None:
+            # without NO_MODL_AUTOLOAD, the transforms of all the lenses
+            # would be registered and parsed by load()
+            parser = augeas.Augeas(self._root,
+                                   flags=augeas.Augeas.NO_LOAD |
+                                   augeas.Augeas.NO_MODL_AUTOLOAD)
+            parser.add_transform(IFCFG_LENS, IFCFG_INCL)
+            self._parser = parser
+        return self._parser
+
+    def write(self, params):
+        """
+        Write attributes of the ifcfg files of network devices with a
+        single save
+        :param params: dictionary by network device id of (attributes,
+                       osa_portno) tuples, attributes being a dictionary
+                       of ifcfg keys and values, OPTIONS being formed
+                       from osa_portno
+        """
+        with timed_lock(self._lock, 'ifcfg'):
+            try:
+                parser = self._get_parser()
+                # only parses the ifcfg files changed since the last load
+                parser.load()
+                for interface in sorted(params):
+                    cfgmap, osa_portno = params[interface]
+                    ifcfg_file_pattern = \
+                        ifcfg_path.replace('<deviceid>', interface) + '/'
+                    for key, value in cfgmap.iteritems():
+                        parser.set(ifcfg_file_pattern + key, value)
+                    # add OPTIONS attribute with layer2 and osa port number
+                    optns = _form_cfg_options_attr(
+                        osa_portno, parser.get(ifcfg_file_pattern + OPTIONS))
+                    parser.set(ifcfg_file_pattern + OPTIONS, optns)
+                parser.save()
+            except Exception:
+                # the tree may hold changes which failed to be saved
+                self._parser = None
+                raise
+
+
+ifcfg_session = IfcfgSession()
+
+
 def _write_ifcfg_params(interface, osa_portno):
     """
     method to write mandatory attributes to ifcfg file
@@ -546,43 +952,43 @@ def _write_ifcfg_params(interface, osa_portno):
     :param interface: network device id
     :return: None
     """
+    _write_ifcfg_params_list({interface: osa_portno})
+
+
+def _write_ifcfg_params_list(interfaces):
+    """
+    method to write mandatory attributes to ifcfg files
+    of network devices with a single augeas save
+
+    :param interfaces: dictionary of osa port numbers by network device id
+    :return: None
+    """
     wok_log.info('updating mandatory params to ifcfg file of '
-                 'network device %s to persist it' % interface)
+                 'network device %s to persist it'
+                 % ', '.join(sorted(interfaces)))
     configured_devices = _get_configured_devices(key=UNIQUE_COL_NAME)
-    device_info = configured_devices[ENCCW + interface]
-    sub_channels = ','.join(device_info['device_ids'])
-    device_name = device_info['name']
-    cfgmap = {DEVICE: device_name,
-              ONBOOT: 'yes',
-              SUBCHANNELS: sub_channels,
-              NETTYPE: 'qeth',
-              TYPE: ETHERNET}
-    ifcfg_file_pattern = ifcfg_path.replace('<deviceid>', interface) + '/'
-    ifcfg_file_path = '/' + ifcfg_path.replace('<deviceid>', interface)
-    parser = None
+    params = {}
+    for interface, osa_portno in interfaces.iteritems():
+        device_info = configured_devices[ENCCW + interface]
+        cfgmap = {DEVICE: device_info['name'],
+                  ONBOOT: 'yes',
+                  SUBCHANNELS: ','.join(device_info['device_ids']),
+                  NETTYPE: 'qeth',
+                  TYPE: ETHERNET}
+        params[interface] = (cfgmap, osa_portno)
     try:
-        parser = augeas.Augeas('/')
-        parser.load()
-        for key, value in cfgmap.iteritems():
-            path = ifcfg_file_pattern+key
-            parser.set(path, value)
-        # add OPTIONS attribute with layer2 and osa port number
-        optns = _form_cfg_options_attr(
-            osa_portno, parser.get(ifcfg_file_pattern+OPTIONS))
-        parser.set(ifcfg_file_pattern+OPTIONS, optns)
-        parser.save()
+        ifcfg_session.write(params)
     except Exception as e:
         wok_log.error('Failed to write device attributes to ifcfg file '
                       'using augeas tool. Error: %s' % e.message)
         raise OperationFailed('GS390XIONW002E',
-                              {'device': interface,
-                               'ifcfg_file_path': ifcfg_file_path,
+                              {'device': ', '.join(sorted(interfaces)),
+                               'ifcfg_file_path': ', '.join(
+                                   '/' + ifcfg_path.replace('<deviceid>', i)
+                                   for i in sorted(interfaces)),
                                'error': e.message})
-    finally:
-        if parser:
-            del parser
     wok_log.info('successfully updated mandatory params in ifcfg '
-                 'file of network device %s' % interface)
+                 'file of network device %s' % ', '.join(sorted(interfaces)))
 
 
 def _is_interface_online(interface):
@@ -772,18 +1178,10 @@ def _write_osaport_to_cfgfile(device_id, osa_portno):
         # ifcfg file and write persistence params
         return _persist_interface(device_id, osa_portno)
 
-    ifcfg_file_pattern = ifcfg_path.replace('<deviceid>', device_id) + '/'
     wok_log.info('Update osa port number "%s" in file "%s" usaing augeas'
                  % (osa_portno, ifcfg_file_path))
     try:
-        parser = augeas.Augeas('/')
-        parser.load()
-        wok_log.info('Get current osa port number "%s" from file "%s"'
-                     % (osa_portno, ifcfg_file_path))
-        optns = _form_cfg_options_attr(
-            osa_portno, parser.get(ifcfg_file_pattern+OPTIONS))
-        parser.set(ifcfg_file_pattern+OPTIONS, optns)
-        parser.save()
+        ifcfg_session.write({device_id: ({}, osa_portno)})
         wok_log.info('Updated osa port number "%s" in file "%s"'
                      % (osa_portno, ifcfg_file_path))
     except Exception as e:
@@ -794,7 +1192,5 @@ def _write_osaport_to_cfgfile(device_id, osa_portno):
                                'ifcfg_file_path': ifcfg_file_path,
                                'error': e.message})
     finally:
-        if parser:
-            del parser
         wok_log.info('End of _write_osaport_to_cfgfile(%s, %s) method'
                      % (device_id, osa_portno))
@@ -24,14 +24,24 @@ import os
 import re
 
 import model_utils as utils
+from executor import run_command
+from metrics import AsyncTask
+from model_utils import get_page, match_filters, Page, single_flight
+from uevent import device_state, STORAGE_SUBSYSTEMS
 from wok.exception import InvalidParameter, NotFoundError, OperationFailed
+from wok.model.tasks import TaskModel
 from wok.rollbackcontext import RollbackContext
-from wok.utils import run_command, wok_log
+from wok.utils import wok_log
 
 
 DEV_TYPES = ["dasd-eckd", "zfcp"]
 syspath_eckd = "/sys/bus/ccw/drivers/dasd-eckd/0.*/"
 syspath_zfcp = "/sys/bus/ccw/drivers/zfcp/0.*/"
+syspath_ccw_devices = "/sys/bus/ccw/devices/"
+# device info which is matched on sysfs attributes before the whole
+# device info is read
+SYSFS_FILTER_KEYS = ['status', 'device_type', 'cu_type',
+                     'installed_chipids', 'enabled_chipids']
 lscss = "lscss"
 chccwdev = 'chccwdev'
 LSCSS_DEV = "Device"
@@ -54,6 +64,9 @@ HEADER_PATTERN = r'(' + re.escape(LSCSS_DEV) + r')\s+' \
                  r'(' + re.escape(LSCSS_CHPID) + r')$'
 DASD_CONF = '/etc/dasd.conf'
 ZFCP_CONF = '/etc/zfcp.conf'
+ZFCP_DUMMY_LUN_INFO = '0x0000000000000000 0x0000000000000000'
+# maximum number of device ids or ranges passed to a single chccwdev
+CHCCWDEV_BATCH_SIZE = 256
 
 
 class StorageDevicesModel(object):
@@ -64,12 +77,38 @@ class StorageDevicesModel(object):
     def __init__(self, **kargs):
         pass
 
-    def get_list(self, _type=None):
+    @single_flight
+    def get_list(self, _type=None, _filters=None, _offset=None, _limit=None,
+                 _fields=None, _search=None, _sort=None):
         """
         :param _type: supported types are dasd-eckd, zfcp.
         Based on this devices will be retrieved
+        :param _filters: dictionary of values the devices have to match
+        :param _offset: number of devices to skip
+        :param _limit: maximum number of devices to return
+        :param _fields: device info keys to return
+        :param _search: phrase one of the returned keys has to contain
+        :param _sort: device info keys to sort the devices by
         :return: device data list.
         """
+        if device_state.live:
+            devices = device_state.get('storagedevices:%s' % _type,
+                                       STORAGE_SUBSYSTEMS,
+                                       lambda: self._get_list(_type))
+            return get_page(devices, _filters, _offset, _limit, _fields,
+                            _search, _sort)
+        if _search or _sort:
+            # all the devices matching the filters are needed to search
+            # and sort them before they are paged
+            devices = self._get_list(_type, _filters)
+            return get_page(devices, offset=_offset, limit=_limit,
+                            fields=_fields, search=_search, sort=_sort)
+        # no cached listing, so only the devices matching the filters
+        # and in the requested page are read
+        devices = self._get_list(_type, _filters, _offset, _limit)
+        return Page(get_page(devices, fields=_fields), devices.total)
+
+    def _get_list(self, _type, filters=None, offset=None, limit=None):
         device_paths = []
         if _type is None:
             device_paths.extend(utils.get_directories(syspath_eckd))
@@ -84,7 +123,21 @@ class StorageDevicesModel(object):
             raise InvalidParameter("GS390XINVTYPE",
                                    {'supported_type': DEV_TYPES})
         if not device_paths:
-            return []
+            return Page()
+        other_filters = dict(filters or {})
+        sysfs_filters = dict((key, other_filters.pop(key))
+                             for key in other_filters.keys()
+                             if key in SYSFS_FILTER_KEYS)
+        paths = _filter_sysfs_devices(device_paths, sysfs_filters)
+        if paths is not None:
+            if not other_filters:
+                paths = get_page(paths, offset=offset, limit=limit)
+            device_data_list = _get_sysfs_devicesinfo(paths)
+            if device_data_list is not None:
+                if other_filters:
+                    return get_page(device_data_list, other_filters,
+                                    offset, limit)
+                return Page(device_data_list, paths.total)
         command = [lscss]
         msg = 'The command executed is "%s" ' % command
         wok_log.debug(msg)
@@ -110,7 +163,7 @@ class StorageDevicesModel(object):
                                       unique_col='device',
                                       format_data=_format_lscss)
         device_data_list = _list_devicesinfo(devices, device_paths)
-        return device_data_list
+        return get_page(device_data_list, filters, offset, limit)
 
 
 class StorageDeviceModel(object):
@@ -133,6 +186,9 @@ class StorageDeviceModel(object):
         device = str(device)
         device = _validate_device(device)
         if _is_dasdeckd_device(device) or _is_zfcp_device(device):
+            device_info = _get_sysfs_deviceinfo(syspath_ccw_devices + device)
+            if device_info is not None:
+                return device_info
             command = [lscss, '-d', device]
             # Use join to handle unicode charater in device
             msg = 'The command is "%s" ' % ' '.join(command)
@@ -176,7 +232,10 @@ class StorageDeviceModel(object):
         :param device: device id
         """
         device = _validate_device(device)
-        _device_online(device)
+        try:
+            _device_online(device)
+        finally:
+            device_state.invalidate(*STORAGE_SUBSYSTEMS)
 
     def offline(self, device):
         """
@@ -184,7 +243,50 @@ class StorageDeviceModel(object):
         :param device: device id
         """
         device = _validate_device(device)
-        _device_offline(device)
+        try:
+            _device_offline(device)
+        finally:
+            device_state.invalidate(*STORAGE_SUBSYSTEMS)
+
+
+class StorageDevicesBulkModel(object):
+    """
+    Model class for actions on multiple Storage Devices
+    """
+
+    def __init__(self, **kargs):
+        self.objstore = kargs.get('objstore')
+        self.task = TaskModel(**kargs)
+
+    def lookup(self, name):
+        return {}
+
+    def online(self, name, devices):
+        """
+        Bring devices online in background and persist them.
+        :param devices: list of device ids or ranges of device ids
+                        Ex: ['0.0.0150', '0.0.0160-0.0.017f', '0190']
+        :return: task json
+        """
+        devices = _get_bulk_devices(devices)
+        wok_log.info('Create task for bringing %d devices online'
+                     % len(devices[0]))
+        taskid = AsyncTask('/plugins/gingers390x/storagedevices/bulk/online',
+                           _bulk_online, devices).id
+        return self.task.lookup(taskid)
+
+    def offline(self, name, devices):
+        """
+        Bring devices offline in background and unpersist them.
+        :param devices: list of device ids or ranges of device ids
+        :return: task json
+        """
+        devices = _get_bulk_devices(devices)
+        wok_log.info('Create task for bringing %d devices offline'
+                     % len(devices[0]))
+        taskid = AsyncTask('/plugins/gingers390x/storagedevices/bulk/offline',
+                           _bulk_offline, devices).id
+        return self.task.lookup(taskid)
 
 
 def _format_lscss(device):
@@ -290,6 +392,128 @@ def _get_deviceinfo(lscss_out, device):
         return device
 
 
+def _read_sysfs_attr(path, attr):
+    with open(os.path.join(path, attr)) as attr_file:
+        return attr_file.read().strip()
+
+
+def _get_sysfs_deviceinfo(device_path):
+    """
+    Read the lscss columns of a ccw device from sysfs
+    :param device_path: sysfs path of the ccw device, e.g.
+            /sys/bus/ccw/devices/0.0.0150
+    :return: device info dict formatted as by _format_lscss,
+             or None if the attributes can not be read
+    """
+    # /sys/devices/css0/<subchannel>/<device>
+    device_dir = os.path.realpath(device_path)
+    subchannel_dir = os.path.dirname(device_dir)
+    try:
+        online = _read_sysfs_attr(device_dir, 'online')
+        dev_type = _read_sysfs_devtype(device_dir)
+        cu_type = _read_sysfs_attr(device_dir, 'cutype')
+        pim, pam, pom, chpids = _read_sysfs_paths(subchannel_dir)
+    except (IOError, OSError, ValueError):
+        return None
+    return _format_lscss({
+        LSCSS_DEV: os.path.basename(device_dir),
+        LSCSS_SUBCH: os.path.basename(subchannel_dir),
+        LSCSS_DEVTYPE: dev_type,
+        LSCSS_CUTYPE: cu_type,
+        LSCSS_USE: 'yes' if online == '1' else '',
+        LSCSS_PIM: pim,
+        LSCSS_PAM: pam,
+        LSCSS_POM: pom,
+        LSCSS_CHPID: chpids})
+
+
+def _read_sysfs_devtype(device_dir):
+    dev_type = _read_sysfs_attr(device_dir, 'devtype')
+    if dev_type == 'n/a':
+        dev_type = '0000/00'
+    return dev_type
+
+
+def _read_sysfs_paths(subchannel_dir):
+    """
+    Read the path masks and CHPIDs of a subchannel from sysfs
+    :param subchannel_dir: sysfs directory of the subchannel
+    :return: tuple of PIM, PAM, POM and the CHPIDs as shown by lscss
+    """
+    pim, pam, pom = _read_sysfs_attr(subchannel_dir, 'pimpampom').split()
+    chpids = ''.join(_read_sysfs_attr(subchannel_dir, 'chpids').split())
+    return pim, pam, pom, chpids[:8] + ' ' + chpids[8:]
+
+
+def _get_sysfs_filter_info(device_path, keys):
+    """
+    Read only the device info needed to match filters from sysfs
+    :param device_path: sysfs path of the ccw device
+    :param keys: device info keys to read, out of SYSFS_FILTER_KEYS
+    :return: dict with the device info of the given keys,
+             or None if the attributes can not be read
+    """
+    device_dir = os.path.realpath(device_path)
+    info = {}
+    try:
+        if 'status' in keys:
+            online = _read_sysfs_attr(device_dir, 'online')
+            info['status'] = 'online' if online == '1' else 'offline'
+        if 'device_type' in keys:
+            info['device_type'] = _read_sysfs_devtype(device_dir)
+        if 'cu_type' in keys:
+            info['cu_type'] = _read_sysfs_attr(device_dir, 'cutype')
+        if 'installed_chipids' in keys or 'enabled_chipids' in keys:
+            pim, pam, pom, chpids = _read_sysfs_paths(
+                os.path.dirname(device_dir))
+            info['installed_chipids'] = _get_paths(_hex_to_binary(pim),
+                                                   chpids)
+            info['enabled_chipids'] = _get_paths(_hex_to_binary(pam),
+                                                 chpids)
+    except (IOError, OSError, ValueError, TypeError):
+        return None
+    return info
+
+
+def _filter_sysfs_devices(paths, filters):
+    """
+    Select the ccw devices matching the filters, reading only the
+    sysfs attributes the filters need
+    :param paths: list of sysfs paths of the devices
+    :param filters: dictionary of device info values to match,
+                    the keys must be in SYSFS_FILTER_KEYS
+    :return: list of the paths of the matching devices, or None if
+             any of the devices can not be read from sysfs
+    """
+    if not filters:
+        return paths
+    matching = []
+    for path in paths:
+        info = _get_sysfs_filter_info(path, filters.keys())
+        if info is None:
+            return None
+        if match_filters(info, filters):
+            matching.append(path)
+    return matching
+
+
+def _get_sysfs_devicesinfo(paths):
+    """
+    Read the lscss columns of ccw devices from sysfs
+    :param paths: list of sysfs paths of the devices
+    :return: list of device info dicts in the order of paths,
+             or None if any of the devices can not be read from
+             sysfs, in which case lscss has to be used
+    """
+    devicesinfo = []
+    for path in paths:
+        device_info = _get_sysfs_deviceinfo(path)
+        if device_info is None:
+            return None
+        devicesinfo.append(device_info)
+    return devicesinfo
+
+
 def _list_devicesinfo(devicesinfo_dict, paths):
     """
     :param devicesinfo_dict: dict with key as device id and
@@ -428,23 +652,11 @@ def _is_dasdeckd_persisted(device):
     Return True if device persent in DASD_CONF, else return False
     :param device: dasd-eckd device id
     """
-    if os.access(DASD_CONF, os.R_OK):
-        dasd_conf = None
-        try:
-            dasd_conf = open(DASD_CONF)
-            dasd_conf.seek(0, 0)
-            conf_content = dasd_conf.read()
-            if isinstance(conf_content, unicode):
-                conf_content = conf_content.encode('utf-8')
-            if isinstance(device, unicode):
-                device = device.encode('utf-8')
-            # both need to be in same format to search non ascii character
-            if re.search(br'(?i)%s' % device, conf_content):
-                return True
-        finally:
-            if dasd_conf:
-                dasd_conf.close()
-    return False
+    try:
+        return utils.get_conf_file(DASD_CONF).has_device(device)
+    except (IOError, OSError) as e:
+        wok_log.error("Failed to read %s: %s" % (DASD_CONF, e))
+        return False
 
 
 def _bring_online(device):
@@ -482,18 +694,12 @@ def _persist_dasdeckd_device(device):
     Add the dasd-eckd device id into DASD_CONF
     :param device: device id
     """
-    command_persist_dasdeckd = 'flock -w 1 %s -c \"echo %s >> %s\"' \
-                               % (DASD_CONF, device, DASD_CONF)
-    if isinstance(command_persist_dasdeckd, unicode):
-        # this is done as os.system only do ascii encoding
-        # so encode it in case any character other than ascii is present.
-        command_persist_dasdeckd = command_persist_dasdeckd.encode('utf-8')
-    if os.access(DASD_CONF, os.W_OK):
-        retcode = os.system(command_persist_dasdeckd)
-        if not retcode:
-            return
-    wok_log.error("Failed to persist dasd-eckd device: %s" % device)
-    raise OperationFailed("GS390XIOST002E", {'device': device})
+    try:
+        utils.get_conf_file(DASD_CONF).update(add_device_lines=[device])
+    except (IOError, OSError) as e:
+        wok_log.error("Failed to persist dasd-eckd device: %s. Error: %s"
+                      % (device, e))
+        raise OperationFailed("GS390XIOST002E", {'device': device})
 
 
 def _unpersist_dasdeckd_device(device):
@@ -501,18 +707,12 @@ def _unpersist_dasdeckd_device(device):
     Remove the dasd-eckd device id from DASD_CONF
     :param device: device id
     """
-    command_unpersist_dasdeckd = 'flock -w 1 %s -c \"sed -i \'/%s/Id\' %s\"'\
-                                 % (DASD_CONF, device, DASD_CONF)
-    if isinstance(command_unpersist_dasdeckd, unicode):
-        # this is done as os.system only do ascii encoding
-        # so encode it in case any character other than ascii is present.
-        command_unpersist_dasdeckd = command_unpersist_dasdeckd.encode('utf-8')
-    if os.access(DASD_CONF, os.W_OK):
-        retcode = os.system(command_unpersist_dasdeckd)
-        if not retcode:
-            return
-    wok_log.error("Failed to unpersist dasd-eckd device: %s" % device)
-    raise OperationFailed("GS390XIOST003E", {'device': device})
+    try:
+        utils.get_conf_file(DASD_CONF).update(remove_devices=[device])
+    except (IOError, OSError) as e:
+        wok_log.error("Failed to unpersist dasd-eckd device: %s. Error: %s"
+                      % (device, e))
+        raise OperationFailed("GS390XIOST003E", {'device': device})
 
 
 def _is_dasdeckd_device(device):
@@ -542,20 +742,13 @@ def _persist_zfcp_device(device):
     Add the zfcp device id and dummy lun info into ZFCP_CONF
     :param device: device id
     """
-    dummy_lun_info = '0x0000000000000000 0x0000000000000000'
-    persist_data = device + ' ' + dummy_lun_info
-    command_persist_zfcp = 'flock -w 1 %s -c \"echo %s >> %s\"' \
-                           % (ZFCP_CONF, persist_data, ZFCP_CONF)
-    if isinstance(command_persist_zfcp, unicode):
-        # this is done as os.system only do ascii encoding
-        # so encode it in case any character other than ascii is present.
-        command_persist_zfcp = command_persist_zfcp.encode('utf-8')
-    if os.access(ZFCP_CONF, os.W_OK):
-        retcode = os.system(command_persist_zfcp)
-        if not retcode:
-            return
-    wok_log.error("Failed to persist zfcp device: %s" % device)
-    raise OperationFailed("GS390XIOST005E", {'device': device})
+    try:
+        utils.get_conf_file(ZFCP_CONF).update(
+            add_device_lines=[device + ' ' + ZFCP_DUMMY_LUN_INFO])
+    except (IOError, OSError) as e:
+        wok_log.error("Failed to persist zfcp device: %s. Error: %s"
+                      % (device, e))
+        raise OperationFailed("GS390XIOST005E", {'device': device})
 
 
 def _unpersist_zfcp_device(device):
@@ -563,15 +756,247 @@ def _unpersist_zfcp_device(device):
     Remove the zfcp device entry from ZFCP_CONF
     :param device: device id
     """
-    command_unpersist_zfcp = 'flock -w 1 %s -c \"sed -i \'/%s/Id\' %s\"'\
-                             % (ZFCP_CONF, device, ZFCP_CONF)
-    if isinstance(command_unpersist_zfcp, unicode):
-        # this is done as os.system only do ascii encoding
-        # so encode it in case any character other than ascii is present.
-        command_unpersist_zfcp = command_unpersist_zfcp.encode('utf-8')
-    if os.access(ZFCP_CONF, os.W_OK):
-        retcode = os.system(command_unpersist_zfcp)
-        if not retcode:
-            return
-    wok_log.error("Failed to unpersist zfcp device: %s" % device)
-    raise OperationFailed("GS390XIOST006E", {'device': device})
+    try:
+        utils.get_conf_file(ZFCP_CONF).update(remove_devices=[device])
+    except (IOError, OSError) as e:
+        wok_log.error("Failed to unpersist zfcp device: %s. Error: %s"
+                      % (device, e))
+        raise OperationFailed("GS390XIOST006E", {'device': device})
+
+
+def _device_key(device):
+    """
+    Sort key of a validated device id, <cssid>.<ssid> and device number
+    """
+    return device[:4], int(device[4:], 16)
+
+
+def _expand_devices(devices):
+    """
+    Validate device ids and ranges of device ids and expand the ranges
+    :param devices: list of device ids or ranges of device ids
+    :return: tuple of list of unique device ids, in the order given, and
+             dictionary of the device id or range given for each of them
+    """
+    if not isinstance(devices, list) or not devices:
+        wok_log.error('Input is not a non-empty list. Input: %s' % devices)
+        raise InvalidParameter('GS390XINVINPUT',
+                               {'reason': 'input must be a non-empty list'
+                                          ' of device ids'})
+    expanded = []
+    input_ids = {}
+
+    def _add_device(device, input_id):
+        if device not in input_ids:
+            expanded.append(device)
+            input_ids[device] = input_id
+        elif '-' in input_ids[device] and '-' not in input_id:
+            # a device given explicitly is reported as given
+            input_ids[device] = input_id
+
+    for item in devices:
+        if isinstance(item, unicode):
+            item = item.encode('utf-8')
+        input_id = str(item).strip()
+        item = input_id.replace(' ', '')
+        if '-' not in item:
+            _add_device(_validate_device(item), input_id)
+            continue
+        first, _, last = item.partition('-')
+        first, last = _validate_device(first), _validate_device(last)
+        first_key, last_key = _device_key(first), _device_key(last)
+        if first_key[0] != last_key[0] or first_key[1] > last_key[1]:
+            wok_log.error("Invalid device range. Range: %s" % item)
+            raise InvalidParameter("GS390XINVINPUT",
+                                   {'reason': 'invalid device range: %s'
+                                              % item})
+        for devno in range(first_key[1], last_key[1] + 1):
+            _add_device('%s%04x' % (first_key[0], devno), input_id)
+    return expanded, input_ids
+
+
+def _get_bulk_devices(devices):
+    """
+    Validate the devices of a bulk action at once. Ranges may be sparse:
+    the device numbers of a range which are not dasd-eckd or zfcp devices
+    are skipped, while devices given explicitly must all exist.
+    :param devices: list of device ids or ranges of device ids
+    :return: tuple of list of all devices, set of dasd-eckd devices,
+             set of zfcp devices and dictionary of the device id or range
+             given for each device
+    """
+    devices, input_ids = _expand_devices(devices)
+    dasdeckd_devices = set(_get_dasdeckd_devices())
+    zfcp_devices = set(_get_zfcp_devices())
+    known = [device for device in devices
+             if device in dasdeckd_devices or device in zfcp_devices]
+    # explicit devices and ranges without any device are not found
+    found_ids = set(input_ids[device] for device in known)
+    unknown = []
+    for device in devices:
+        input_id = input_ids[device]
+        if input_id not in found_ids and input_id not in unknown:
+            unknown.append(input_id)
+    if unknown:
+        wok_log.error("Devices are not of type dasd-eckd or zfcp. "
+                      "Devices: %s" % unknown)
+        raise NotFoundError("GS390XSTG00023", {'device': ', '.join(unknown)})
+    skipped = len(devices) - len(known)
+    if skipped:
+        wok_log.info('Skipping %d device numbers of the given ranges '
+                     'which are not dasd-eckd or zfcp devices' % skipped)
+    return (known, dasdeckd_devices.intersection(known),
+            zfcp_devices.intersection(known), input_ids)
+
+
+def _format_device_ranges(devices):
+    """
+    Join devices into the device list argument of chccwdev, with
+    consecutive devices merged into ranges
+    Ex: ['0.0.0150', '0.0.0151', '0.0.0152', '0.0.0160']
+        gives '0.0.0150-0.0.0152,0.0.0160'
+    """
+    ranges = []
+    for device in sorted(devices, key=_device_key):
+        key = _device_key(device)
+        if ranges and ranges[-1][1] == (key[0], key[1] - 1):
+            ranges[-1][1] = key
+        else:
+            ranges.append([key, key])
+    return ','.join('%s%04x' % first if first == last else
+                    '%s%04x-%s%04x' % (first + last)
+                    for first, last in ranges)
+
+
+def _set_devices_state(devices, online, cb=None, progress_msg=None):
+    """
+    Bring devices online or offline with batched chccwdev calls
+    :param devices: device ids
+    :param online: True to bring the devices online, False for offline
+    :param cb: task callback reporting the progress
+    :param progress_msg: progress message with 'done' and 'total' keys
+    :return: tuple of list of changed devices and dictionary of errors
+             of the devices which could not be changed
+    """
+    changed = []
+    failed = {}
+    option = '-e' if online else '-d'
+    for index in range(0, len(devices), CHCCWDEV_BATCH_SIZE):
+        batch = devices[index:index + CHCCWDEV_BATCH_SIZE]
+        command = [chccwdev, option, _format_device_ranges(batch)]
+        out, err, rc = run_command(command)
+        err = ','.join(line.strip() for line in err.splitlines())
+        # chccwdev processes the whole list even if some devices fail,
+        # so check the state of each device
+        for done, device in enumerate(batch, index + 1):
+            if _is_online(device) == online:
+                changed.append(device)
+            else:
+                failed[device] = err or 'rc = %s' % rc
+            if cb:
+                cb(progress_msg % {'done': done, 'total': len(devices)})
+    if failed:
+        wok_log.error("Failed to bring devices %s %s. Error: %s"
+                      % (sorted(failed), 'online' if online else 'offline',
+                         failed.values()[0]))
+    return changed, failed
+
+
+def _bulk_persist(dasdeckd_devices, zfcp_devices, persist, rollback=None):
+    """
+    Add or remove devices in DASD_CONF and ZFCP_CONF
+    :param rollback: RollbackContext reverting the update of each file
+                     updated
+    """
+    for conf_file, devices, lines, code in [
+            (DASD_CONF, dasdeckd_devices, sorted(dasdeckd_devices),
+             "GS390XIOST002E" if persist else "GS390XIOST003E"),
+            (ZFCP_CONF, zfcp_devices,
+             [d + ' ' + ZFCP_DUMMY_LUN_INFO for d in sorted(zfcp_devices)],
+             "GS390XIOST005E" if persist else "GS390XIOST006E")]:
+        if not devices:
+            continue
+        conf = utils.get_conf_file(conf_file)
+        try:
+            if persist:
+                added, removed = conf.update(add_device_lines=lines)
+            else:
+                added, removed = conf.update(remove_devices=devices)
+            if rollback is not None:
+                rollback.prependDefer(conf.update, add_lines=removed,
+                                      remove_lines=added)
+        except (IOError, OSError) as e:
+            wok_log.error("Failed to update %s: %s" % (conf_file, e))
+            raise OperationFailed(code, {'device': ', '.join(sorted(devices))})
+
+
+def _bulk_set_state(cb, params, online):
+    """
+    Task function bringing devices online or offline and updating
+    the configuration files. On failure, devices which changed state
+    are brought back to their previous state.
+    :param params: tuple returned by _get_bulk_devices()
+    :param online: True to bring the devices online, False for offline
+    """
+    devices, dasdeckd_devices, zfcp_devices, input_ids = params
+    state = 'online' if online else 'offline'
+    cb('')  # reset messages
+    try:
+        to_change = [device for device in devices
+                     if _is_online(device) != online]
+        changed, failed = _set_devices_state(
+            to_change, online, cb,
+            'Bringing devices ' + state + ': %(done)s of %(total)s done')
+        with RollbackContext() as rollback:
+            rollback.prependDefer(_set_devices_state, changed, not online)
+            if failed:
+                failed_ids, error = _format_failed_devices(failed, devices,
+                                                           input_ids)
+                raise OperationFailed("GS390XIOST001E" if online
+                                      else "GS390XIOST004E",
+                                      {'device': failed_ids,
+                                       'error': error})
+            _bulk_persist(dasdeckd_devices, zfcp_devices, online, rollback)
+            rollback.commitAll()
+        wok_log.info('Successfully brought %d devices %s'
+                     % (len(devices), state))
+        cb('Successfully brought devices %s %s'
+           % (_format_device_ranges(devices), state), True)
+    except Exception as e:
+        cb(e.message, False)
+    finally:
+        device_state.invalidate(*STORAGE_SUBSYSTEMS)
+
+
+def _format_failed_devices(failed, devices, input_ids):
+    """
+    Report the devices which failed with the device ids and ranges given
+    by the caller, a device failing within a range is named after it
+    :param failed: dictionary of the error of each failed device
+    :param devices: all the devices, in the order given
+    :param input_ids: dictionary of the device id or range given for each
+                      device
+    :return: tuple of the device ids and ranges containing failed
+             devices and the errors of the failed devices
+    """
+    failed_ids = []
+    errors = []
+    for device in devices:
+        if device not in failed:
+            continue
+        input_id = input_ids.get(device, device)
+        if input_id not in failed_ids:
+            failed_ids.append(input_id)
+        if '-' in input_id:
+            errors.append('%s (%s): %s' % (input_id, device, failed[device]))
+        else:
+            errors.append('%s: %s' % (input_id, failed[device]))
+    return ', '.join(failed_ids), ', '.join(errors)
+
+
+def _bulk_online(cb, params):
+    _bulk_set_state(cb, params, True)
+
+
+def _bulk_offline(cb, params):
+    _bulk_set_state(cb, params, False)
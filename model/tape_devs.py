@@ -18,6 +18,10 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 import utils
 
+from model_utils import single_flight
+from uevent import device_state, TAPE_SUBSYSTEMS
+from wok.exception import NotFoundError
+
 
 class TapeDevsModel(object):
     """
@@ -27,6 +31,31 @@ class TapeDevsModel(object):
     def __init__(self, **kargs):
         pass
 
+    @single_flight
     def get_list(self):
+        # kept until a SCSI device is added or removed
+        inventory = device_state.get('tapedevs', TAPE_SUBSYSTEMS,
+                                     utils.get_tape_inventory)
+        return sorted(inventory.values(),
+                      key=lambda tape: utils.natural_sort_key(tape['Generic']))
+
+
+class TapeDevModel(object):
+    """
+    Model to represent a single tape device
+    """
+
+    def __init__(self, **kargs):
+        pass
 
-        return utils.get_final_tape_list()
+    def lookup(self, name):
+        """
+        :param name: sg device of the tape device
+        :return: dictionary with the details of the tape device, see
+                 utils.get_tape_inventory()
+        """
+        try:
+            return device_state.get_item('tapedevs', TAPE_SUBSYSTEMS,
+                                         utils.get_tape_inventory, name)
+        except KeyError:
+            raise NotFoundError("GS390XSTG00027", {'device': name})
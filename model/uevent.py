@@ -0,0 +1,318 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM Corp, 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import copy
+import errno
+import os
+import Queue
+import socket
+import threading
+import time
+
+from wok.utils import wok_log
+
+
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+UEVENT_BUFSIZE = 16384
+UEVENT_SUBSYSTEMS = ['ccw', 'ccwgroup', 'css', 'chp', 'zfcp', 'scsi',
+                     'scsi_generic', 'scsi_tape']
+
+# the installed and enabled CHPIDs of storage devices change with the
+# subchannel (css) and channel path (chp) events
+STORAGE_SUBSYSTEMS = ['ccw', 'css', 'chp']
+NETWORK_SUBSYSTEMS = ['ccw', 'ccwgroup']
+FCLUN_SUBSYSTEMS = ['ccw', 'zfcp', 'scsi_generic']
+TAPE_SUBSYSTEMS = ['scsi', 'scsi_generic', 'scsi_tape']
+# bounds in seconds of the interval between two checks of the paths
+# waited for, waiters are woken up earlier by uevents
+PATH_WAIT_MIN_INTERVAL = 0.01
+PATH_WAIT_MAX_INTERVAL = 0.5
+
+
+def parse_uevent(data):
+    """
+    Parse a kernel uevent message as received from the netlink socket.
+    sample message (fields are separated by NUL characters):
+    change@/devices/css0/0.0.0001/0.0.0150\\0ACTION=change\\0
+    DEVPATH=/devices/css0/0.0.0001/0.0.0150\\0SUBSYSTEM=ccw\\0SEQNUM=1823\\0
+    :param data: raw message
+    :return: dictionary of the event properties, or None if the message
+             is not a kernel uevent (e.g. one re-broadcasted by udevd)
+    """
+    fields = data.split('\0')
+    if '@' not in fields[0]:
+        return None
+    event = {}
+    for field in fields[1:]:
+        if '=' in field:
+            key, value = field.split('=', 1)
+            event[key] = value
+    if 'ACTION' not in event:
+        event['ACTION'], event['DEVPATH'] = fields[0].split('@', 1)
+    return event
+
+
+class NetlinkEventSource(object):
+    """
+    Source of kernel uevents read from a NETLINK_KOBJECT_UEVENT socket
+    """
+
+    def __init__(self):
+        self._sock = None
+
+    def open(self):
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM,
+                                   NETLINK_KOBJECT_UEVENT)
+        self._sock.bind((os.getpid(), UEVENT_KERNEL_GROUP))
+
+    def receive(self):
+        """
+        Block until the next uevent arrives
+        :return: event dictionary, {} if events were lost or
+                 None if the source was closed
+        """
+        while True:
+            try:
+                data = self._sock.recv(UEVENT_BUFSIZE)
+            except socket.error as e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno == errno.ENOBUFS:
+                    # receive buffer overrun, some events were dropped
+                    return {}
+                return None
+            if not data:
+                return None
+            event = parse_uevent(data)
+            if event is not None:
+                return event
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            self._sock.close()
+
+
+class FakeEventSource(object):
+    """
+    Local source of uevents, used to drive the device state store
+    without s390 hardware
+    """
+
+    def __init__(self):
+        self._queue = Queue.Queue()
+        self._pending = False
+
+    def open(self):
+        pass
+
+    def emit(self, action, subsystem, devpath, **properties):
+        event = dict(properties)
+        event.update({'ACTION': action, 'SUBSYSTEM': subsystem,
+                      'DEVPATH': devpath})
+        self._queue.put(event)
+
+    def drop(self):
+        """
+        Simulate an overrun of the receive buffer
+        """
+        self._queue.put({})
+
+    def receive(self):
+        # the monitor asks for the next event only once the previous
+        # one was handled
+        if self._pending:
+            self._queue.task_done()
+        event = self._queue.get()
+        self._pending = True
+        return event
+
+    def wait(self):
+        """
+        Block until every emitted event was handled
+        """
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+
+
+class DeviceStateStore(object):
+    """
+    In-process store of device listings. Listings are kept until a
+    uevent is received for one of the subsystems they depend on, so
+    listing devices does not need to fork lscss/znetconf/lszfcp or
+    rescan sysfs while nothing changed.
+    The store is only used while a uevent monitor is running, otherwise
+    every lookup calls its loader.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generations = dict.fromkeys(UEVENT_SUBSYSTEMS, 0)
+        self._entries = {}
+        self._source = None
+        self._thread = None
+        self._path_waiters = threading.Condition()
+
+    @property
+    def live(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, source=None):
+        """
+        Start listening for uevents
+        :param source: event source, kernel netlink socket by default
+        :return: True if the monitor is running
+        """
+        if self.live:
+            return True
+        if source is None:
+            source = NetlinkEventSource()
+        try:
+            source.open()
+        except (AttributeError, socket.error) as e:
+            wok_log.warning("Unable to listen for kernel uevents, device "
+                            "state will not be cached: %s" % e)
+            return False
+        self.invalidate()
+        self._source = source
+        self._thread = threading.Thread(target=self._monitor,
+                                        args=(source,),
+                                        name='gingers390x-uevent')
+        self._thread.setDaemon(True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if self._source is None:
+            return
+        source, thread = self._source, self._thread
+        self._source = None
+        source.close()
+        thread.join()
+        self.invalidate()
+
+    def _monitor(self, source):
+        try:
+            while True:
+                event = source.receive()
+                if event is None:
+                    break
+                self.handle_event(event)
+        except Exception as e:
+            wok_log.error("uevent monitor stopped: %s" % e)
+        finally:
+            self.invalidate()
+
+    def handle_event(self, event):
+        if not event:
+            # events were lost, nothing can be trusted
+            self.invalidate()
+        else:
+            subsystem = event.get('SUBSYSTEM')
+            if subsystem in self._generations:
+                wok_log.debug("uevent %s %s on %s" % (event.get('ACTION'),
+                                                      event.get('DEVPATH'),
+                                                      subsystem))
+                self.invalidate(subsystem)
+        with self._path_waiters:
+            self._path_waiters.notify_all()
+
+    def wait_for_paths(self, paths, timeout):
+        """
+        Wait for sysfs paths to appear, e.g. the directory of a LUN after
+        a unit_add write. Paths are checked again on every uevent, and at
+        growing intervals in case no uevent monitor is running.
+        :param paths: list of paths
+        :param timeout: maximum time to wait in seconds
+        :return: True if all the paths exist, False on timeout
+        """
+        deadline = time.time() + timeout
+        interval = PATH_WAIT_MIN_INTERVAL
+        with self._path_waiters:
+            while True:
+                paths = [path for path in paths if not os.path.exists(path)]
+                if not paths:
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._path_waiters.wait(min(interval, remaining))
+                interval = min(interval * 2, PATH_WAIT_MAX_INTERVAL)
+
+    def invalidate(self, *subsystems):
+        """
+        Drop the listings depending on the given subsystems, or all
+        listings if no subsystem is given
+        """
+        with self._lock:
+            for subsystem in subsystems or self._generations.keys():
+                self._generations[subsystem] += 1
+            if not subsystems:
+                self._entries.clear()
+
+    def _get_generation(self, subsystems):
+        return tuple(self._generations[s] for s in subsystems)
+
+    def get(self, key, subsystems, loader):
+        """
+        Get a device listing
+        :param key: name of the listing
+        :param subsystems: subsystems whose uevents invalidate the listing
+        :param loader: function returning the current listing
+        :return: copy of the listing
+        """
+        if not self.live:
+            return loader()
+        return copy.deepcopy(self._get_shared(key, subsystems, loader))
+
+    def get_item(self, key, subsystems, loader, item):
+        """
+        Get a single item of a device listing indexed by device, without
+        copying the whole listing
+        :param item: key of the item in the dictionary returned by loader
+        :return: copy of the item, KeyError if it is not in the listing
+        """
+        if not self.live:
+            return loader()[item]
+        return copy.deepcopy(self._get_shared(key, subsystems, loader)[item])
+
+    def _get_shared(self, key, subsystems, loader):
+        """
+        :return: the listing kept in the store, which must not be modified
+        """
+        with self._lock:
+            generation = self._get_generation(subsystems)
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+        value = loader()
+        with self._lock:
+            # keep it only if no event arrived while it was loaded
+            if self._get_generation(subsystems) == generation:
+                self._entries[key] = (generation, value)
+        return value
+
+
+device_state = DeviceStateStore()
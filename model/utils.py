@@ -20,14 +20,22 @@
 
 
 import ConfigParser
+import contextlib
+import copy
 import glob
 import re
 import os
+import threading
+import time
 
 from ConfigParser import ParsingError
-from wok.exception import OperationFailed, InvalidParameter
+from executor import run_command
+from metrics import lun_discovery_duration, timed_lock
+from model_utils import get_conf_file, run_in_parallel
+from uevent import device_state
+from wok.exception import OperationFailed, InvalidParameter, NotFoundError
 from os import listdir
-from wok.utils import run_command, wok_log
+from wok.utils import wok_log
 
 res_hash = {}
 adapters = []
@@ -37,8 +45,27 @@ adapter_dir = '/sys/bus/ccw/drivers/zfcp/'
 wlun = "0xc101000000000000"
 lun0 = "0x0000000000000000"
 sg_dir = "/sys/class/scsi_generic/"
-udevadm = "/sbin/udevadm"
 scsi_dir = '/sys/bus/scsi/devices/'
+block_dir = '/sys/block/'
+zfcp_conf = '/etc/zfcp.conf'
+
+# Maximum time in seconds to wait for the sysfs directory of a LUN to
+# appear after a unit_add write
+LUN_WAIT_TIMEOUT = 10
+# Maximum number of remote ports whose LUNs are discovered concurrently
+LUN_DISCOVERY_WORKERS = 8
+# SCSI peripheral device types of the tape devices, as named by lstape
+TAPE_SCSI_TYPES = {'1': 'tapedrv', '8': 'changer'}
+# class directory and name pattern of the device node of every tape type
+TAPE_CLASS_DIRS = {'tapedrv': ('scsi_tape', r'st\d+$'),
+                   'changer': ('scsi_changer', r'sch\d+$')}
+# Seconds the details of a LUN returned by get_lun_info() are reused
+LUN_INFO_CACHE_TTL = 60
+# Object store type of the LUNs cached for every remote port
+LUN_INVENTORY = 'fcluns_inventory'
+PORT_STATE_ATTRS = ['failed', 'in_recovery', 'access_denied']
+port_locks = {}
+port_locks_lock = threading.Lock()
 
 
 def update_lun_dict(lun_dict, adapter, port, fcp_lun):
@@ -70,23 +97,8 @@ def _get_lun_dict():
     """
     lun_dict = {}
 
-    # Get the list of sg devices of configured LUNs (FC)
-    sg_devices = get_sg_devices()
-
-    # Iterate over all FC sg devices
-    for sg_dev in sg_devices:
-        wwpn = open(sg_dir + "/" + sg_dev + "/device/wwpn").readline().rstrip()
-        fcp_lun = open(
-            sg_dir +
-            "/" +
-            sg_dev +
-            "/device/fcp_lun").readline().rstrip()
-        hba_id = open(
-            sg_dir +
-            "/" +
-            sg_dev +
-            "/device/hba_id").readline().rstrip()
-
+    # Iterate over all FC sg devices of configured LUNs
+    for (hba_id, wwpn, fcp_lun), sg_dev in sg_index.get_items():
         if hba_id not in lun_dict:
             lun_dict[hba_id] = {}
 
@@ -98,7 +110,8 @@ def _get_lun_dict():
 
         # Lets see what other LUNs we can disocover using LUN 0
         if fcp_lun == lun0 or fcp_lun == wlun:
-            out, err, rc = run_command(['sg_luns', '/dev/' + sg_dev])
+            with lun_discovery_duration.time(phase='sg_luns'):
+                out, err, rc = run_command(['sg_luns', '/dev/' + sg_dev])
             if rc == 0:
                 luns = parse_sg_luns(out)
                 for lun in luns:
@@ -178,158 +191,50 @@ def clear_multipath(dm_long_name):
         raise OperationFailed("GS390XSTG0018E", {'err': err})
 
 
-def find_other_paths(sg_device):
-    """
-    Find the other paths of to the same disk
-    @param sg_device: sg device to find paths from.
-    @return : list of tuples represeting each path
-    """
-    other_paths = []
-    sg_dev_path = sg_dir + "/" + sg_device
-    dm_slaves = []
-    try:
-        block_dev = os.listdir(sg_dev_path + "/device/block/")[0]
-        dm_dev = os.listdir(
-            sg_dev_path +
-            "/device/block/" +
-            block_dev +
-            "/holders/")[0]
-        dm_slaves_path = sg_dev_path + "/device/block/" + \
-            block_dev + "/holders/" + dm_dev + "/slaves"
-        dm_slaves = os.listdir(dm_slaves_path)
-        dm_slaves.remove(block_dev)
-    except:
-        # Either the dm device associated with this device
-        # is removed or some other thread issued 'multipath -f device'
-        # It's alright to continue normally in that case.
-        pass
-
-    for dm_slave in dm_slaves:
-        try:
-            dm_slave_device_path = dm_slaves_path + "/" + dm_slave + "/device"
-
-            wwpn = open(dm_slave_device_path + "/wwpn").readline().rstrip()
-            fcp_lun = open(
-                dm_slave_device_path +
-                "/fcp_lun").readline().rstrip()
-            hba_id = open(
-                dm_slave_device_path +
-                "/hba_id").readline().rstrip()
-            other_paths.append((hba_id, wwpn, fcp_lun))
-        except:
-            # Some other thread might have deleted the path
-            # that we are trying to delete. Just move on with
-            # normal flow from here.
-            pass
-
-    return other_paths
-
-
 def remove_lun(adapter, port, lun_id):
     """
     Remove a LUN from system
     :param adapter: HBA adapter id
     :param port: Remote port wwpn
     :param lun_id: Id of the given LUN
+    :return: List of (adapter, port, lun_id) tuples of all the paths removed
     """
-    luns = []
-
-    # get lun information using lszfcp -l
-    out, err, rc = run_command(['lszfcp', '-l', lun_id])
-    if out:
-        parsed_zfcp_out = parse_lszfcp_out(out)
-        if parsed_zfcp_out and isinstance(parsed_zfcp_out, dict):
-            for path, scsi_dev in parsed_zfcp_out.iteritems():
-                dm_long_name = None
-                try:
-                    path = path.split('/')
-                    luns.append((path[0], path[1], path[2]))
-
-                    scsi_dev_dir = scsi_dir + scsi_dev
-                    block_dev = os.listdir(scsi_dev_dir + "/block/")[0]
-                    dm_dev = os.listdir(
-                        scsi_dev_dir +
-                        "/block/" +
-                        block_dev +
-                        "/holders/")[0]
-                    with open(scsi_dev_dir + "/block/" +
-                              block_dev + "/holders/" +
-                              dm_dev + "/dm/name", 'r') as txt_file:
-                        dm_long_name = txt_file.readline().rstrip()
-
-                except:
-                    # It may happen that the given device may not have
-                    # a corresponding dm device. In that case just
-                    # move on without doing anything.
-                    pass
-                if dm_long_name:
-                    clear_multipath(dm_long_name)
-                remove_auto_lun(scsi_dev)
-
+    # all the paths to the same disk are removed along with its
+    # multipath device
+    multipath = multipath_map.get_multipath(adapter, port, lun_id)
+    if multipath is not None:
+        paths = multipath['paths']
+        clear_multipath(multipath['name'])
     else:
-        # try checking sg entries in scci_generic
-        # Let's look for the sg_device associated with this LUN
-        sg_dev = get_sg_dev(adapter, port, lun_id)
-        if sg_dev:
-            luns.append((adapter, port, lun_id))
-            sg_device = sg_dev
-            sg_dev_path = sg_dir + "/" + sg_device
-            other_paths = find_other_paths(sg_device)
-            for op in other_paths:
-                hba_id = op[0]
-                wwpn = op[1]
-                fcp_lun = op[2]
-                luns.append((hba_id, wwpn, fcp_lun))
-            dm_long_name = None
-            try:
-                block_dev = os.listdir(sg_dev_path + "/device/block/")[0]
-                dm_dev = os.listdir(
-                    sg_dev_path +
-                    "/device/block/" +
-                    block_dev +
-                    "/holders/")[0]
-                dm_long_name = open(
-                    sg_dev_path +
-                    "/device/block/" +
-                    block_dev +
-                    "/holders/" +
-                    dm_dev +
-                    "/dm/name").readline().rstrip()
-            except:
-                # It may happen that the given device may not have
-                # a corresponding dm device. In that case just
-                # move on without doing anything.
-                pass
-            if dm_long_name:
-                clear_multipath(dm_long_name)
+        paths = [_get_single_path(adapter, port, lun_id)]
+
+    luns = []
+    for path in paths:
+        luns.append((path['hbaId'], path['remoteWwpn'], path['lunId']))
+        if path['scsiDev']:
+            remove_auto_lun(path['scsiDev'])
 
     for lun in luns:
         port_dir = '/sys/bus/ccw/drivers/zfcp/' + lun[0] + '/' + lun[1] + '/'
         lun_dir = port_dir + lun[2]
         wok_log.info("Removing LUN, %s", lun_dir)
 
-        if not os.path.exists(lun_dir):
-            continue  # move on... some other thread removed this LUN already
+        with timed_lock(get_port_lock(lun[0], lun[1]), 'fc_port'):
+            if not os.path.exists(lun_dir):
+                continue  # some other thread removed this LUN already
 
-        try:
-            with open(port_dir + 'unit_remove', "w") as txt_file:
-                txt_file.write(lun[2])
-
-            fo = open("/etc/zfcp.conf", "r")
-            lines = fo.readlines()
-            output = []
-            fo.close()
-            fo = open("/etc/zfcp.conf", "w")
-            for line in lines:
-                if [lun[0], lun[1], lun[2]] == line.split():
-                    continue
-                else:
-                    output.append(line)
-            fo.writelines(output)
-            fo.close()
-        except Exception as e:
-            wok_log.error("Unable to remove LUN, %s", lun_dir)
-            raise OperationFailed("GS390XSTG00002", {'err': e.message})
+            try:
+                with open(port_dir + 'unit_remove', "w") as txt_file:
+                    txt_file.write(lun[2])
+
+                get_conf_file(zfcp_conf).update(remove_lines=[' '.join(lun)])
+            except Exception as e:
+                wok_log.error("Unable to remove LUN, %s", lun_dir)
+                raise OperationFailed("GS390XSTG00002", {'err': e.message})
+            finally:
+                lun_info_cache.invalidate(lun[0], lun[1])
+
+    return luns
 
 
 def add_lun(adapter, port, lun_id):
@@ -345,187 +250,581 @@ def add_lun(adapter, port, lun_id):
 
     wok_log.info("Adding LUN, %s", lun_dir)
 
-    if os.path.exists(lun_dir):
-        # LUN already present on the system, nothing to add.
-        return
-    else:
+    with timed_lock(get_port_lock(adapter, port), 'fc_port'):
+        if os.path.exists(lun_dir):
+            # LUN already present on the system, nothing to add.
+            return
         try:
             with open(port_dir + 'unit_add', "w") as txt_file:
                 txt_file.write(lun_id)
 
-            for _ in range(4):
-                # Don't wait for udev queue to completely flush.
-                # Wait for the relavant entry for this LUN is created in sysfs
-                run_command([udevadm, "settle", "--exit-if-exists=" + lun_dir])
-                if os.path.exists(lun_dir):
-                    entry_exists = False
-                    fo = open("/etc/zfcp.conf", "r")
-                    lines = fo.readlines()
-                    for line in lines:
-                        if [adapter, port, lun_id] == line.split():
-                            entry_exists = True
-                    fo.close()
-                    if not entry_exists:
-                        with open("/etc/zfcp.conf", "a") as zfcp:
-                            zfcp.write(
-                                adapter + " " + port + " " + lun_id + "\n")
-                    break
+            # Don't wait for udev queue to completely flush.
+            # Wait for the relavant entry for this LUN is created in sysfs
+            if wait_for_luns([lun_dir]):
+                get_conf_file(zfcp_conf).update(
+                    add_lines=[adapter + " " + port + " " + lun_id])
 
         except Exception as e:
             wok_log.error("Unable to add LUN, %s", lun_dir)
             raise OperationFailed("GS390XSTG00003", {'err': e.message})
+        finally:
+            lun_info_cache.invalidate(adapter, port)
 
 
-def get_lun_info(adapter, port, lun_id):
+def add_luns(luns):
     """
-    Get detailed information about a specific LUN
+    Add multiple LUNs to system. The unit_add writes of all the LUNs are
+    issued first, then all their sysfs directories are waited for and the
+    LUNs which appeared are persisted in a single rewrite of zfcp.conf.
+    :param luns: list of (adapter, port, lun_id) tuples
+    :return: tuple of the list of (adapter, port, lun_id) tuples added and
+             a dictionary of the error by tuple of the LUNs not added
+    """
+    luns = sorted(set(luns))
+    ports = sorted(set(lun[:2] for lun in luns))
+    added = []
+    failed = {}
+
+    with _hold_port_locks(ports):
+        pending = []
+        for lun in luns:
+            port_dir = adapter_dir + lun[0] + '/' + lun[1] + '/'
+            if os.path.exists(port_dir + lun[2]):
+                # LUN already present on the system, only persist it
+                added.append(lun)
+                continue
+            wok_log.info("Adding LUN, %s", port_dir + lun[2])
+            try:
+                with lun_discovery_duration.time(phase='unit_add'):
+                    with open(port_dir + 'unit_add', "w") as txt_file:
+                        txt_file.write(lun[2])
+                pending.append(lun)
+            except (IOError, OSError) as e:
+                wok_log.error("Unable to add LUN, %s", port_dir + lun[2])
+                failed[lun] = e.strerror or str(e)
+
+        wait_for_luns([adapter_dir + '/'.join(lun) for lun in pending])
+        for lun in pending:
+            if os.path.exists(adapter_dir + '/'.join(lun)):
+                added.append(lun)
+            else:
+                failed[lun] = 'LUN did not appear in sysfs'
+        for adapter, port in ports:
+            lun_info_cache.invalidate(adapter, port)
+
+        if added:
+            try:
+                get_conf_file(zfcp_conf).update(
+                    add_lines=[' '.join(lun) for lun in added])
+            except (IOError, OSError) as e:
+                wok_log.error("Unable to update %s, %s", zfcp_conf, e)
+                raise OperationFailed("GS390XSTG00003", {'err': str(e)})
+
+    return sorted(added), failed
+
+
+def wait_for_luns(lun_dirs):
+    """
+    Wait for the sysfs directories of LUNs to appear after unit_add writes.
+    Returns as soon as they all exist, without waiting for the whole udev
+    queue to be processed.
+    :param lun_dirs: list of LUN directories
+    :return: True if all the directories exist, False on timeout
+    """
+    if not lun_dirs:
+        return True
+    with lun_discovery_duration.time(phase='udev_wait'):
+        if device_state.wait_for_paths(lun_dirs, LUN_WAIT_TIMEOUT):
+            return True
+    wok_log.error("Timed out waiting for LUNs, %s", ', '.join(
+        path for path in lun_dirs if not os.path.exists(path)))
+    return False
+
+
+@contextlib.contextmanager
+def _hold_port_locks(ports):
+    """
+    Hold the locks of several remote ports, acquired in the given order
+    :param ports: sorted list of (adapter, port) tuples
+    """
+    if not ports:
+        yield
+        return
+    with timed_lock(get_port_lock(*ports[0]), 'fc_port'):
+        with _hold_port_locks(ports[1:]):
+            yield
+
+
+class LUNInfoCache(object):
+    """
+    Details of single LUNs returned by get_lun_info(), kept until the LUNs
+    of their remote port are changed through this plugin or
+    LUN_INFO_CACHE_TTL expires
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (adapter, port, lun_id) -> (timestamp, lun info)
+        self._entries = {}
+
+    def get(self, adapter, port, lun_id):
+        """
+        :return: copy of the cached LUN details, None if not cached
+        """
+        with self._lock:
+            entry = self._entries.get((adapter, port, lun_id))
+            if entry is None:
+                return None
+            if time.time() - entry[0] >= LUN_INFO_CACHE_TTL:
+                del self._entries[(adapter, port, lun_id)]
+                return None
+            return copy.deepcopy(entry[1])
+
+    def set(self, adapter, port, lun_id, lun_info):
+        with self._lock:
+            self._entries[(adapter, port, lun_id)] = (time.time(),
+                                                      copy.deepcopy(lun_info))
+
+    def invalidate(self, adapter=None, port=None):
+        """
+        Drop the LUNs of a remote port, or all the LUNs if no port is given
+        """
+        with self._lock:
+            for key in self._entries.keys():
+                if adapter is None or port is None or \
+                        key[:2] == (adapter, port):
+                    del self._entries[key]
+
+
+lun_info_cache = LUNInfoCache()
+
+
+def get_lun_info(adapter, port, lun_id, objstore=None):
+    """
+    Get detailed information about a specific LUN. Unconfigured LUNs are
+    not attached, their details are those gathered through the discovery
+    LUN of their port, see _probe_lun().
     :param adapter: HBA adapter id
     :param port: Remote port wwpn
     :param lun_id: Id of the given LUN
+    :param objstore: plugin object store with the LUNs discovered by
+                     get_luns()
     :return: Dictionary containing detailed information about a specific LUN
     """
+    lun_info = lun_info_cache.get(adapter, port, lun_id)
+    if lun_info is not None:
+        return lun_info
 
-    port_dir = '/sys/bus/ccw/drivers/zfcp/' + adapter + '/' + port + '/'
-    lun_dir = port_dir + lun_id
+    with timed_lock(get_port_lock(adapter, port), 'fc_port'):
+        lun_info = _get_lun_info_locked(adapter, port, lun_id, objstore)
+    lun_info_cache.set(adapter, port, lun_id, lun_info)
+    return lun_info
 
-    lun_info = {}
+
+def _get_lun_info_locked(adapter, port, lun_id, objstore):
+    port_dir = adapter_dir + adapter + '/' + port + '/'
+    lun_dir = port_dir + lun_id
 
     out, err, rc = run_command(['lszfcp', '-l', lun_id])
 
     parsed_lszfcp_out = parse_lszfcp_out(out)
     lszfcp_key = adapter + '/' + port + '/' + lun_id
 
-    if lszfcp_key in parsed_lszfcp_out.keys() or os.path.exists(lun_dir) \
-            or is_lun_scan_enabled()['current']:
-        lun_info['configured'] = True
-    else:
-        lun_info['configured'] = False
+    if lszfcp_key not in parsed_lszfcp_out.keys() and \
+            not os.path.exists(lun_dir) and \
+            not is_lun_scan_enabled()['current']:
+        return _probe_lun(adapter, port, lun_id, objstore)
 
-        try:
-            with open(port_dir + 'unit_add', "w") as txt_file:
-                txt_file.write(lun_id)
+    lun_info = {}
+    sg_dev = sg_index.get_sg_dev(adapter, port, lun_id)
+    if sg_dev:
+        lun_info['hbaId'] = adapter
+        lun_info['remoteWwpn'] = port
+        lun_info['lunId'] = lun_id
+
+        lun_info['sgDev'] = sg_dev
+        out, err, rc = run_command(["sg_inq", "/dev/" + sg_dev])
+        if rc == 0:
+            lun_info.update(_get_sg_inq_dict(out))
+
+    lun_info['configured'] = "true"
+    return lun_info
 
-            for _ in range(4):
-                run_command([udevadm, "settle", "--exit-if-exists=" + lun_dir])
-                if os.path.exists(lun_dir):
-                    break
 
-            if not os.path.exists(lun_dir):
-                with open(port_dir + 'unit_remove', "w") as txt_file:
-                    txt_file.write(lun0)
+def _probe_lun(adapter, port, lun_id, objstore):
+    """
+    Get the details of an unconfigured LUN without attaching it, from the
+    first of:
+    - the LUNs of the port in the inventory stored by get_luns()
+    - sg_luns and sg_inq on a LUN of the port which is attached
+    A lookup never attaches LUNs: if the port has no attached LUN and was
+    not discovered by get_luns() yet, the LUN is reported as not found.
+    :return: Dictionary with the details of the LUN
+    """
+    port_key = (adapter, port)
+    luns = None
+    if objstore is not None:
+        luns = _load_lun_inventory(objstore, [port_key]).get(port_key)
+
+    if luns is None:
+        port_sg_devs = dict((key[2], sg_dev)
+                            for key, sg_dev in sg_index.get_items()
+                            if key[:2] == port_key)
+        if port_sg_devs:
+            sg_dev = port_sg_devs.get(lun0) or port_sg_devs.get(wlun) or \
+                port_sg_devs[sorted(port_sg_devs)[0]]
+            luns = _inquire_port_luns(adapter, port, sg_dev)
+        else:
+            luns = []
 
-                with open(port_dir + 'unit_add', "w") as txt_file:
-                    txt_file.write(wlun)
+    for lun in luns:
+        if lun['lunId'].lower() == lun_id.lower():
+            return dict(lun, configured="false")
 
-                for _ in range(4):
-                    run_command(
-                        [udevadm, "settle", "--exit-if-exists=" + lun_dir])
+    wok_log.error("LUN not reported by remote port, %s",
+                  ':'.join([adapter, port, lun_id]))
+    raise NotFoundError("GS390XSTG00008",
+                        {'path': ':'.join([adapter, port, lun_id])})
 
-                    if os.path.exists(lun_dir):
-                        break
 
-                    if not os.path.exists(lun_dir):
-                        with open(port_dir + 'unit_remove', "w") as txt_file:
-                            txt_file.write(wlun)
+def _inquire_port_luns(adapter, port, sg_dev):
+    """
+    Get the LUNs reported by a remote port through one of its attached
+    LUNs, with the inquiry data of that LUN, as get_luns() does with the
+    discovery LUN
+    :param sg_dev: sg device of a LUN of the port
+    :return: List of dictionaries with the LUNs of the port
+    """
+    out, err, rc = run_command(['sg_luns', '-m', '32768', '/dev/' + sg_dev])
+    if rc != 0:
+        wok_log.error("Error getting sg_luns for sg device. %s", sg_dev)
+        return []
+    lun_ids = parse_sg_luns(out)
 
-        except Exception as e:
-            if 'Invalid argument' in e or 'No such file or directory' in e:
-                raise InvalidParameter("GS390XSTG00022")
-            wok_log.error("Unable to add LUN temporarily, %s", lun_dir)
-            raise OperationFailed("GS390XSTG00003", {'err': e.message})
+    with lun_discovery_duration.time(phase='sg_inq'):
+        out, err, rc = run_command(["sg_inq", "/dev/" + sg_dev])
+    sg_inq_dict = _get_sg_inq_dict(out) if rc == 0 else {}
 
-    # Get the list of FC only sg devices. This includes the sg_devices
-    # of temporary LUNs as well.
-    sg_devices = get_sg_devices()
-    for sg_dev in sg_devices:
-        try:
-            wwpn = open(
-                sg_dir +
-                "/" +
-                sg_dev +
-                "/device/wwpn").readline().rstrip()
-            fcp_lun = open(
-                sg_dir +
-                "/" +
-                sg_dev +
-                "/device/fcp_lun").readline().rstrip()
-            hba_id = open(
-                sg_dir +
-                "/" +
-                sg_dev +
-                "/device/hba_id").readline().rstrip()
-
-            if hba_id == adapter and wwpn == port and fcp_lun == lun_id:
-                lun_info['hbaId'] = hba_id
-                lun_info['remoteWwpn'] = port
-                lun_info['lunId'] = lun_id
-
-                lun_info['sgDev'] = sg_dev
-                out, err, rc = run_command(["sg_inq", "/dev/" + sg_dev])
-                if rc == 0:
-                    lun_info.update(_get_sg_inq_dict(out))
-                break
-
-        except:
-            # While looking for relavent sg_device in an multithreaded
-            # environment it may happen that the directory we are looking
-            # into might get deleted by another thread. In this was just
-            # just skip this current directory and look for the sg_device
-            # somewhere else. This is why we should just pass this
-            # exception.
-            pass
-
-    # Get rid of the LUN if it's not configured
-    if not lun_info['configured']:
-        lun_info['configured'] = "false"
-        try:
-            wok_log.info("Removing sg_device , %s", lun_info['sgDev'])
-            with open(sg_dir + lun_info['sgDev'] + '/device/delete', "w")\
-                    as txt_file:
-                txt_file.write("1")
+    luns = []
+    for lun_id in lun_ids:
+        if lun_id == wlun:
+            continue
+        lun_info = dict(sg_inq_dict)
+        lun_info.update({'hbaId': adapter, 'remoteWwpn': port,
+                         'lunId': lun_id})
+        luns.append(lun_info)
+    return luns
 
-            del lun_info['sgDev']
 
-        except Exception as e:
-            wok_log.error("Unable to remove sg_device , %s", lun_info['sgDev'])
-            raise OperationFailed("GS390XSTG00001", {'err': e.message})
+def _read_sg_dev_key(sg_dev):
+    """
+    Read the FC attributes of a sg device from sysfs.
+    :param sg_dev: sg device name
+    :return: (hba_id, wwpn, fcp_lun) tuple of the sg device or None if
+             the transport of the device is not FC
+    """
+    device_dir = sg_dir + sg_dev + "/device/"
+    if not os.path.exists(device_dir + "wwpn"):
+        return None
 
-        try:
-            wok_log.info("Removing LUN , %s", lun_dir)
-            with open(port_dir + 'unit_remove', "w") as txt_file:
-                txt_file.write(fcp_lun)
-        except:
-            # If failed to remove the given LUN, at least remove the wlun
-            wok_log.info("Removing LUN , %s", port_dir + ":" + wlun)
+    key = []
+    for attr in ["hba_id", "wwpn", "fcp_lun"]:
+        with open(device_dir + attr) as attr_file:
+            key.append(attr_file.readline().rstrip())
+    return tuple(key)
+
+
+class SgDeviceIndex(object):
+    """
+    In-memory index of the FC sg devices on the system mapping the
+    (hba_id, wwpn, fcp_lun) of every device to its sg device name.
+
+    The index is synced with sysfs incrementally: the FC attributes are
+    read only for the sg devices which appeared or were re-assigned to a
+    different SCSI device since the last refresh.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # sg device -> (SCSI device link, (hba_id, wwpn, fcp_lun) or None)
+        self._sg_devices = {}
+        # (hba_id, wwpn, fcp_lun) -> sg device
+        self._index = {}
+
+    def _drop(self, sg_dev):
+        link, key = self._sg_devices.pop(sg_dev)
+        if key is not None and self._index.get(key) == sg_dev:
+            del self._index[key]
+
+    def refresh(self):
+        """
+        Sync the index with the sg devices currently present in sysfs
+        """
+        with self._lock:
             try:
-                with open(port_dir + 'unit_remove', "w") as txt_file:
-                    txt_file.write(wlun)
-            except:
-                # Just logging is sufficient. No need to raise exception and
-                # stop the code flow
-                wok_log.error(
-                    "Removing LUN failed , %s",
-                    port_dir + ":" + wlun)
-    else:
-        lun_info['configured'] = "true"
+                current_devices = listdir(sg_dir)
+            except OSError:
+                current_devices = []
 
-    return lun_info
+            present = set()
+            for sg_dev in current_devices:
+                try:
+                    link = os.readlink(sg_dir + sg_dev + "/device")
+                except OSError:
+                    # sg device removed while walking the directory
+                    continue
 
+                present.add(sg_dev)
+                entry = self._sg_devices.get(sg_dev)
+                if entry is not None and entry[0] == link:
+                    continue
+                if entry is not None:
+                    self._drop(sg_dev)
 
-def get_sg_devices():
+                try:
+                    key = _read_sg_dev_key(sg_dev)
+                except (IOError, OSError):
+                    # While looking for relavent sg_device in an
+                    # multithreaded environment it may happen that the
+                    # directory we are looking into might get deleted by
+                    # another thread. Just skip it, it will be picked on
+                    # next refresh if it's still there.
+                    present.discard(sg_dev)
+                    continue
+
+                self._sg_devices[sg_dev] = (link, key)
+                if key is not None:
+                    self._index[key] = sg_dev
+
+            for sg_dev in self._sg_devices.keys():
+                if sg_dev not in present:
+                    self._drop(sg_dev)
+
+    def get_sg_dev(self, adapter, port, lun_id, refresh=True):
+        """
+        Get the sg device of the given LUN
+        :param adapter: HBA adapter id
+        :param port: Remote port wwpn
+        :param lun_id: Id of the given LUN
+        :param refresh: sync the index with sysfs before the lookup
+        :return: sg device name or None if LUN has no sg device
+        """
+        if refresh:
+            self.refresh()
+        with self._lock:
+            return self._index.get((adapter, port, lun_id))
+
+    def get_items(self, refresh=True):
+        """
+        Get all the FC sg devices in index
+        :param refresh: sync the index with sysfs before the lookup
+        :return: List of ((hba_id, wwpn, fcp_lun), sg_dev) tuples
+        """
+        if refresh:
+            self.refresh()
+        with self._lock:
+            return self._index.items()
+
+
+sg_index = SgDeviceIndex()
+
+
+class MultipathMap(object):
     """
-    Returns the list of FC only 'sg' devices.
-    :return List of FC only sg_devices
+    In-memory map of the multipath devices of FC LUNs to their paths.
+
+    The map is synced with sysfs incrementally: the paths of a multipath
+    device are read only for the dm devices which appeared or whose list
+    of slaves changed since the last refresh.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # dm device -> (sorted slaves, multipath dictionary)
+        self._dm_devices = {}
+        # (hba_id, wwpn, fcp_lun) -> dm device
+        self._index = {}
+
+    def _drop(self, dm_dev):
+        slaves, multipath = self._dm_devices.pop(dm_dev)
+        for path in multipath['paths']:
+            key = (path['hbaId'], path['remoteWwpn'], path['lunId'])
+            if self._index.get(key) == dm_dev:
+                del self._index[key]
+
+    def refresh(self):
+        """
+        Sync the map with the dm devices currently present in sysfs
+        """
+        with self._lock:
+            try:
+                dm_devices = [dev for dev in listdir(block_dir)
+                              if dev.startswith('dm-')]
+            except OSError:
+                dm_devices = []
+
+            present = set()
+            for dm_dev in dm_devices:
+                try:
+                    slaves = sorted(listdir(block_dir + dm_dev + '/slaves'))
+                except OSError:
+                    # dm device removed while walking the directory
+                    continue
+
+                entry = self._dm_devices.get(dm_dev)
+                if entry is not None and entry[0] == slaves:
+                    present.add(dm_dev)
+                    continue
+                if entry is not None:
+                    self._drop(dm_dev)
+
+                try:
+                    multipath = _read_multipath(dm_dev, slaves)
+                except (IOError, OSError):
+                    # paths removed meanwhile, picked on next refresh
+                    continue
+
+                present.add(dm_dev)
+                self._dm_devices[dm_dev] = (slaves, multipath)
+                for path in multipath['paths']:
+                    key = (path['hbaId'], path['remoteWwpn'], path['lunId'])
+                    self._index[key] = dm_dev
+
+            for dm_dev in self._dm_devices.keys():
+                if dm_dev not in present:
+                    self._drop(dm_dev)
+
+    def get_multipath(self, adapter, port, lun_id, refresh=True):
+        """
+        Get the multipath device of the given LUN
+        :param adapter: HBA adapter id
+        :param port: Remote port wwpn
+        :param lun_id: Id of the given LUN
+        :param refresh: sync the map with sysfs before the lookup
+        :return: dictionary with the name and dm device of the multipath
+                 device and its list of paths, None if the LUN is not
+                 part of a multipath device
+        """
+        if refresh:
+            self.refresh()
+        with self._lock:
+            dm_dev = self._index.get((adapter, port, lun_id))
+            if dm_dev is None:
+                return None
+            return copy.deepcopy(self._dm_devices[dm_dev][1])
+
+
+def _read_multipath(dm_dev, slaves):
+    """
+    Read the paths of a multipath device from sysfs
+    :param dm_dev: dm device name, e.g. dm-0
+    :param slaves: block devices of the dm device
+    :return: dictionary with the name and dm device of the multipath
+             device and the list of its FC paths
+    """
+    with open(block_dir + dm_dev + '/dm/name') as name_file:
+        name = name_file.readline().rstrip()
+
+    paths = []
+    for slave in slaves:
+        device_dir = block_dir + slave + '/device/'
+        if not os.path.exists(device_dir + 'wwpn'):
+            continue  # not a FC device
+
+        path = {}
+        for key, attr in [('hbaId', 'hba_id'), ('remoteWwpn', 'wwpn'),
+                          ('lunId', 'fcp_lun')]:
+            with open(device_dir + attr) as attr_file:
+                path[key] = attr_file.readline().rstrip()
+        path['scsiDev'] = os.path.basename(os.path.realpath(device_dir))
+        sg_devices = glob.glob(device_dir + 'scsi_generic/sg*')
+        path['sgDev'] = os.path.basename(sg_devices[0]) if sg_devices \
+            else None
+        paths.append(path)
+
+    return {'name': name, 'dmDev': dm_dev,
+            'paths': sorted(paths, key=lambda path: (
+                path['hbaId'], path['remoteWwpn'], path['lunId']))}
+
+
+multipath_map = MultipathMap()
+
+
+def _get_single_path(adapter, port, lun_id, refresh=True):
+    """
+    :return: path dictionary, as in the multipath map, of a LUN which is
+             not part of a multipath device
+    """
+    sg_dev = sg_index.get_sg_dev(adapter, port, lun_id, refresh)
+    scsi_dev = None
+    if sg_dev:
+        try:
+            scsi_dev = os.path.basename(os.readlink(sg_dir + sg_dev +
+                                                    '/device'))
+        except OSError:
+            sg_dev = None
+    return {'hbaId': adapter, 'remoteWwpn': port, 'lunId': lun_id,
+            'sgDev': sg_dev, 'scsiDev': scsi_dev}
+
+
+def get_lun_paths(adapter, port, lun_id):
+    """
+    Get the paths to the disk of a LUN
+    :param adapter: HBA adapter id
+    :param port: Remote port wwpn
+    :param lun_id: Id of the given LUN
+    :return: dictionary with the name and dm device of the multipath
+             device, None for a LUN which is not part of one, and the list
+             of paths
     """
+    multipath = multipath_map.get_multipath(adapter, port, lun_id)
+    if multipath is not None:
+        return {'multipath': multipath['name'],
+                'dmDev': multipath['dmDev'],
+                'paths': multipath['paths']}
 
-    sg_devices = []
-    for sg_dev in listdir(sg_dir):
+    if not os.path.exists(adapter_dir + adapter + '/' + port + '/' +
+                          lun_id):
+        raise NotFoundError("GS390XSTG00008",
+                            {'path': ':'.join([adapter, port, lun_id])})
+    return {'multipath': None, 'dmDev': None,
+            'paths': [_get_single_path(adapter, port, lun_id)]}
 
-        # skip devices whose transport is not FC
-        if os.path.exists(sg_dir + "/" + sg_dev + "/device/wwpn"):
-            sg_devices.append(sg_dev)
 
-    return sg_devices
+def group_multipath_luns(luns):
+    """
+    Group the LUNs listed by get_luns() by multipath device
+    :param luns: list of LUN dictionaries
+    :return: list with a LUN dictionary for every multipath device, the
+             one of its first path listed, and for every LUN which is not
+             part of a multipath device. The multipath, dmDev and paths
+             keys are added as returned by get_lun_paths().
+    """
+    multipath_map.refresh()
+    sg_index.refresh()
+    groups = []
+    multipath_groups = {}
+    for lun in luns:
+        key = (lun['hbaId'], lun['remoteWwpn'], lun['lunId'])
+        multipath = multipath_map.get_multipath(*key, refresh=False)
+        if multipath is None:
+            groups.append(dict(lun, multipath=None, dmDev=None,
+                               paths=[_get_single_path(*key,
+                                                       refresh=False)]))
+        elif multipath['dmDev'] not in multipath_groups:
+            group = dict(lun, multipath=multipath['name'],
+                         dmDev=multipath['dmDev'], paths=multipath['paths'])
+            multipath_groups[multipath['dmDev']] = group
+            groups.append(group)
+    return groups
+
+
+def get_sg_devices():
+    """
+    Returns the list of FC only 'sg' devices.
+    :return List of FC only sg_devices
+    """
+    return [sg_dev for key, sg_dev in sg_index.get_items()]
 
 
 def get_sg_dev(adapter, port, lun_id):
@@ -536,37 +835,7 @@ def get_sg_dev(adapter, port, lun_id):
     :param lun_id:
     :return:
     """
-    sg_device = None
-
-    sg_devices = get_sg_devices()
-    for sg_dev in sg_devices:
-        try:
-            wwpn = open(sg_dir + "/" + sg_dev +
-                        "/device/wwpn").readline().rstrip()
-            fcp_lun = open(
-                sg_dir +
-                "/" +
-                sg_dev +
-                "/device/fcp_lun").readline().rstrip()
-            hba_id = open(
-                sg_dir +
-                "/" +
-                sg_dev +
-                "/device/hba_id").readline().rstrip()
-
-            if hba_id == adapter and wwpn == port and fcp_lun == lun_id:
-                sg_device = sg_dev
-                break
-        except:
-            # While looking for relavent sg_device in an multithreaded
-            # environment it may happen that the directory we are looking
-            # into might get deleted by another thread. In this was just
-            # just skip this current directory and look for the sg_device
-            # somewhere else. This is why we should just pass this
-            # exception.
-            pass
-
-    return sg_device
+    return sg_index.get_sg_dev(adapter, port, lun_id)
 
 
 def _get_host_fcp_dict():
@@ -592,193 +861,354 @@ def _get_host_fcp_dict():
     return host_fcp_dict
 
 
-def get_luns():
+def get_port_lock(adapter, port):
+    """
+    Get the lock serializing LUN operations on a given remote port.
+    Operations on different ports don't interfere with each other and
+    can run concurrently.
+    :param adapter: HBA adapter id
+    :param port: Remote port wwpn
+    :return: lock object of the remote port
+    """
+    with port_locks_lock:
+        lock = port_locks.get((adapter, port))
+        if lock is None:
+            lock = threading.RLock()
+            port_locks[(adapter, port)] = lock
+        return lock
+
+
+def get_port_state(adapter, port):
+    """
+    Get the state of a remote port as exposed in sysfs, i.e. the values
+    of its 'failed', 'in_recovery' and 'access_denied' attributes along
+    with the LUNs currently attached to the port.
+    :param adapter: HBA adapter id
+    :param port: Remote port wwpn
+    :return: Dictionary with the port state, None if port is not accessible
+    """
+    port_dir = adapter_dir + adapter + '/' + port + '/'
+    port_state = {}
+    try:
+        for attr in PORT_STATE_ATTRS:
+            with open(port_dir + attr) as attr_file:
+                port_state[attr] = attr_file.readline().rstrip()
+        port_state['luns'] = sorted(entry for entry in listdir(port_dir)
+                                    if entry.startswith('0x'))
+    except (IOError, OSError):
+        return None
+    return port_state
+
+
+def _get_inventory_ident(adapter, port):
+    return adapter + ':' + port
+
+
+def _load_lun_inventory(objstore, port_list):
+    """
+    Get the cached LUNs of the given remote ports from the object store.
+    Entries whose port state changed since they were stored are ignored.
+    :param objstore: plugin object store
+    :param port_list: List of (adapter, port) tuples
+    :return: Dictionary mapping (adapter, port) to the list of its LUNs
+    """
+    entries = {}
+    with objstore as session:
+        idents = session.get_list(LUN_INVENTORY)
+        for adapter, port in port_list:
+            ident = _get_inventory_ident(adapter, port)
+            if ident in idents:
+                entries[(adapter, port)] = session.get(LUN_INVENTORY, ident)
+
+    port_luns = {}
+    for (adapter, port), entry in entries.iteritems():
+        if entry['state'] == get_port_state(adapter, port):
+            luns = entry['luns']
+            port_luns[(adapter, port)] = [luns[lun] for lun in sorted(luns)]
+    return port_luns
+
+
+def _store_lun_inventory(objstore, port_luns, port_list=None):
+    """
+    Store the discovered LUNs of remote ports in the object store, along
+    with the current port state, and drop the entries of ports which
+    don't exist anymore.
+    :param objstore: plugin object store
+    :param port_luns: Dictionary mapping (adapter, port) to list of LUNs
+    :param port_list: List of (adapter, port) tuples present on the system,
+                      None to keep the entries of the other ports
+    """
+    port_states = {}
+    for adapter, port in port_luns:
+        port_states[(adapter, port)] = get_port_state(adapter, port)
+
+    with objstore as session:
+        if port_list is not None:
+            idents = [_get_inventory_ident(adapter, port)
+                      for adapter, port in port_list]
+            for ident in session.get_list(LUN_INVENTORY):
+                if ident not in idents:
+                    session.delete(LUN_INVENTORY, ident,
+                                   ignore_missing=True)
+
+        for (adapter, port), luns in port_luns.iteritems():
+            entry = {'state': port_states[(adapter, port)],
+                     'luns': dict((lun['lunId'], lun) for lun in luns)}
+            session.store(LUN_INVENTORY, _get_inventory_ident(adapter, port),
+                          entry)
+
+
+def invalidate_lun_inventory(objstore, adapter=None, port=None):
+    """
+    Drop the cached LUNs of a remote port, so they are discovered again on
+    next listing. All the cached LUNs are dropped if no port is given.
+    :param objstore: plugin object store
+    :param adapter: HBA adapter id
+    :param port: Remote port wwpn
+    """
+    lun_info_cache.invalidate(adapter, port)
+    if objstore is None:
+        return
+
+    with objstore as session:
+        if adapter is None or port is None:
+            idents = session.get_list(LUN_INVENTORY)
+        else:
+            idents = [_get_inventory_ident(adapter, port)]
+        for ident in idents:
+            session.delete(LUN_INVENTORY, ident, ignore_missing=True)
+
+
+def get_luns(objstore=None):
     """
     Get the list of all the LUNs including unconfigured ones
+    :param objstore: plugin object store used to cache the LUNs of every
+                     remote port. Only the ports whose state changed since
+                     last call are discovered again.
     :return: List of all the LUN paths
     """
     lun_info_list = []
     if is_lun_scan_enabled()['current']:
         return lun_info_list
 
-    out, err, rc = run_command(['lszfcp', '-D'])
+    host_fcp_dict = _get_host_fcp_dict()
+    port_list = []
+    for adapter in host_fcp_dict:
+        for port in host_fcp_dict[adapter]:
+            port_list.append((adapter, port))
 
-    if rc:
-        wok_log.error('Error in lszfcp -D command,  %s', err)
+    port_luns = {}
+    if objstore is not None:
+        port_luns = _load_lun_inventory(objstore, port_list)
 
-    parsed_lszfcp_out = parse_lszfcp_out(out)
+    stale_ports = [port_key for port_key in port_list
+                   if port_key not in port_luns]
+    if stale_ports:
+        out, err, rc = run_command(['lszfcp', '-D'])
 
-    host_fcp_dict = _get_host_fcp_dict()
-    global lun_dict
-    lun_dict = _get_lun_dict()
+        if rc:
+            wok_log.error('Error in lszfcp -D command,  %s', err)
 
-    # Loop over all HBA adapters
-    for adapter in host_fcp_dict:
-        # Loop over every remote port for the given HBA adapter
-        for port in host_fcp_dict[adapter]:
-            temp_luns = {}
-            port_dir = adapter_dir + adapter + '/' + port + '/'
+        parsed_lszfcp_out = parse_lszfcp_out(out)
+        lun_dict = _get_lun_dict()
 
-            # If port went offline or is not accessible, skip.
-            if not os.path.exists(port_dir):
-                continue
+        # Every remote port is discovered independently of the others, so
+        # run the discovery of the ports on a bounded pool of workers.
+        discovery_args = []
+        for adapter, port in stale_ports:
+            luns = None
+            if adapter in lun_dict and port in lun_dict[adapter]:
+                luns = dict(lun_dict[adapter][port])
+            discovery_args.append((adapter, port, luns, parsed_lszfcp_out))
 
-            access_denied = open(
-                port_dir + 'access_denied').readline().rstrip()
-            if access_denied == "1":
-                continue
+        port_lun_lists = run_in_parallel(_discover_port_luns, discovery_args,
+                                         LUN_DISCOVERY_WORKERS)
+        discovered_luns = dict(zip(stale_ports, port_lun_lists))
+        if objstore is not None:
+            _store_lun_inventory(objstore, discovered_luns, port_list)
+        port_luns.update(discovered_luns)
 
-            failed = open(port_dir + 'failed').readline().rstrip()
-            if failed == "1":
-                continue
+    for port_key in port_list:
+        lun_info_list.extend(sorted(port_luns[port_key],
+                                    key=lambda lun: lun['lunId']))
 
-            in_recovery = open(port_dir + 'in_recovery').readline().rstrip()
-            if in_recovery == "1":
-                continue
+    return lun_info_list
 
-            # If no LUNs are associated with this port, try adding LUN 0
-            # to initiate LUN discovery on this port later
-            add_discovery_lun = False
-            if adapter not in lun_dict or port not in lun_dict[adapter]:
-                add_discovery_lun = True
 
-            if adapter in lun_dict and port in lun_dict[adapter]:
-                port_luns_keys = lun_dict[adapter][port]
-                add_discovery_lun = True
-                for lun_key in port_luns_keys:
-                    if lun_key == lun0 or lun_key == wlun:
-                        add_discovery_lun = False
+def _discover_port_luns(adapter, port, port_luns, parsed_lszfcp_out):
+    """
+    Get the list of all the LUNs, including unconfigured ones, reachable
+    through a single remote port.
+    :param adapter: HBA adapter id
+    :param port: Remote port wwpn
+    :param port_luns: Dictionary of LUNs configured on this port mapped
+                      to their sg devices, None if no LUN is configured
+    :param parsed_lszfcp_out: Parsed output of 'lszfcp -D' command
+    :return: List of dictionaries with the LUNs of the port
+    """
+    with timed_lock(get_port_lock(adapter, port), 'fc_port'):
+        return _discover_port_luns_locked(adapter, port, port_luns,
+                                          parsed_lszfcp_out)
 
-            if add_discovery_lun:
-                try:
-                    with open(port_dir + 'unit_add', "w") as txt_file:
-                        txt_file.write(lun0)
-
-                    run_command(
-                        [udevadm, "settle",
-                         "--exit-if-exists=" + port_dir + lun0])
-                    update_luns = True
-                    temp_luns[lun0] = True
-                    if os.path.exists(port_dir + lun0):
-                        failed = open(
-                            port_dir + lun0 + '/failed').readline().rstrip()
-                        if failed == "1":
-                            update_luns = False
-                            if adapter in lun_dict and port in lun_dict[
-                                    adapter]:
-                                del lun_dict[adapter][port]
-                    if update_luns:
-                        lun_dict = update_lun_dict(
-                            lun_dict, adapter, port, lun0)
 
-                except Exception as e:
-                    wok_log.error("Unable to add LUN 0 , %s", port_dir + lun0)
+def _discover_port_luns_locked(adapter, port, port_luns, parsed_lszfcp_out):
+    lun_info_list = []
+    lun_dict = {adapter: {}}
+    if port_luns is not None:
+        lun_dict[adapter][port] = port_luns
 
-                if adapter not in lun_dict or port not in lun_dict[adapter]:
-                    try:
-                        with open(port_dir + 'unit_remove', "w") as txt_file:
-                            txt_file.write(lun0)
-                        temp_luns[lun0] = False
+    temp_luns = {}
+    port_dir = adapter_dir + adapter + '/' + port + '/'
 
-                    except Exception as e:
-                        wok_log.error(
-                            "Unable to remove LUN 0 , %s", port_dir + lun0)
+    # If port went offline or is not accessible, skip.
+    if not os.path.exists(port_dir):
+        return lun_info_list
 
-                    try:
-                        with open(port_dir + 'unit_add', "w") as txt_file:
-                            txt_file.write(wlun)
+    access_denied = open(
+        port_dir + 'access_denied').readline().rstrip()
+    if access_denied == "1":
+        return lun_info_list
 
-                        run_command(
-                            [udevadm, "settle",
-                             "--exit-if-exists=" + port_dir + "/" + wlun])
-                        lun_dict = update_lun_dict(
-                            lun_dict, adapter, port, wlun)
-                        temp_luns[wlun] = True
+    failed = open(port_dir + 'failed').readline().rstrip()
+    if failed == "1":
+        return lun_info_list
 
-                    except Exception as e:
-                        wok_log.error(
-                            "Unable to add wlun , %s", port_dir + wlun)
+    in_recovery = open(port_dir + 'in_recovery').readline().rstrip()
+    if in_recovery == "1":
+        return lun_info_list
 
-                    if adapter not in lun_dict or port not in lun_dict[
-                            adapter]:
-                        try:
-                            with open(port_dir + 'unit_remove', "w")\
-                                    as txt_file:
-                                txt_file.write(wlun)
-                            temp_luns[wlun] = False
-                            continue
+    # If no LUNs are associated with this port, try adding LUN 0
+    # to initiate LUN discovery on this port later
+    add_discovery_lun = True
+    if port in lun_dict[adapter]:
+        for lun_key in lun_dict[adapter][port]:
+            if lun_key == lun0 or lun_key == wlun:
+                add_discovery_lun = False
 
-                        except Exception as e:
-                            wok_log.error(
-                                "Unable to remove wlun , %s", port_dir + wlun)
+    if add_discovery_lun:
+        try:
+            with lun_discovery_duration.time(phase='unit_add'):
+                with open(port_dir + 'unit_add', "w") as txt_file:
+                    txt_file.write(lun0)
+
+            wait_for_luns([port_dir + lun0])
+            update_luns = True
+            temp_luns[lun0] = True
+            if os.path.exists(port_dir + lun0):
+                failed = open(
+                    port_dir + lun0 + '/failed').readline().rstrip()
+                if failed == "1":
+                    update_luns = False
+                    if port in lun_dict[adapter]:
+                        del lun_dict[adapter][port]
+            if update_luns:
+                lun_dict = update_lun_dict(
+                    lun_dict, adapter, port, lun0)
+
+        except Exception as e:
+            wok_log.error("Unable to add LUN 0 , %s", port_dir + lun0)
 
-            disc_sg_dev = ''
-            if lun0 in lun_dict[adapter][port]:
-                disc_sg_dev = lun_dict[adapter][port][lun0]
-            if wlun in lun_dict[adapter][port]:
-                disc_sg_dev = lun_dict[adapter][port][wlun]
+        if port not in lun_dict[adapter]:
             try:
-                if disc_sg_dev:
-                    out, err, rc = run_command(
-                        ["sg_inq", "/dev/" + disc_sg_dev])
-                    if rc == 0:
-                        for lun in lun_dict[adapter][port]:
-                            if lun == wlun:
-                                continue
-                            port_dir = '/sys/bus/ccw/drivers/zfcp/' +\
-                                adapter + '/' + port + '/'
-                            lun_dir = port_dir + lun
-                            lun_info_dict = {}
-                            lun_info_dict.update(_get_sg_inq_dict(out))
-                            lun_info_dict['hbaId'] = adapter
-                            lun_info_dict['remoteWwpn'] = port
-                            lun_info_dict['lunId'] = lun
-                            lszfcp_key = adapter + '/' + port + '/' + lun
-                            if lszfcp_key in parsed_lszfcp_out.keys()\
-                               or os.path.exists(lun_dir):
-                                if lun in temp_luns and temp_luns[lun] is True:
-                                    lun_info_dict['configured'] = "false"
-                                else:
-                                    lun_info_dict['configured'] = "true"
-                            else:
-                                lun_info_dict['configured'] = "false"
-                            lun_info_list.append(lun_info_dict)
+                with open(port_dir + 'unit_remove', "w") as txt_file:
+                    txt_file.write(lun0)
+                temp_luns[lun0] = False
+
             except Exception as e:
                 wok_log.error(
-                    "Unable to get sg dev for discovery lun, %s", lun_dir)
-                raise OperationFailed("GS390XSTG00021", {'err': e.message})
+                    "Unable to remove LUN 0 , %s", port_dir + lun0)
 
-            if adapter in lun_dict and port in lun_dict[adapter]:
+            try:
+                with lun_discovery_duration.time(phase='unit_add'):
+                    with open(port_dir + 'unit_add', "w") as txt_file:
+                        txt_file.write(wlun)
+
+                wait_for_luns([port_dir + wlun])
+                lun_dict = update_lun_dict(
+                    lun_dict, adapter, port, wlun)
+                temp_luns[wlun] = True
+
+            except Exception as e:
+                wok_log.error(
+                    "Unable to add wlun , %s", port_dir + wlun)
+
+            if port not in lun_dict[adapter]:
+                try:
+                    with open(port_dir + 'unit_remove', "w") as txt_file:
+                        txt_file.write(wlun)
+                    temp_luns[wlun] = False
+                    return lun_info_list
+
+                except Exception as e:
+                    wok_log.error(
+                        "Unable to remove wlun , %s", port_dir + wlun)
+
+    if port not in lun_dict[adapter]:
+        return lun_info_list
+
+    disc_sg_dev = ''
+    if lun0 in lun_dict[adapter][port]:
+        disc_sg_dev = lun_dict[adapter][port][lun0]
+    if wlun in lun_dict[adapter][port]:
+        disc_sg_dev = lun_dict[adapter][port][wlun]
+    try:
+        if disc_sg_dev:
+            with lun_discovery_duration.time(phase='sg_inq'):
+                out, err, rc = run_command(
+                    ["sg_inq", "/dev/" + disc_sg_dev])
+            if rc == 0:
                 for lun in lun_dict[adapter][port]:
+                    if lun == wlun:
+                        continue
+                    lun_dir = port_dir + lun
+                    lun_info_dict = {}
+                    lun_info_dict.update(_get_sg_inq_dict(out))
+                    lun_info_dict['hbaId'] = adapter
+                    lun_info_dict['remoteWwpn'] = port
+                    lun_info_dict['lunId'] = lun
+                    lszfcp_key = adapter + '/' + port + '/' + lun
+                    if lszfcp_key in parsed_lszfcp_out.keys()\
+                       or os.path.exists(lun_dir):
+                        if lun in temp_luns and temp_luns[lun] is True:
+                            lun_info_dict['configured'] = "false"
+                        else:
+                            lun_info_dict['configured'] = "true"
+                    else:
+                        lun_info_dict['configured'] = "false"
+                    lun_info_list.append(lun_info_dict)
+    except Exception as e:
+        wok_log.error(
+            "Unable to get sg dev for discovery lun, %s", port_dir)
+        raise OperationFailed("GS390XSTG00021", {'err': e.message})
+
+    if port in lun_dict[adapter]:
+        for lun in lun_dict[adapter][port]:
+
+            # Get rid of the LUN if added temporarily for discovery
+            if lun in temp_luns and temp_luns[lun] is True:
+                sg_dev = lun_dict[adapter][port][lun]
+
+                if sg_dev:
+                    try:
+                        wok_log.info("Removing LUN 0, %s", port_dir)
+                        with open(port_dir + 'unit_remove', "w")\
+                                as txt_file:
+                            txt_file.write(lun0)
+                    except:
+                        wok_log.error(
+                            "unable to remove LUN 0, %s", port_dir)
+                        wok_log.info("Removing wlun,  %s", wlun)
+                        try:
+                            with open(port_dir + 'unit_remove', "w")\
+                                    as txt_file:
+                                txt_file.write(wlun)
+                        except:
+                            # Can be safely ingored, so not raising
+                            # exception
+                            wok_log.error(
+                                "unable to remove wlun, %s", port_dir)
 
-                    # Get rid of the LUN if added temporarily for discovery
-                    if lun in temp_luns and temp_luns[lun] is True:
-                        sg_dev = ''
-                        if port in lun_dict[
-                                adapter] and lun in lun_dict[adapter][port]:
-                            sg_dev = lun_dict[adapter][port][lun]
-
-                        if sg_dev:
-                            try:
-                                wok_log.info("Removing LUN 0, %s", port_dir)
-                                with open(port_dir + 'unit_remove', "w")\
-                                        as txt_file:
-                                    txt_file.write(lun0)
-                            except:
-                                wok_log.error(
-                                    "unable to remove LUN 0, %s", port_dir)
-                                wok_log.info("Removing wlun,  %s", wlun)
-                                try:
-                                    with open(port_dir + 'unit_remove', "w")\
-                                            as txt_file:
-                                        txt_file.write(wlun)
-                                except:
-                                    # Can be safely ingored, so not raising
-                                    # exception
-                                    wok_log.error(
-                                        "unable to remove wlun, %s", port_dir)
-
-                        temp_luns[lun] = False
+                temp_luns[lun] = False
 
     return lun_info_list
 
@@ -1004,48 +1434,135 @@ def trigger_lun_scan(cb, params):
 
 def get_final_tape_list():
     """
-    Get the final list of all tape devices
+    Get the final list of all tape devices, read from sysfs. Every tape
+    drive and medium changer with a sg device is listed, with the columns
+    of 'lstape --scsi-only' and its FC path.
+    :return: List of dictionaries with the Generic (sg device), Device (st
+             or sch device), Target, Vendor, Model, Type (tapedrv or
+             changer), State, hbaId, remoteWwpn and lunId of every device
     """
-    out = run_lstape_scsi_cmd()
-    return parse_tape_list(out)
+    try:
+        sg_devices = listdir(sg_dir)
+    except OSError:
+        sg_devices = []
 
+    tape_list = []
+    for sg_dev in sg_devices:
+        try:
+            tape = _read_tape_device(sg_dev)
+        except (IOError, OSError):
+            # device removed while it was read
+            continue
+        if tape is not None:
+            tape_list.append(tape)
+    return sorted(tape_list,
+                  key=lambda tape: natural_sort_key(tape['Generic']))
 
-def parse_tape_list(lstape_out):
+
+def get_tape_inventory():
+    """
+    Get the tape devices indexed by sg device, with their details
+    :return: Dictionary mapping the sg devices to the dictionaries of
+             get_final_tape_list() with the path of the device node, the
+             default blocksize and density of tape drives (None if not
+             set), the unit serial number and the sg devices of the other
+             paths to the same device (siblings) added
     """
-    Parse the output of the command lstape
-    :param lstape_out : Output obtained by 'lstape' command
+    tapes = get_final_tape_list()
+    inventory = {}
+    device_keys = {}
+    paths = {}
+    for tape in tapes:
+        tape.update(_read_tape_details(tape))
+        inventory[tape['Generic']] = tape
+        # paths to the same device report the same serial number
+        if tape['serial']:
+            key = (tape['Type'], tape['serial'])
+        elif tape['remoteWwpn']:
+            key = (tape['Type'], tape['remoteWwpn'], tape['lunId'])
+        else:
+            key = (tape['Type'], tape['Generic'])
+        device_keys[tape['Generic']] = key
+        paths.setdefault(key, []).append(tape['Generic'])
+
+    for tape in tapes:
+        tape['siblings'] = [sg_dev
+                            for sg_dev in paths[device_keys[tape['Generic']]]
+                            if sg_dev != tape['Generic']]
+    return inventory
+
+
+def _read_tape_details(tape):
     """
+    :param tape: dictionary returned by get_final_tape_list()
+    :return: dictionary with the path, blocksize, density and serial of
+             a tape device
+    """
+    device_dir = sg_dir + tape['Generic'] + '/device/'
+    node = tape['Device'] if tape['Device'] != 'N/A' else tape['Generic']
+    details = {'path': '/dev/' + node, 'blocksize': None, 'density': None,
+               'serial': None}
+
+    if tape['Type'] == 'tapedrv' and tape['Device'] != 'N/A':
+        st_dir = device_dir + 'scsi_tape/' + tape['Device'] + '/'
+        for key, attr in [('blocksize', 'default_blksize'),
+                          ('density', 'default_density')]:
+            value = _read_sysfs_attr(st_dir + attr)
+            # -1 if the st driver uses the current value of the drive
+            if value and value.lstrip('-').isdigit() and int(value) >= 0:
+                details[key] = int(value)
+
+    # unit serial number VPD page: 4 bytes header, serial from byte 4
     try:
-        final_list = []
-        input_list = lstape_out.splitlines()
-        scsi_keys = input_list[0].split()
+        with open(device_dir + 'vpd_pg80', 'rb') as vpd_file:
+            vpd = vpd_file.read()
+        details['serial'] = vpd[4:4 + ord(vpd[3])].strip() or None
+    except (IOError, IndexError):
+        pass
+    return details
 
-        for input_device in input_list[1:]:
-            device_params = {}
-            device_params_list = input_device.split()
-            for scsi_key, device_param in zip(scsi_keys, device_params_list):
-                device_params[scsi_key] = device_param
-            final_list.append(device_params)
 
-    except Exception as e:
-        wok_log.error("Unable to parse output of lstape")
-        raise OperationFailed("GS390XSTG00016", {'err': e.message})
+def natural_sort_key(name):
+    return [int(part) if part.isdigit() else part
+            for part in re.split(r'(\d+)', name)]
+
 
-    return final_list
+def _read_sysfs_attr(path, default=None):
+    try:
+        with open(path) as attr_file:
+            return attr_file.read().strip()
+    except IOError:
+        return default
 
 
-def run_lstape_scsi_cmd():
+def _read_tape_device(sg_dev):
     """
-    Run 'lstape --scsi-only' command
+    :return: dictionary with the details of a tape device, as returned by
+             get_final_tape_list(), None if the sg device is not a tape
+             drive or medium changer
     """
+    device_dir = sg_dir + sg_dev + '/device/'
+    tape_type = TAPE_SCSI_TYPES.get(_read_sysfs_attr(device_dir + 'type'))
+    if tape_type is None:
+        return None
 
-    wok_log.info('Running lstape command')
-    out, err, rc = run_command(['lstape', '--scsi-only'])
-    if rc:
-        wok_log.error('failed to execute lstape,  %s', err)
-        raise OperationFailed("GS390XSTG00017", {'err': err})
-
-    return out
+    class_dir, pattern = TAPE_CLASS_DIRS[tape_type]
+    try:
+        nodes = [node for node in listdir(device_dir + class_dir)
+                 if re.match(pattern, node)]
+    except OSError:
+        nodes = []
+
+    return {'Generic': sg_dev,
+            'Device': nodes[0] if nodes else 'N/A',
+            'Target': os.path.basename(os.path.realpath(device_dir)),
+            'Vendor': _read_sysfs_attr(device_dir + 'vendor', ''),
+            'Model': _read_sysfs_attr(device_dir + 'model', ''),
+            'Type': tape_type,
+            'State': _read_sysfs_attr(device_dir + 'state', ''),
+            'hbaId': _read_sysfs_attr(device_dir + 'hba_id'),
+            'remoteWwpn': _read_sysfs_attr(device_dir + 'wwpn'),
+            'lunId': _read_sysfs_attr(device_dir + 'fcp_lun')}
 
 
 def parse_lszfcp_out(output):
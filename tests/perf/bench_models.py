@@ -0,0 +1,211 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM Corp, 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+"""
+Benchmark of the device listings on synthetic sysfs trees.
+
+For every size, fake sysfs trees with that many storage, network and
+FC devices are generated in a temporary directory and the model paths
+and commands are patched to use them. Storage and network devices are
+listed both from sysfs and from the command output.
+
+Run from this directory:
+    PYTHONPATH=../../:../../../../ python bench_models.py \\
+        --sizes 100,1000,10000 --output results.json
+
+Results of two commits can be compared with:
+    python bench_models.py --compare old.json new.json
+"""
+
+import argparse
+import json
+import mock
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import sysfs_fixtures as fixtures
+from model import cioignore, nwdevices, storagedevices, tape_devs, utils
+
+
+DEFAULT_SIZES = [100, 1000, 10000]
+DEFAULT_REPEAT = 5
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func, repeat):
+    """
+    :return: dict with the time of the first call, which may fill
+             caches, and the best and mean time of the following ones
+    """
+    start = timeit.default_timer()
+    func()
+    first = timeit.default_timer() - start
+    times = timeit.repeat(func, number=1, repeat=repeat)
+    return {'first': first, 'best': min(times),
+            'mean': sum(times) / len(times)}
+
+
+def get_benchmarks(root, size):
+    """
+    Build the trees of the given size under root
+    :return: tuple of the list of (name, function, patches) to time and
+             the patches common to all of them
+    """
+    storage_paths, lscss = fixtures.build_storage_tree(
+        os.path.join(root, 'storage'), size)
+    lscss_paths, lscss = fixtures.build_storage_tree(
+        os.path.join(root, 'lscss'), size, attributes=False)
+    network_paths, znetconf = fixtures.build_network_tree(
+        os.path.join(root, 'network'), size)
+    fc_paths, fc_outputs, fc_luns = fixtures.build_fc_tree(
+        os.path.join(root, 'fc'), size)
+    commands = fixtures.fake_commands(
+        lscss, znetconf, fc_outputs, fixtures.cio_ignore_output(size))
+
+    missing = os.path.join(root, 'missing') + '/'
+    common = [
+        mock.patch.object(storagedevices, 'run_command', commands),
+        mock.patch.object(nwdevices, 'run_command', commands),
+        mock.patch.object(utils, 'run_command', commands),
+        mock.patch.object(cioignore, 'run_command', commands),
+        mock.patch.multiple(utils, sg_index=utils.SgDeviceIndex(),
+                            is_lun_scan_enabled=mock.Mock(
+                                return_value={'current': False,
+                                              'boot': False}),
+                            **fc_paths)]
+
+    storage = storagedevices.StorageDevicesModel()
+    network = nwdevices.NetworkDevicesModel()
+    ignore = cioignore.CIOIgnoreModel(objstore=None)
+    tapes = tape_devs.TapeDevsModel()
+    adapter, port, lun = fc_luns[0]
+
+    def cio_ignore_lookup():
+        cioignore.invalidate_ignore_list()
+        ignore.lookup(None)
+
+    benchmarks = [
+        ('storagedevices.get_list[sysfs]', storage.get_list,
+         [mock.patch.multiple(storagedevices, **storage_paths)]),
+        ('storagedevices.get_list[sysfs,page]',
+         lambda: storage.get_list(_offset='0', _limit='25'),
+         [mock.patch.multiple(storagedevices, **storage_paths)]),
+        ('storagedevices.get_list[lscss]', storage.get_list,
+         [mock.patch.multiple(storagedevices, **lscss_paths)]),
+        ('nwdevices.get_list[sysfs]', network.get_list,
+         [mock.patch.multiple(nwdevices, **network_paths)]),
+        ('nwdevices.get_list[znetconf]', network.get_list,
+         [mock.patch.multiple(nwdevices, SYSFS_TRIPLET_PATH=missing,
+                              SYSFS_QETH_CCW_PATH=missing)]),
+        ('utils.get_luns', utils.get_luns, []),
+        ('utils.get_lun_info', lambda: utils.get_lun_info(adapter, port, lun),
+         []),
+        ('tapedevs.get_list', tapes.get_list, []),
+        ('cioignore.lookup', cio_ignore_lookup, [])]
+    return benchmarks, common
+
+
+def run_size(size, repeat, selected=None):
+    root = tempfile.mkdtemp(prefix='gingers390x-perf-')
+    try:
+        start = time.time()
+        benchmarks, common = get_benchmarks(root, size)
+        print 'size %d, trees built in %.1f s' % (size, time.time() - start)
+        results = {}
+        for name, func, patches in benchmarks:
+            if selected and not any(s in name for s in selected):
+                continue
+            for patch in common + patches:
+                patch.start()
+            try:
+                results[name] = measure(func, repeat)
+            finally:
+                for patch in reversed(common + patches):
+                    patch.stop()
+            print '  %-38s first %9.2f ms  best %9.2f ms' % \
+                (name, results[name]['first'] * 1000,
+                 results[name]['best'] * 1000)
+        return results
+    finally:
+        shutil.rmtree(root)
+
+
+def compare(old_file, new_file):
+    with open(old_file) as old, open(new_file) as new:
+        old, new = json.load(old), json.load(new)
+    print '%s -> %s' % (old['commit'], new['commit'])
+    for size in sorted(new['results'], key=int):
+        for name in sorted(new['results'][size]):
+            if name not in old['results'].get(size, {}):
+                continue
+            before = old['results'][size][name]['best']
+            after = new['results'][size][name]['best']
+            print '%6s %-38s %9.2f ms %9.2f ms %+7.1f%%' % \
+                (size, name, before * 1000, after * 1000,
+                 (after - before) / before * 100)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma separated numbers of devices')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--only', default='',
+                        help='comma separated benchmark names to run')
+    parser.add_argument('--output', help='JSON file to save the results to')
+    parser.add_argument('--compare', nargs=2, metavar='JSON',
+                        help='compare the results of two runs')
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    selected = [name for name in args.only.split(',') if name]
+    results = {}
+    for size in sizes:
+        results[str(size)] = run_size(size, args.repeat, selected)
+    report = {'commit': get_commit(),
+              'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(),
+              'sizes': sizes,
+              'repeat': args.repeat,
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+        print 'results saved to %s' % args.output
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,118 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM Corp, 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+"""
+Microbenchmark of the parsing of lscss output.
+
+Compares the former get_rows_info(), which compiled its patterns and
+built every row column by column on each call, with the TableParser
+based implementation.
+
+Run from this directory:
+    PYTHONPATH=../../:../../../../ python bench_table_parser.py [rows]
+"""
+
+import re
+import sys
+import timeit
+
+from model.model_utils import get_rows_info, get_table_parser
+from model.storagedevices import HEADER_PATTERN
+
+
+DEVICE_PATTERN = r'(\d\.\d\.[0-9a-fA-F]{4})\s+' \
+                 r'(\d\.\d\.[0-9a-fA-F]{4})\s+' \
+                 r'(\w+\/\w+)\s+' \
+                 r'(\w+\/\w+)\s' \
+                 r'(\s{3}|yes)\s+' \
+                 r'([0-9a-fA-F]{2})\s+' \
+                 r'([0-9a-fA-F]{2})\s+' \
+                 r'([0-9a-fA-F]{2})\s+' \
+                 r'(\w+\s\w+)'
+
+LSCSS_HEADER = 'Device   Subchan.  DevType CU Type Use  PIM PAM POM  ' \
+               'CHPIDs\n' + '-' * 70 + '\n'
+LSCSS_ROW = '0.0.%04x 0.0.%04x  3390/0c 3990/e9 %s  e0  e0  ff   ' \
+            'b0b10d00 00000000\n'
+
+
+def lscss_output(rows):
+    return LSCSS_HEADER + ''.join(
+        LSCSS_ROW % (i, i, 'yes' if i % 2 else '   ') for i in range(rows))
+
+
+def legacy_get_rows_info(cmd_output, hdr_pattern, val_pattern,
+                         unique_col=None, hdr_index=0, val_start_index=2):
+    """
+    get_rows_info() as implemented before TableParser, without the
+    format_data callback
+    """
+    command_out = cmd_output.strip().split("\n")
+    devices = {} if unique_col is not None else []
+    if (hdr_index > len(command_out)-1) or \
+            (val_start_index > len(command_out)-1):
+        return devices
+    header = re.search(hdr_pattern, command_out[hdr_index], re.M | re.I)
+    value_pattern = re.compile(val_pattern, re.M | re.I)
+    for row in command_out[val_start_index:]:
+        value = re.search(value_pattern, row)
+        row_data = {}
+        if value:
+            if (header.group() != value.group()) and \
+                    (len(header.groups()) == len(value.groups())):
+                for cnt in range(1, len(header.groups())+1):
+                    row_data[header.group(cnt)] = value.group(cnt)
+                if unique_col:
+                    devices[row_data[unique_col]] = row_data
+                else:
+                    devices.append(row_data)
+    return devices
+
+
+def bench(name, func, rows, repeat=5):
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print '%-28s %8.1f ms %12.0f rows/s' % (name, best * 1000, rows / best)
+    return best
+
+
+def main(rows=10000):
+    output = lscss_output(rows)
+    parser = get_table_parser(HEADER_PATTERN, DEVICE_PATTERN)
+    assert legacy_get_rows_info(output, HEADER_PATTERN, DEVICE_PATTERN,
+                                'Device') == \
+        get_rows_info(output, HEADER_PATTERN, DEVICE_PATTERN, 'Device')
+
+    print 'parsing %d rows of lscss output' % rows
+    legacy = bench('legacy get_rows_info',
+                   lambda: legacy_get_rows_info(output, HEADER_PATTERN,
+                                                DEVICE_PATTERN, 'Device'),
+                   rows)
+    current = bench('get_rows_info',
+                    lambda: get_rows_info(output, HEADER_PATTERN,
+                                          DEVICE_PATTERN, 'Device'),
+                    rows)
+    bench('TableParser.iter_rows', lambda: list(parser.iter_rows(output)),
+          rows)
+    bench('TableParser.iter_rows tuples',
+          lambda: list(parser.iter_rows(output, as_tuple=True)), rows)
+    print 'speedup of get_rows_info: %.2fx' % (legacy / current)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
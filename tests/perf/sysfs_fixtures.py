@@ -0,0 +1,304 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM Corp, 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+"""
+Synthetic s390 sysfs trees and command outputs for the benchmarks.
+
+Every builder creates its tree under a given root directory and returns
+the paths to patch into the model modules along with the output the
+s390-tools commands would print for the same devices.
+"""
+
+import os
+
+# storage devices are on subchannel set 0, network devices on 1 to 3
+STORAGE_SSID = 0
+NETWORK_SSIDS = [1, 2, 3]
+# triplets per subchannel set, every triplet takes 4 device numbers
+TRIPLETS_PER_SSID = 0x10000 / 4
+
+DASD_TYPES = ('3390/0c', '3990/e9')
+ZFCP_TYPES = ('1732/03', '1731/03')
+QETH_TYPE = '1731/01'
+PIMPAMPOM = 'e0 e0 ff'
+STORAGE_CHPIDS = 'b0 b1 0d 00 00 00 00 00'
+NETWORK_CHPID = 'f0'
+
+FC_ADAPTERS = 4
+LUNS_PER_PORT = 32
+LUN0 = '0x0000000000000000'
+
+LSCSS_HEADER = 'Device   Subchan.  DevType CU Type Use  PIM PAM POM  ' \
+               'CHPIDs\n' + '-' * 70 + '\n'
+LSCSS_ROW = '%s %s  %s %s %s  e0  e0  ff   b0b10d00 00000000\n'
+ZNETCONF_CONF_HEADER = 'Device IDs                 Type    Card Type      ' \
+                       'CHPID Drv. Name             State  \n' + \
+                       '-' * 80 + '\n'
+ZNETCONF_CONF_ROW = '%s %s OSD_1000       %s qeth enccw%s  online\n'
+ZNETCONF_UNCONF_HEADER = 'Scanning for network devices...\n' \
+                         'Device IDs                 Type    Card Type      ' \
+                         'CHPID Drv.  \n' + '-' * 60 + '\n'
+ZNETCONF_UNCONF_ROW = '%s %s OSA (QDIO)        %s qeth\n'
+TAPE_VENDOR = 'IBM'
+TAPE_MODEL = 'ULT3580-HH6'
+SG_INQ_OUTPUT = """standard INQUIRY:
+  PQual=0  Device_type=0  RMB=0  version=0x05  [SPC-3]
+ Vendor identification: IBM
+ Product identification: 2107900
+ Product revision level: .217
+ Peripheral device type: disk
+ Unit serial number: 75ACXF10000
+"""
+
+
+def write_attrs(path, **attrs):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    for name, value in attrs.iteritems():
+        with open(os.path.join(path, name), 'w') as attr_file:
+            attr_file.write('%s\n' % value)
+
+
+def bus_id(ssid, devno):
+    return '0.%d.%04x' % (ssid, devno)
+
+
+class FakeCommands(object):
+    """
+    Replacement of run_command dispatching the commands to handlers
+    by command name. Unknown commands fail as if not installed.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.calls = {}
+
+    def add(self, name, handler):
+        """
+        :param name: command name, e.g. 'lscss'
+        :param handler: output string, or function getting the command
+                        arguments and returning the output
+        """
+        self.handlers[name] = handler
+
+    def __call__(self, cmd, *args, **kwargs):
+        name = os.path.basename(cmd[0])
+        self.calls[name] = self.calls.get(name, 0) + 1
+        handler = self.handlers.get(name)
+        if handler is None:
+            return '', '%s: command not found' % name, 127
+        if callable(handler):
+            return handler(cmd[1:]), '', 0
+        return handler, '', 0
+
+
+def build_storage_tree(root, count, attributes=True):
+    """
+    Create DASD ECKD and zFCP adapter ccw devices, half of each kind
+    :param root: root directory of the tree
+    :param count: number of devices
+    :param attributes: create the sysfs attributes of the devices, if
+                       False only lscss can list them
+    :return: tuple of the dict with the values of syspath_eckd,
+             syspath_zfcp and syspath_ccw_devices and the lscss output
+    """
+    drivers = os.path.join(root, 'bus/ccw/drivers')
+    devices = os.path.join(root, 'bus/ccw/devices')
+    for path in (drivers + '/dasd-eckd', drivers + '/zfcp', devices):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    rows = []
+    for devno in range(count):
+        device = bus_id(STORAGE_SSID, devno)
+        subchannel_dir = os.path.join(root, 'devices/css0', device)
+        device_dir = os.path.join(subchannel_dir, device)
+        driver = 'zfcp' if devno % 2 else 'dasd-eckd'
+        dev_type, cu_type = ZFCP_TYPES if devno % 2 else DASD_TYPES
+        online = devno % 4 != 3
+        if attributes:
+            write_attrs(subchannel_dir, pimpampom=PIMPAMPOM,
+                        chpids=STORAGE_CHPIDS)
+            write_attrs(device_dir, online=int(online), devtype=dev_type,
+                        cutype=cu_type)
+        elif not os.path.isdir(device_dir):
+            os.makedirs(device_dir)
+        os.symlink(device_dir, os.path.join(drivers, driver, device))
+        os.symlink(device_dir, os.path.join(devices, device))
+        rows.append(LSCSS_ROW % (device, device, dev_type, cu_type,
+                                 'yes' if online else '   '))
+    paths = {'syspath_eckd': drivers + '/dasd-eckd/0.*/',
+             'syspath_zfcp': drivers + '/zfcp/0.*/',
+             'syspath_ccw_devices': devices + '/'}
+    return paths, LSCSS_HEADER + ''.join(rows)
+
+
+def build_network_tree(root, count):
+    """
+    Create qeth ccw devices, half of them grouped into configured
+    interfaces and the other half left ungrouped
+    :param root: root directory of the tree
+    :param count: number of ccw devices, rounded down to triplets
+    :return: tuple of the dict with the values of SYSFS_TRIPLET_PATH and
+             SYSFS_QETH_CCW_PATH and a dict with the znetconf -c and
+             znetconf -u outputs
+    """
+    group_dir = os.path.join(root, 'bus/ccwgroup/drivers/qeth')
+    qeth_dir = os.path.join(root, 'bus/ccw/drivers/qeth')
+    for path in (group_dir, qeth_dir):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    configured = []
+    unconfigured = []
+    for triplet in range(count / 3):
+        ssid = NETWORK_SSIDS[triplet / TRIPLETS_PER_SSID]
+        first = (triplet % TRIPLETS_PER_SSID) * 4
+        device_ids = [bus_id(ssid, first + index) for index in range(3)]
+        device_dirs = []
+        for device in device_ids:
+            subchannel_dir = os.path.join(root, 'devices/css0', device)
+            device_dir = os.path.join(subchannel_dir, device)
+            write_attrs(subchannel_dir, chpids='%s 00 00 00 00 00 00 00'
+                        % NETWORK_CHPID)
+            write_attrs(device_dir, cutype=QETH_TYPE, online=0)
+            os.symlink(device_dir, os.path.join(qeth_dir, device))
+            device_dirs.append(device_dir)
+        ids = ','.join(device_ids)
+        if triplet % 2:
+            unconfigured.append(
+                ZNETCONF_UNCONF_ROW % (ids, QETH_TYPE, NETWORK_CHPID))
+            continue
+        group_device = os.path.join(root, 'devices/qeth', device_ids[0])
+        write_attrs(group_device, if_name='enccw' + device_ids[0],
+                    online=1, portno=0, card_type='OSD_1000',
+                    chpid=NETWORK_CHPID)
+        for index, device_dir in enumerate(device_dirs):
+            os.symlink(device_dir,
+                       os.path.join(group_device, 'cdev%d' % index))
+            os.symlink(group_device,
+                       os.path.join(device_dir, 'group_device'))
+        os.symlink(group_device, os.path.join(group_dir, device_ids[0]))
+        configured.append(ZNETCONF_CONF_ROW % (ids, QETH_TYPE,
+                                               NETWORK_CHPID, device_ids[0]))
+    paths = {'SYSFS_TRIPLET_PATH': group_dir + '/',
+             'SYSFS_QETH_CCW_PATH': qeth_dir + '/'}
+    outputs = {'-c': ZNETCONF_CONF_HEADER + ''.join(configured),
+               '-u': ZNETCONF_UNCONF_HEADER + ''.join(unconfigured)}
+    return paths, outputs
+
+
+def build_fc_tree(root, count):
+    """
+    Create zFCP adapters with remote ports reporting LUNS_PER_PORT LUNs
+    each. LUN 0 of every port is configured and has a sg device, the
+    other LUNs are only reported by sg_luns. A tape drive is attached
+    for every LUNS_PER_PORT LUNs.
+    :param root: root directory of the tree
+    :param count: number of LUNs, rounded up to whole ports
+    :return: tuple of the dict with the values of adapter_dir and sg_dir,
+             a dict with the lszfcp -D and sg_luns outputs and
+             the list of (adapter, port, lun) of the configured LUNs
+    """
+    adapter_dir = os.path.join(root, 'bus/ccw/drivers/zfcp')
+    sg_dir = os.path.join(root, 'class/scsi_generic')
+    for path in (adapter_dir, sg_dir):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    configured = []
+    lszfcp = []
+    ports = (count + LUNS_PER_PORT - 1) / LUNS_PER_PORT
+    for index in range(ports):
+        adapter = bus_id(0, 0x1900 + index % FC_ADAPTERS)
+        port = '0x500507630300%04x' % index
+        host = index % FC_ADAPTERS
+        port_dir = os.path.join(adapter_dir, adapter, port)
+        write_attrs(port_dir, access_denied=0, failed=0, in_recovery=0,
+                    unit_add='', unit_remove='')
+        write_attrs(os.path.join(port_dir, LUN0), failed=0)
+        scsi_dev = '%d:0:%d:0' % (host, index)
+        scsi_dir = os.path.join(root, 'devices/scsi', scsi_dev)
+        write_attrs(scsi_dir, hba_id=adapter, wwpn=port, fcp_lun=LUN0)
+        sg_dev_dir = os.path.join(sg_dir, 'sg%d' % index)
+        os.makedirs(sg_dev_dir)
+        os.symlink(scsi_dir, os.path.join(sg_dev_dir, 'device'))
+        configured.append((adapter, port, LUN0))
+        lszfcp.append('%s/%s/%s %s\n' % (adapter, port, LUN0, scsi_dev))
+    sg_luns = 'Lun list length = %d which imples %d lun entries\n' \
+              'Report luns [select_report=0x0]:\n' % \
+              (LUNS_PER_PORT * 8, LUNS_PER_PORT)
+    sg_luns += ''.join('    40%02x40%02x00000000\n' % (lun / 256, lun % 256)
+                       if lun else '    0000000000000000\n'
+                       for lun in range(LUNS_PER_PORT))
+    for index in range(max(count / LUNS_PER_PORT, 1)):
+        scsi_dev = '%d:0:%d:1' % (index % FC_ADAPTERS, index)
+        scsi_dir = os.path.join(root, 'devices/scsi', scsi_dev)
+        write_attrs(scsi_dir, type=1, vendor=TAPE_VENDOR, model=TAPE_MODEL,
+                    state='running',
+                    hba_id=bus_id(0, 0x1900 + index % FC_ADAPTERS),
+                    wwpn='0x500507630400%04x' % index, fcp_lun=LUN0)
+        os.makedirs(os.path.join(scsi_dir, 'scsi_tape', 'st%d' % index))
+        os.makedirs(os.path.join(scsi_dir, 'scsi_tape', 'nst%d' % index))
+        sg_dev_dir = os.path.join(sg_dir, 'sg%d' % (ports + index))
+        os.makedirs(sg_dev_dir)
+        os.symlink(scsi_dir, os.path.join(sg_dev_dir, 'device'))
+    paths = {'adapter_dir': adapter_dir + '/', 'sg_dir': sg_dir + '/'}
+    outputs = {'lszfcp': ''.join(lszfcp), 'sg_luns': sg_luns}
+    return paths, outputs, configured
+
+
+def cio_ignore_output(count):
+    """
+    :param count: number of entries of the ignore list
+    :return: cio_ignore -l output listing single devices and ranges
+    """
+    rows = []
+    for index in range(count):
+        ssid, devno = divmod(index * 8, 0x10000)
+        if index % 2:
+            rows.append('%s-%s\n' % (bus_id(ssid, devno),
+                                     bus_id(ssid, devno + 5)))
+        else:
+            rows.append(bus_id(ssid, devno) + '\n')
+    return 'Ignored devices:\n=================\n' + ''.join(rows)
+
+
+def fake_commands(lscss='', znetconf=None, fc_outputs=None,
+                  cio_ignore=''):
+    """
+    :return: FakeCommands answering the commands run by the models
+             with the outputs of the builders
+    """
+    commands = FakeCommands()
+    znetconf = znetconf or {}
+    fc_outputs = fc_outputs or {}
+    lszfcp = fc_outputs.get('lszfcp', '')
+
+    def lszfcp_handler(args):
+        if args[:1] == ['-l']:
+            return ''.join(line for line in lszfcp.splitlines(True)
+                           if '/%s ' % args[1] in line)
+        return lszfcp
+
+    commands.add('lscss', lscss)
+    commands.add('znetconf', lambda args: znetconf.get(args[0], ''))
+    commands.add('lszfcp', lszfcp_handler)
+    commands.add('sg_luns', fc_outputs.get('sg_luns', ''))
+    commands.add('sg_inq', SG_INQ_OUTPUT)
+    commands.add('udevadm', '')
+    commands.add('cio_ignore', cio_ignore)
+    return commands
@@ -23,8 +23,11 @@ import mock
 import unittest
 
 import wok.exception as exception
-from model.cioignore import CIOIgnoreModel
+from model.cioignore import CIOIgnoreDeviceModel, CIOIgnoreDevicesModel
+from model.cioignore import CIOIgnoreModel, IgnoreList
+from model.cioignore import _merge_ranges, _parse_device_range
 from model.cioignore import _parse_ignore_output, _remove_devices
+from model.cioignore import invalidate_ignore_list
 
 CIO_IGNORE = "cio_ignore"
 IGNORED_DEVICES = 'ignored_devices'
@@ -215,6 +218,9 @@ class LookUpUnitTests(unittest.TestCase):
     """
     unit tests to validate lookup() method of CIOIgnoreModel
     """
+    def setUp(self):
+        invalidate_ignore_list()
+
     @mock.patch('model.cioignore.TaskModel', autospec=True)
     @mock.patch('model.cioignore.wok_log', autospec=True)
     @mock.patch('model.cioignore.run_command', autospec=True)
@@ -236,7 +242,7 @@ class LookUpUnitTests(unittest.TestCase):
         command = [CIO_IGNORE, '-l']
         mock_run_command.return_value = ['dummy_out', '', 0]
         mock_parse_ignore_output.return_value = []
-        expected_out = {'ignored_devices': []}
+        expected_out = {'ignored_devices': [], 'count': 0}
         ciomodel = CIOIgnoreModel()
         actual_out = ciomodel.lookup(None)
         self.assertEqual(actual_out, expected_out)
@@ -267,7 +273,8 @@ class LookUpUnitTests(unittest.TestCase):
         command = [CIO_IGNORE, '-l']
         mock_run_command.return_value = ['dummy_out', '', 0]
         mock_parse_ignore_output.return_value = ['dev1', '2-20', 3]
-        expected_out = {'ignored_devices': ['dev1', '2-20', 3]}
+        # dev1 is not a device ID, 0x3 is part of range 0x2-0x20
+        expected_out = {'ignored_devices': ['dev1', '2-20', 3], 'count': 31}
         ciomodel = CIOIgnoreModel()
         actual_out = ciomodel.lookup(None)
         self.assertEqual(actual_out, expected_out)
@@ -307,3 +314,144 @@ class LookUpUnitTests(unittest.TestCase):
         mock_wok_log.error.assert_called_once_with('failed to retrieve ignore'
                                                    ' list using \'cio_ignore '
                                                    '-l\'. Error: dummy_error')
+
+
+class BatchedRemoveUnitTests(unittest.TestCase):
+    """
+    unit tests for merging device ranges and batched cio_ignore -r calls
+    """
+    def test_parse_device_range(self):
+        self.assertEqual(_parse_device_range('0.0.0190'),
+                         ((0, 0, 0x190), (0, 0, 0x190)))
+        self.assertEqual(_parse_device_range('0x190-1A0'),
+                         ((0, 0, 0x190), (0, 0, 0x1a0)))
+        for device in ['dev1', '0.0.0200-0.0.0100', '0.0.0100-0.1.0200',
+                       '0.4.0100', '10000', 'all']:
+            self.assertIsNone(_parse_device_range(device))
+
+    def test_merge_ranges(self):
+        ranges = [_parse_device_range(d) for d in
+                  ['0.0.0105-0.0.0110', '0.0.0100-0.0.0104', '0.1.0111',
+                   '0.0.0108', '0.0.0111', '0.0.0200-0.0.0300']]
+        self.assertEqual(_merge_ranges(ranges),
+                         [((0, 0, 0x100), (0, 0, 0x111)),
+                          ((0, 0, 0x200), (0, 0, 0x300)),
+                          ((0, 1, 0x111), (0, 1, 0x111))])
+
+    @mock.patch('model.cioignore.CIO_IGNORE_BATCH_SIZE', 2)
+    @mock.patch('model.cioignore.run_command', autospec=True)
+    @mock.patch('model.cioignore.wok_log', autospec=True)
+    def test_remove_devices_batched(self, mock_wok_log, mock_run_command):
+        """
+        a failing batch is retried device by device to find the
+        failing devices
+        """
+        def run_command(command):
+            if '0.0.0300' in command[2]:
+                return ['', 'cio_ignore: 0.0.0300: busy', 1]
+            return ['', '', 0]
+        mock_run_command.side_effect = run_command
+        cb = mock.Mock()
+        _remove_devices(cb, ['all', '0.0.0101 - 0.0.0110', '100', '300',
+                             '0.0.0200', '0.0.0112'])
+        mock_run_command.assert_has_calls([
+            mock.call([CIO_IGNORE, '-r', 'all']),
+            mock.call([CIO_IGNORE, '-r', '0.0.0100-0.0.0110,0.0.0112']),
+            mock.call([CIO_IGNORE, '-r', '0.0.0200,0.0.0300']),
+            mock.call([CIO_IGNORE, '-r', '0.0.0200']),
+            mock.call([CIO_IGNORE, '-r', '0.0.0300'])])
+        self.assertEqual(mock_run_command.call_count, 5)
+        cb.assert_any_call('Removed 5 of 5 device IDs or ranges '
+                           'from ignore list')
+        self.assertFalse(cb.call_args[0][1])
+        # reported as given by the caller
+        mock_wok_log.error.assert_called_with(
+            'failed to remove devices "%s" from ignore list', '300: busy')
+
+    @mock.patch('model.cioignore.run_command', autospec=True)
+    @mock.patch('model.cioignore.wok_log', autospec=True)
+    def test_remove_devices_failing_range(self, mock_wok_log,
+                                          mock_run_command):
+        """
+        the devices given within a failing merged range are retried one
+        by one and only the failing ones are reported
+        """
+        def run_command(command):
+            if command[2] in ['0.0.0150-0.0.0153', '0.0.0151']:
+                return ['', 'cio_ignore: 0.0.0151: busy', 1]
+            return ['', '', 0]
+        mock_run_command.side_effect = run_command
+        cb = mock.Mock()
+        _remove_devices(cb, ['0.0.0150', '0151', '0.0.0152 - 0.0.0153'])
+        self.assertEqual(mock_run_command.call_args_list, [
+            mock.call([CIO_IGNORE, '-r', '0.0.0150-0.0.0153']),
+            mock.call([CIO_IGNORE, '-r', '0.0.0150']),
+            mock.call([CIO_IGNORE, '-r', '0.0.0151']),
+            mock.call([CIO_IGNORE, '-r', '0.0.0152-0.0.0153'])])
+        mock_wok_log.error.assert_called_with(
+            'failed to remove devices "%s" from ignore list', '0151: busy')
+        self.assertFalse(cb.call_args[0][1])
+
+
+class IgnoreListUnitTests(unittest.TestCase):
+    """
+    unit tests for queries on the ignore list
+    """
+    def setUp(self):
+        invalidate_ignore_list()
+        self.ignore_list = IgnoreList(['0.0.0011', '0.0.0013-0.0.0015',
+                                       '0.0.0016-0.0.0020', '0.1.0000',
+                                       'dummy'])
+
+    def test_ranges(self):
+        self.assertEqual(self.ignore_list.ranges,
+                         [((0, 0, 0x11), (0, 0, 0x11)),
+                          ((0, 0, 0x13), (0, 0, 0x20)),
+                          ((0, 1, 0), (0, 1, 0))])
+        self.assertEqual(self.ignore_list.count(), 16)
+
+    def test_intersection(self):
+        self.assertEqual(self.ignore_list.intersection((0, 0, 0x12),
+                                                       (0, 0, 0x14)),
+                         [((0, 0, 0x13), (0, 0, 0x14))])
+        self.assertEqual(self.ignore_list.intersection((0, 0, 0),
+                                                       (0, 0, 0xffff)),
+                         self.ignore_list.ranges[:2])
+        self.assertEqual(self.ignore_list.intersection((0, 0, 0x12),
+                                                       (0, 0, 0x12)), [])
+        self.assertEqual(self.ignore_list.intersection((0, 2, 0),
+                                                       (0, 2, 0xffff)), [])
+
+    @mock.patch('model.cioignore.TaskModel', autospec=True)
+    @mock.patch('model.cioignore.run_command', autospec=True)
+    def test_device_lookup_cached(self, mock_run_command, mock_task_model):
+        """
+        ignore list is read again only after it was changed
+        """
+        mock_run_command.return_value = ['Ignored devices:\n'
+                                         '=================\n'
+                                         '0.0.0011\n'
+                                         '0.0.0013-0.0.0020\n', '', 0]
+        device_model = CIOIgnoreDeviceModel()
+        self.assertEqual(device_model.lookup('0x12-0.0.0014'),
+                         {'device': '0.0.0012-0.0.0014', 'ignored': False,
+                          'ignored_devices': ['0.0.0013-0.0.0014'],
+                          'count': 2})
+        self.assertEqual(device_model.lookup(u'13'),
+                         {'device': '0.0.0013', 'ignored': True,
+                          'ignored_devices': ['0.0.0013'], 'count': 1})
+        self.assertRaises(exception.InvalidParameter, device_model.lookup,
+                          '0.0.0020-0.0.0013')
+        self.assertEqual(CIOIgnoreDevicesModel().get_list()[1],
+                         {'device': '0.0.0013-0.0.0020', 'ignored': True,
+                          'ignored_devices': ['0.0.0013-0.0.0020'],
+                          'count': 14})
+        # the ignore list is shared by the models
+        self.assertEqual(mock_run_command.call_count, 1)
+
+        mock_run_command.return_value = ['', '', 0]
+        _remove_devices(mock.Mock(), ['0.0.0013'])
+        self.assertEqual(device_model.lookup('13')['ignored'], False)
+        self.assertEqual(CIOIgnoreModel().lookup(None)['count'], 0)
+        # cio_ignore -r and cio_ignore -l
+        self.assertEqual(mock_run_command.call_count, 3)
@@ -0,0 +1,143 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM Corp, 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import mock
+import threading
+import time
+import unittest
+
+from model.executor import COMMAND_TIMEOUT_RC, CommandExecutor
+from wok.exception import TimeoutExpired
+
+
+class BlockingCommand(object):
+    """
+    Replacement of wok run_command blocking until released
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.calls = []
+
+    def __call__(self, cmd, **kwargs):
+        with self.lock:
+            self.calls.append((cmd, kwargs))
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        self.release.wait()
+        with self.lock:
+            self.running -= 1
+        return 'output', '', 0
+
+
+def run_threads(count, func):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(func()))
+               for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+class CommandExecutorUnitTests(unittest.TestCase):
+    """
+    unit tests for CommandExecutor
+    """
+    def setUp(self):
+        self.executor = CommandExecutor({'lscss': (10, 2),
+                                         'chccwdev': (20, 2)})
+        self.command = BlockingCommand()
+        patcher = mock.patch('model.executor._run_command', self.command)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.command.release.set)
+
+    def wait_running(self, count):
+        for _ in range(100):
+            with self.command.lock:
+                if len(self.command.calls) >= count:
+                    return
+            time.sleep(0.01)
+
+    def test_timeout_of_tool(self):
+        self.command.release.set()
+        self.executor.run(['lscss'])
+        self.executor.run(['chccwdev', '-e', '0.0.0150'])
+        self.executor.run(['lsdasd'])
+        self.executor.run(['lscss'], timeout=3)
+        self.assertEqual([kwargs['timeout']
+                          for cmd, kwargs in self.command.calls],
+                         [10, 20, 120, 3])
+
+    @mock.patch('model.executor._run_command', autospec=True)
+    def test_command_timed_out(self, mock_run_command):
+        mock_run_command.side_effect = TimeoutExpired('WOKUTILS0002E')
+        out, err, rc = self.executor.run(['sg_inq', '/dev/sg0'])
+        self.assertEqual(rc, COMMAND_TIMEOUT_RC)
+        stats = self.executor.get_stats()['sg_inq']
+        self.assertEqual(stats['exit_codes'], {COMMAND_TIMEOUT_RC: 1})
+
+    def test_coalesce_read_only_commands(self):
+        threads, results = run_threads(3, lambda: self.executor.run(
+            ['znetconf', '-c']))
+        self.wait_running(1)
+        time.sleep(0.05)
+        self.command.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.command.calls), 1)
+        self.assertEqual(results, [('output', '', 0)] * 3)
+        stats = self.executor.get_stats()['znetconf']
+        self.assertEqual(stats['coalesced'], 2)
+        self.assertEqual(stats['latency']['count'], 1)
+
+    def test_no_coalesce_changing_commands(self):
+        threads, results = run_threads(2, lambda: self.executor.run(
+            ['chccwdev', '-e', '0.0.0150']))
+        self.wait_running(2)
+        self.command.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.command.calls), 2)
+
+    def test_concurrency_limit(self):
+        threads = []
+        for devno in range(5):
+            threads.extend(run_threads(1, lambda devno=devno: (
+                self.executor.run(['lscss', '-d', '0.0.%04x' % devno])))[0])
+        self.wait_running(2)
+        time.sleep(0.05)
+        self.assertEqual(self.command.running, 2)
+        self.command.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.command.calls), 5)
+        self.assertEqual(self.command.max_running, 2)
+
+    def test_latency_histogram(self):
+        self.command.release.set()
+        self.executor.run(['lscss'])
+        self.executor.run(['lscss', '-d', '0.0.0150'])
+        stats = self.executor.get_stats()['lscss']
+        self.assertEqual(stats['exit_codes'], {0: 2})
+        self.assertEqual(stats['latency']['count'], 2)
+        self.assertEqual(stats['latency']['buckets'][-1], ('+Inf', 2))
@@ -18,11 +18,15 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
 import mock
+import os
 import re
+import shutil
+import tempfile
 import unittest
 
 import model.fc_luns as fc_luns
 from wok.exception import InvalidOperation, InvalidParameter, MissingParameter
+from wok.exception import NotFoundError
 from model import utils
 
 
@@ -163,3 +167,450 @@ root=/dev/disk/by-path/ccw-0.0.5184-part1 rd_DASD=0.0.5184"""
         pattern = r'.+zfcp\.allow_lun_scan=(\d)'
         m = re.search(pattern, boot_params_str)
         self.assertTrue(int(m.group(1)))
+
+
+class LUNInventoryTests(unittest.TestCase):
+    """
+    unit tests for the LUN inventory cached in object store
+    """
+    hba_id = "0.0.1000"
+    wwpn = "0x5005076801102991"
+    port_state = {'failed': '0', 'in_recovery': '0', 'access_denied': '0',
+                  'luns': ['0x0001000000000000']}
+    lun = {'hbaId': hba_id, 'remoteWwpn': wwpn,
+           'lunId': '0x0001000000000000', 'configured': 'true'}
+
+    def _get_objstore(self, entry):
+        objstore = mock.MagicMock()
+        session = objstore.__enter__.return_value
+        session.get_list.return_value = [self.hba_id + ':' + self.wwpn]
+        session.get.return_value = entry
+        return objstore
+
+    @mock.patch('model.utils.run_command', autospec=True)
+    @mock.patch('model.utils.get_port_state', autospec=True)
+    @mock.patch('model.utils._get_host_fcp_dict', autospec=True)
+    @mock.patch('model.utils.is_lun_scan_enabled', autospec=True)
+    def test_get_luns_cached(self, mock_scan_enabled, mock_host_fcp_dict,
+                             mock_port_state, mock_run_command):
+        mock_scan_enabled.return_value = {'current': False}
+        mock_host_fcp_dict.return_value = {self.hba_id: [self.wwpn]}
+        mock_port_state.return_value = self.port_state
+        objstore = self._get_objstore(
+            {'state': self.port_state,
+             'luns': {self.lun['lunId']: self.lun}})
+
+        luns = utils.get_luns(objstore)
+        self.assertEqual(luns, [self.lun])
+        self.assertFalse(mock_run_command.called)
+
+    @mock.patch('model.utils._discover_port_luns', autospec=True)
+    @mock.patch('model.utils._get_lun_dict', autospec=True)
+    @mock.patch('model.utils.run_command', autospec=True)
+    @mock.patch('model.utils.get_port_state', autospec=True)
+    @mock.patch('model.utils._get_host_fcp_dict', autospec=True)
+    @mock.patch('model.utils.is_lun_scan_enabled', autospec=True)
+    def test_get_luns_port_changed(self, mock_scan_enabled,
+                                   mock_host_fcp_dict, mock_port_state,
+                                   mock_run_command, mock_get_lun_dict,
+                                   mock_discover_port_luns):
+        mock_scan_enabled.return_value = {'current': False}
+        mock_host_fcp_dict.return_value = {self.hba_id: [self.wwpn]}
+        mock_port_state.return_value = self.port_state
+        mock_run_command.return_value = ['', '', 0]
+        mock_get_lun_dict.return_value = {}
+        mock_discover_port_luns.return_value = [self.lun]
+        failed_state = dict(self.port_state, failed='1')
+        objstore = self._get_objstore({'state': failed_state, 'luns': {}})
+
+        luns = utils.get_luns(objstore)
+        self.assertEqual(luns, [self.lun])
+        mock_discover_port_luns.assert_called_once_with(
+            self.hba_id, self.wwpn, None, {})
+        session = objstore.__enter__.return_value
+        self.assertTrue(session.store.called)
+
+
+class LUNInfoTests(unittest.TestCase):
+    """
+    unit tests for the details of unconfigured LUNs, read without
+    attaching them
+    """
+    hba_id = "0.0.1000"
+    wwpn = "0x5005076801102991"
+    lun_id = "0x0001000000000000"
+    sg_luns_output = """Lun list length = 16 which imples 2 lun entries
+Report luns [select_report=0x0]:
+    0000000000000000
+    0001000000000000
+"""
+    sg_inq_output = """standard INQUIRY:
+    length=109 (0x6d)   Peripheral device type: disk
+ Vendor identification: IBM
+ Product identification: 2145
+ Unit serial number: 0200a0435412XX00
+"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        os.makedirs(os.path.join(self.tmp_dir, self.hba_id, self.wwpn))
+        for patcher in [
+                mock.patch('model.utils.adapter_dir', self.tmp_dir + '/'),
+                mock.patch('model.utils.lun_info_cache',
+                           utils.LUNInfoCache()),
+                mock.patch('model.utils.is_lun_scan_enabled',
+                           return_value={'current': False})]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _run_command(self, cmd):
+        outputs = {'lszfcp': '', 'sg_luns': self.sg_luns_output,
+                   'sg_inq': self.sg_inq_output}
+        return outputs[cmd[0]], '', 0
+
+    @mock.patch('model.utils._discover_port_luns_locked', autospec=True)
+    @mock.patch('model.utils._load_lun_inventory', autospec=True)
+    @mock.patch('model.utils.run_command', autospec=True)
+    def test_lun_info_from_inventory(self, mock_run_command,
+                                     mock_load_inventory, mock_discover):
+        mock_run_command.side_effect = self._run_command
+        lun = {'hbaId': self.hba_id, 'remoteWwpn': self.wwpn,
+               'lunId': self.lun_id, 'vendor': 'IBM', 'configured': 'false'}
+        mock_load_inventory.return_value = {(self.hba_id, self.wwpn): [lun]}
+
+        objstore = mock.MagicMock()
+        lun_info = utils.get_lun_info(self.hba_id, self.wwpn, self.lun_id,
+                                      objstore=objstore)
+        self.assertEqual(lun_info, lun)
+        self.assertFalse(mock_discover.called)
+
+        # served from cache until the LUNs of the port change
+        mock_run_command.reset_mock()
+        utils.get_lun_info(self.hba_id, self.wwpn, self.lun_id, objstore)
+        self.assertFalse(mock_run_command.called)
+        utils.invalidate_lun_inventory(objstore, self.hba_id, self.wwpn)
+        utils.get_lun_info(self.hba_id, self.wwpn, self.lun_id, objstore)
+        self.assertTrue(mock_run_command.called)
+
+    @mock.patch('model.utils._discover_port_luns_locked', autospec=True)
+    @mock.patch('model.utils.sg_index', autospec=True)
+    @mock.patch('model.utils.run_command', autospec=True)
+    def test_lun_info_from_attached_lun(self, mock_run_command,
+                                        mock_sg_index, mock_discover):
+        mock_run_command.side_effect = self._run_command
+        mock_sg_index.get_items.return_value = [
+            ((self.hba_id, self.wwpn, utils.lun0), 'sg3'),
+            (('0.0.2000', self.wwpn, self.lun_id), 'sg4')]
+
+        lun_info = utils.get_lun_info(self.hba_id, self.wwpn, self.lun_id)
+        self.assertEqual(lun_info['configured'], 'false')
+        self.assertEqual(lun_info['vendor'], 'IBM')
+        self.assertNotIn('sgDev', lun_info)
+        mock_run_command.assert_any_call(['sg_inq', '/dev/sg3'])
+        self.assertFalse(mock_discover.called)
+        self.assertFalse(os.path.exists(os.path.join(
+            self.tmp_dir, self.hba_id, self.wwpn, 'unit_add')))
+
+        self.assertRaises(NotFoundError, utils.get_lun_info, self.hba_id,
+                          self.wwpn, '0x0009000000000000')
+
+    @mock.patch('model.utils._load_lun_inventory', autospec=True)
+    @mock.patch('model.utils._discover_port_luns_locked', autospec=True)
+    @mock.patch('model.utils.sg_index', autospec=True)
+    @mock.patch('model.utils.run_command', autospec=True)
+    def test_lun_info_port_not_discovered(self, mock_run_command,
+                                          mock_sg_index, mock_discover,
+                                          mock_load_inventory):
+        mock_run_command.side_effect = self._run_command
+        mock_sg_index.get_items.return_value = []
+        mock_load_inventory.return_value = {}
+
+        # a lookup never attaches the discovery LUN of the port
+        self.assertRaises(NotFoundError, utils.get_lun_info, self.hba_id,
+                          self.wwpn, self.lun_id, objstore=mock.Mock())
+        self.assertFalse(mock_discover.called)
+        self.assertFalse(os.path.exists(os.path.join(
+            self.tmp_dir, self.hba_id, self.wwpn, 'unit_add')))
+
+
+class SgDeviceIndexTests(unittest.TestCase):
+    """
+    unit tests for the index of FC sg devices
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.sg_dir = os.path.join(self.tmp_dir, 'scsi_generic') + '/'
+        os.mkdir(self.sg_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _add_sg_dev(self, sg_dev, hctl, hba_id, wwpn, fcp_lun):
+        scsi_dev_dir = os.path.join(self.tmp_dir, hctl)
+        if not os.path.isdir(scsi_dev_dir):
+            os.mkdir(scsi_dev_dir)
+            for attr, value in [('hba_id', hba_id), ('wwpn', wwpn),
+                                ('fcp_lun', fcp_lun)]:
+                with open(os.path.join(scsi_dev_dir, attr), 'w') as f:
+                    f.write(value + '\n')
+        os.mkdir(self.sg_dir + sg_dev)
+        os.symlink(scsi_dev_dir, self.sg_dir + sg_dev + '/device')
+
+    def _remove_sg_dev(self, sg_dev):
+        os.unlink(self.sg_dir + sg_dev + '/device')
+        os.rmdir(self.sg_dir + sg_dev)
+
+    def test_index_refresh(self):
+        lun1 = ('0.0.1000', '0x5005076801102991', '0x0001000000000000')
+        lun2 = ('0.0.1000', '0x5005076801102991', '0x0002000000000000')
+        self._add_sg_dev('sg0', '0:0:0:1', *lun1)
+        self._add_sg_dev('sg1', '0:0:0:2', *lun2)
+        # non FC sg device
+        os.mkdir(os.path.join(self.tmp_dir, '1:0:0:0'))
+        os.mkdir(self.sg_dir + 'sg2')
+        os.symlink(os.path.join(self.tmp_dir, '1:0:0:0'),
+                   self.sg_dir + 'sg2/device')
+
+        with mock.patch('model.utils.sg_dir', self.sg_dir):
+            sg_index = utils.SgDeviceIndex()
+            self.assertEqual(sorted(sg_index.get_items()),
+                             [(lun1, 'sg0'), (lun2, 'sg1')])
+
+            # sg device removed and its name re-used by another LUN
+            self._remove_sg_dev('sg1')
+            self._remove_sg_dev('sg0')
+            self._add_sg_dev('sg0', '0:0:0:2', *lun2)
+            self.assertEqual(sg_index.get_sg_dev(*lun2), 'sg0')
+            self.assertIsNone(sg_index.get_sg_dev(*lun1))
+
+
+class BulkAddLUNsTests(unittest.TestCase):
+    """
+    unit tests for adding multiple LUNs at once
+    """
+    hba_id = "0.0.1000"
+    wwpns = ["0x5005076801102991", "0x5005076801102992"]
+    lun1 = (hba_id, wwpns[0], '0x0001000000000000')
+    lun2 = (hba_id, wwpns[1], '0x0001000000000000')
+    lun3 = (hba_id, wwpns[1], '0x0002000000000000')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.adapter_dir = os.path.join(self.tmp_dir, 'zfcp') + '/'
+        for wwpn in self.wwpns:
+            os.makedirs(self.adapter_dir + self.hba_id + '/' + wwpn)
+        self.zfcp_conf = os.path.join(self.tmp_dir, 'zfcp.conf')
+        with open(self.zfcp_conf, 'w') as f:
+            f.write('0.0.1000\n' + ' '.join(self.lun2) + '\n')
+        for name, value in [('adapter_dir', self.adapter_dir),
+                            ('zfcp_conf', self.zfcp_conf)]:
+            patcher = mock.patch('model.utils.' + name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _arrive(self, paths, timeout):
+        # kernel creates the LUN directories of the unit_add writes, except
+        # for the LUNs it can't attach
+        for wwpn in self.wwpns:
+            port_dir = self.adapter_dir + self.hba_id + '/' + wwpn + '/'
+            with open(port_dir + 'unit_add') as f:
+                lun_id = f.read()
+            if lun_id != self.lun3[2] and \
+                    not os.path.exists(port_dir + lun_id):
+                os.mkdir(port_dir + lun_id)
+        return all(os.path.exists(path) for path in paths)
+
+    @mock.patch('model.utils.device_state', autospec=True)
+    def test_add_luns(self, mock_device_state):
+        mock_device_state.wait_for_paths.side_effect = self._arrive
+
+        added, failed = utils.add_luns([self.lun1, self.lun2, self.lun1])
+        self.assertEqual(added, [self.lun1, self.lun2])
+        self.assertEqual(failed, {})
+        # a single wait for the whole batch
+        mock_device_state.wait_for_paths.assert_called_once_with(
+            [self.adapter_dir + '/'.join(lun)
+             for lun in [self.lun1, self.lun2]], utils.LUN_WAIT_TIMEOUT)
+        with open(self.zfcp_conf) as f:
+            self.assertEqual(f.read().splitlines(),
+                             ['0.0.1000', ' '.join(self.lun2),
+                              ' '.join(self.lun1)])
+
+        # LUN already present, nothing to wait for
+        mock_device_state.reset_mock()
+        added, failed = utils.add_luns([self.lun1])
+        self.assertEqual(added, [self.lun1])
+        self.assertFalse(mock_device_state.wait_for_paths.called)
+
+    @mock.patch('model.utils.device_state', autospec=True)
+    def test_add_luns_invalidates_lun_info(self, mock_device_state):
+        mock_device_state.wait_for_paths.side_effect = self._arrive
+        cache = utils.LUNInfoCache()
+        cache.set(self.lun1[0], self.lun1[1], self.lun1[2],
+                  {'configured': 'false'})
+        other_lun = ('0.0.2000', self.wwpns[0], self.lun1[2])
+        cache.set(other_lun[0], other_lun[1], other_lun[2],
+                  {'configured': 'false'})
+
+        with mock.patch('model.utils.lun_info_cache', cache):
+            utils.add_luns([self.lun1, self.lun2])
+        self.assertIsNone(cache.get(*self.lun1))
+        self.assertEqual(cache.get(*other_lun), {'configured': 'false'})
+
+    @mock.patch('model.utils.device_state', autospec=True)
+    def test_add_luns_partial_failure(self, mock_device_state):
+        mock_device_state.wait_for_paths.side_effect = self._arrive
+
+        added, failed = utils.add_luns([self.lun1, self.lun3])
+        self.assertEqual(added, [self.lun1])
+        self.assertEqual(failed.keys(), [self.lun3])
+        with open(self.zfcp_conf) as f:
+            self.assertNotIn(' '.join(self.lun3), f.read())
+
+    @mock.patch('model.fc_luns.AsyncTask', autospec=True)
+    @mock.patch('model.fc_luns.utils.is_lun_scan_enabled', autospec=True)
+    def test_bulk_add_model(self, mock_scan_enabled, mock_task):
+        mock_scan_enabled.return_value = {'current': False}
+        mock_task.return_value.id = '1'
+        model = fc_luns.FCLUNsBulkModel(objstore=None)
+        model.task = mock.Mock()
+
+        self.assertRaises(InvalidParameter, model.add, 'bulk', [])
+        self.assertRaises(InvalidParameter, model.add, 'bulk',
+                          [{'hbaId': self.hba_id}])
+        self.assertRaises(InvalidParameter, model.add, 'bulk',
+                          [{'hbaId': self.hba_id, 'remoteWwpn': 'wwpn',
+                            'lunId': self.lun1[2]}])
+        self.assertFalse(mock_task.called)
+
+        model.add('bulk', [{'hbaId': self.lun1[0],
+                            'remoteWwpn': self.lun1[1],
+                            'lunId': self.lun1[2]}])
+        mock_task.assert_called_once_with(
+            '/plugins/gingers390x/fcluns/bulk/add', fc_luns._bulk_add_luns,
+            (None, [self.lun1]))
+
+        mock_scan_enabled.return_value = {'current': True}
+        self.assertRaises(InvalidOperation, model.add, 'bulk',
+                          [{'hbaId': self.lun1[0],
+                            'remoteWwpn': self.lun1[1],
+                            'lunId': self.lun1[2]}])
+
+    @mock.patch('model.fc_luns.device_state', autospec=True)
+    @mock.patch('model.fc_luns.utils.invalidate_lun_inventory', autospec=True)
+    @mock.patch('model.fc_luns.utils.add_luns', autospec=True)
+    def test_bulk_add_task(self, mock_add_luns, mock_invalidate,
+                           mock_device_state):
+        cb = mock.Mock()
+        mock_add_luns.return_value = ([self.lun1], {self.lun3: 'error'})
+
+        fc_luns._bulk_add_luns(cb, ('objstore', [self.lun1, self.lun3]))
+        self.assertEqual(cb.call_args, mock.call(mock.ANY, False))
+        self.assertEqual(sorted(mock_invalidate.call_args_list),
+                         [mock.call('objstore', self.hba_id, wwpn)
+                          for wwpn in self.wwpns])
+        self.assertTrue(mock_device_state.invalidate.called)
+
+        mock_add_luns.return_value = ([self.lun1], {})
+        fc_luns._bulk_add_luns(cb, ('objstore', [self.lun1]))
+        cb.assert_called_with('Successfully added 1 LUNs', True)
+
+
+class MultipathMapTests(unittest.TestCase):
+    """
+    unit tests for the map of multipath devices to their paths
+    """
+    path1 = ('0.0.1000', '0x5005076801102991', '0x0001000000000000')
+    path2 = ('0.0.2000', '0x5005076801202991', '0x0001000000000000')
+    path3 = ('0.0.1000', '0x5005076801102991', '0x0002000000000000')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.block_dir = os.path.join(self.tmp_dir, 'block') + '/'
+        os.mkdir(self.block_dir)
+        for patcher in [mock.patch('model.utils.block_dir', self.block_dir),
+                        mock.patch('model.utils.multipath_map',
+                                   utils.MultipathMap())]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self._add_path('sda', '0:0:0:1', 'sg0', *self.path1)
+        self._add_path('sdb', '1:0:0:1', 'sg1', *self.path2)
+        self._add_path('sdc', '0:0:0:2', 'sg2', *self.path3)
+        self._add_dm('dm-0', 'mpatha', ['sda', 'sdb'])
+
+    def _add_path(self, block_dev, scsi_dev, sg_dev, hba_id, wwpn, fcp_lun):
+        scsi_dev_dir = os.path.join(self.tmp_dir, scsi_dev)
+        os.makedirs(os.path.join(scsi_dev_dir, 'scsi_generic', sg_dev))
+        for attr, value in [('hba_id', hba_id), ('wwpn', wwpn),
+                            ('fcp_lun', fcp_lun)]:
+            with open(os.path.join(scsi_dev_dir, attr), 'w') as f:
+                f.write(value + '\n')
+        os.mkdir(self.block_dir + block_dev)
+        os.symlink(scsi_dev_dir, self.block_dir + block_dev + '/device')
+
+    def _add_dm(self, dm_dev, name, slaves):
+        os.makedirs(self.block_dir + dm_dev + '/dm')
+        with open(self.block_dir + dm_dev + '/dm/name', 'w') as f:
+            f.write(name + '\n')
+        os.mkdir(self.block_dir + dm_dev + '/slaves')
+        for slave in slaves:
+            os.mkdir(self.block_dir + dm_dev + '/slaves/' + slave)
+
+    def test_map_refresh(self):
+        multipath_map = utils.multipath_map
+        multipath = multipath_map.get_multipath(*self.path2)
+        self.assertEqual(multipath['name'], 'mpatha')
+        self.assertEqual(multipath['paths'], [
+            {'hbaId': self.path1[0], 'remoteWwpn': self.path1[1],
+             'lunId': self.path1[2], 'scsiDev': '0:0:0:1', 'sgDev': 'sg0'},
+            {'hbaId': self.path2[0], 'remoteWwpn': self.path2[1],
+             'lunId': self.path2[2], 'scsiDev': '1:0:0:1', 'sgDev': 'sg1'}])
+        self.assertIsNone(multipath_map.get_multipath(*self.path3))
+
+        # paths of unchanged dm devices are not read again
+        with mock.patch('model.utils._read_multipath',
+                        autospec=True) as mock_read:
+            mock_read.return_value = {
+                'name': 'mpathb', 'dmDev': 'dm-1',
+                'paths': [{'hbaId': self.path3[0],
+                           'remoteWwpn': self.path3[1],
+                           'lunId': self.path3[2]}]}
+            self._add_dm('dm-1', 'mpathb', ['sdc'])
+            self.assertEqual(
+                multipath_map.get_multipath(*self.path3)['name'], 'mpathb')
+            mock_read.assert_called_once_with('dm-1', ['sdc'])
+
+        shutil.rmtree(self.block_dir + 'dm-0')
+        self.assertIsNone(multipath_map.get_multipath(*self.path1))
+
+    @mock.patch('model.utils.get_sg_dev', autospec=True)
+    @mock.patch('model.utils.run_command', autospec=True)
+    @mock.patch('model.utils.clear_multipath', autospec=True)
+    @mock.patch('model.utils.remove_auto_lun', autospec=True)
+    def test_remove_lun_paths(self, mock_remove_auto_lun,
+                              mock_clear_multipath, mock_run_command,
+                              mock_get_sg_dev):
+        with mock.patch('model.utils.adapter_dir', self.tmp_dir + '/'):
+            luns = utils.remove_lun(*self.path1)
+        self.assertEqual(luns, [self.path1, self.path2])
+        mock_clear_multipath.assert_called_once_with('mpatha')
+        self.assertEqual(mock_remove_auto_lun.call_args_list,
+                         [mock.call('0:0:0:1'), mock.call('1:0:0:1')])
+        self.assertFalse(mock_run_command.called)
+        self.assertFalse(mock_get_sg_dev.called)
+
+    @mock.patch('model.utils._get_single_path', autospec=True)
+    def test_group_multipath_luns(self, mock_single_path):
+        mock_single_path.side_effect = lambda *path, **kwargs: {'lunId': path}
+        luns = [{'hbaId': path[0], 'remoteWwpn': path[1], 'lunId': path[2],
+                 'vendor': 'IBM'}
+                for path in [self.path1, self.path3, self.path2]]
+        groups = utils.group_multipath_luns(luns)
+        self.assertEqual([(group['lunId'], group['multipath'],
+                           len(group['paths'])) for group in groups],
+                         [(self.path1[2], 'mpatha', 2),
+                          (self.path3[2], None, 1)])
+        self.assertEqual(groups[0]['vendor'], 'IBM')
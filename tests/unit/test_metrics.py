@@ -0,0 +1,139 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM Corp, 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import mock
+import threading
+import unittest
+
+import wok.exception as exception
+from model import metrics
+from model.metrics import AsyncTask, instrument_model, MetricsRegistry
+from model.metrics import timed_lock
+
+
+class MetricsRegistryUnitTests(unittest.TestCase):
+    """
+    unit tests for MetricsRegistry rendering
+    """
+    def test_render_counter(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('test_calls_total', 'Calls', ['method'])
+        counter.inc(method='get_list')
+        counter.inc(2, method='get_list')
+        counter.inc(method='a"b')
+        self.assertEqual(registry.render(),
+                         '# HELP test_calls_total Calls\n'
+                         '# TYPE test_calls_total counter\n'
+                         'test_calls_total{method="a\\"b"} 1\n'
+                         'test_calls_total{method="get_list"} 3\n')
+
+    def test_render_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram('test_seconds', 'Duration',
+                                       ['command'], [0.1, 1])
+        histogram.observe(0.05, command='lscss')
+        histogram.observe(0.5, command='lscss')
+        histogram.observe(5, command='lscss')
+        self.assertEqual(registry.render(),
+                         '# HELP test_seconds Duration\n'
+                         '# TYPE test_seconds histogram\n'
+                         'test_seconds_bucket{command="lscss",le="0.1"} 1\n'
+                         'test_seconds_bucket{command="lscss",le="1"} 2\n'
+                         'test_seconds_bucket{command="lscss",le="+Inf"} 3\n'
+                         'test_seconds_sum{command="lscss"} 5.55\n'
+                         'test_seconds_count{command="lscss"} 3\n')
+
+    def test_collector(self):
+        registry = MetricsRegistry()
+        other = MetricsRegistry()
+        other.counter('other_total', 'Other').inc()
+        registry.add_collector(other.collect)
+        self.assertIn('other_total 1\n', registry.render())
+
+
+class FakeModel(object):
+    def __init__(self, **kargs):
+        pass
+
+    def lookup(self, name):
+        return {'name': name}
+
+    def delete(self, name):
+        raise exception.NotFoundError('GS390XSTG00008')
+
+    def _private(self):
+        return True
+
+
+class InstrumentationUnitTests(unittest.TestCase):
+    """
+    unit tests for instrument_model(), timed_lock() and AsyncTask
+    """
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            metrics,
+            model_calls=metrics.Counter('calls', '', ['model', 'method']),
+            model_errors=metrics.Counter('errors', '', ['model', 'method']),
+            model_duration=metrics.Histogram('duration', '',
+                                             ['model', 'method']),
+            lock_wait=metrics.Histogram('wait', '', ['lock']),
+            task_queue_duration=metrics.Histogram('queue', '', ['task']),
+            task_duration=metrics.Histogram('task', '', ['task', 'status']))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_instrument_model(self):
+        model = instrument_model(FakeModel())
+        self.assertEqual(model.lookup('x'), {'name': 'x'})
+        self.assertRaises(exception.NotFoundError, model.delete, 'x')
+        self.assertEqual(model.lookup.__name__, 'lookup')
+        self.assertEqual(metrics.model_calls.items(),
+                         [(('fake', 'delete'), 1), (('fake', 'lookup'), 1)])
+        self.assertEqual(metrics.model_errors.items(),
+                         [(('fake', 'delete'), 1)])
+        self.assertEqual([key for key, sample in
+                          metrics.model_duration.items()],
+                         [('fake', 'delete'), ('fake', 'lookup')])
+        model._private()
+        self.assertEqual(len(metrics.model_calls.items()), 2)
+
+    def test_timed_lock(self):
+        lock = threading.Lock()
+        with timed_lock(lock, 'fc_port'):
+            self.assertTrue(lock.locked())
+        self.assertFalse(lock.locked())
+        [(key, sample)] = metrics.lock_wait.items()
+        self.assertEqual((key, sample.count), (('fc_port',), 1))
+
+    @mock.patch('model.metrics.asynctask.AsyncTask.__init__', autospec=True)
+    def test_async_task(self, mock_init):
+        fn = mock.Mock(side_effect=lambda cb, params: cb('done', False))
+        AsyncTask('/plugins/gingers390x/nwdevices/enccw0.0.f500/configure',
+                  fn, {'name': 'enccw0.0.f500'})
+        task, uri, timed_fn, params = mock_init.call_args[0]
+        cb = mock.Mock()
+        timed_fn(cb, params)
+        fn.assert_called_once_with(mock.ANY, {'name': 'enccw0.0.f500'})
+        cb.assert_called_once_with('done', False)
+        self.assertEqual([key for key, sample in
+                          metrics.task_queue_duration.items()],
+                         [('nwdevices/configure',)])
+        self.assertEqual([key for key, sample in
+                          metrics.task_duration.items()],
+                         [('nwdevices/configure', 'failed')])
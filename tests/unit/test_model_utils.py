@@ -18,11 +18,19 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
 import mock
+import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 
 import wok.exception as exception
-from model.model_utils import get_directories, get_dirname
-from model.model_utils import get_row_data, get_rows_info
+from model.model_utils import ConfFile
+from model.model_utils import get_directories, get_dirname, get_page
+from model.model_utils import get_row_data, get_rows_info, get_table_parser
+from model.model_utils import match_filters
+from model.model_utils import run_in_parallel, single_flight, SingleFlight
 
 
 class GetDirectoriesDirnameUnitTests(unittest.TestCase):
@@ -249,3 +257,380 @@ class GetRowsInfoUnitTests(unittest.TestCase):
                                 hdr_index=0, val_start_index=1)
         self.assertEqual(devices, {'0000': {"dummy": "0000",
                                    "output": "output"}})
+
+
+class TableParserUnitTests(unittest.TestCase):
+    """
+    Unit tests for TableParser
+    """
+    def setUp(self):
+        self.out = "Device   Type Use\n" \
+                   "-----------------\n" \
+                   "0.0.0200 3390 yes\n" \
+                   "garbage\n" \
+                   "0.0.0201 3390 no\n"
+        self.parser = get_table_parser(r'(Device)\s+(Type)\s+(Use)',
+                                       r'(\d\.\d\.\d{4})\s+(\d+)\s+(\w+)')
+
+    def test_parser_reused(self):
+        """
+        get_table_parser() should compile the patterns only once
+        """
+        self.assertIs(self.parser,
+                      get_table_parser(r'(Device)\s+(Type)\s+(Use)',
+                                       r'(\d\.\d\.\d{4})\s+(\d+)\s+(\w+)'))
+
+    def test_iter_rows(self):
+        """
+        iter_rows() should lazily yield the matching rows
+        """
+        rows = self.parser.iter_rows(self.out)
+        self.assertEqual(next(rows), {'Device': '0.0.0200', 'Type': '3390',
+                                      'Use': 'yes'})
+        self.assertEqual(list(rows), [{'Device': '0.0.0201',
+                                       'Type': '3390', 'Use': 'no'}])
+
+    def test_iter_rows_tuples(self):
+        """
+        iter_rows() should yield tuples in the order of get_columns()
+        """
+        self.assertEqual(self.parser.get_columns(self.out),
+                         ('Device', 'Type', 'Use'))
+        self.assertEqual(list(self.parser.iter_rows(self.out, as_tuple=True)),
+                         [('0.0.0200', '3390', 'yes'),
+                          ('0.0.0201', '3390', 'no')])
+
+    @mock.patch('model.model_utils.wok_log', autospec=True)
+    def test_iter_rows_no_header(self, mock_log):
+        """
+        iter_rows() should raise OperationFailed if the header is missing
+        """
+        rows = self.parser.iter_rows("\n".join(self.out.split("\n")[1:]))
+        self.assertRaises(exception.OperationFailed, list, rows)
+
+
+class RunInParallelUnitTests(unittest.TestCase):
+    """
+    Unit tests for run_in_parallel()
+    """
+    def test_results_in_order(self):
+        """
+        run_in_parallel() should return results in the order of arguments
+        """
+        args_list = [(i,) for i in range(20)]
+        results = run_in_parallel(lambda x: x * 2, args_list, 4)
+        self.assertEqual(results, [i * 2 for i in range(20)])
+
+    def test_single_worker(self):
+        """
+        run_in_parallel() with a single worker runs calls in the caller
+        """
+        results = run_in_parallel(lambda x, y: x + y, [(1, 2), (3, 4)], 1)
+        self.assertEqual(results, [3, 7])
+
+    def test_exception_reraised(self):
+        """
+        run_in_parallel() should re-raise exception raised by a call
+        """
+        def func(x):
+            if x == 3:
+                raise exception.OperationFailed("GS390XSTG00021",
+                                                {'err': 'dummy'})
+            return x
+
+        self.assertRaises(exception.OperationFailed, run_in_parallel,
+                          func, [(i,) for i in range(6)], 3)
+
+
+class SingleFlightUnitTests(unittest.TestCase):
+    """
+    Unit tests for SingleFlight and single_flight()
+    """
+    def setUp(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def compute(self, value=1):
+        self.calls.append(value)
+        self.release.wait()
+        return [{'value': value}]
+
+    def run_concurrently(self, funcs):
+        results = [None] * len(funcs)
+
+        def run(index):
+            try:
+                results[index] = funcs[index]()
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=run, args=(index,))
+                   for index in range(len(funcs))]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_shared_result(self):
+        """
+        concurrent calls with the same key should run the function once
+        and get equal copies of its result
+        """
+        flight = SingleFlight()
+        results = self.run_concurrently(
+            [lambda: flight.do('key', self.compute)] * 3)
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(results, [[{'value': 1}]] * 3)
+        self.assertIsNot(results[0][0], results[1][0])
+
+    def test_shared_exception(self):
+        """
+        concurrent calls should all get the exception of the function
+        """
+        flight = SingleFlight()
+
+        def func():
+            self.compute()
+            raise exception.OperationFailed("GS390XSTG00007")
+
+        results = self.run_concurrently([lambda: flight.do('key', func)] * 2)
+        self.assertEqual(len(self.calls), 1)
+        for result in results:
+            self.assertIsInstance(result, exception.OperationFailed)
+
+    def test_decorator_arguments(self):
+        """
+        single_flight() should share results only between calls with
+        the same arguments, and run again once the calls are done
+        """
+        test = self
+
+        class Model(object):
+            @single_flight
+            def get_list(self, _filters=None):
+                return test.compute(_filters)
+
+        model = Model()
+        results = self.run_concurrently(
+            [lambda: model.get_list(_filters={'a': 1, 'b': 2}),
+             lambda: model.get_list(_filters={'b': 2, 'a': 1}),
+             lambda: model.get_list()])
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[2], [{'value': None}])
+        model.get_list()
+        self.assertEqual(len(self.calls), 3)
+
+
+class GetPageUnitTests(unittest.TestCase):
+    """
+    Unit tests for get_page()
+    """
+    def setUp(self):
+        self.entries = [{'device': '0.0.%04x' % i,
+                         'status': 'online' if i % 2 else 'offline',
+                         'chpids': ['%02x' % i]}
+                        for i in range(10)]
+
+    def test_offset_limit(self):
+        """
+        get_page() should return the requested slice and the total count
+        """
+        page = get_page(self.entries, offset='2', limit='3')
+        self.assertEqual([e['device'] for e in page],
+                         ['0.0.0002', '0.0.0003', '0.0.0004'])
+        self.assertEqual(page.total, 10)
+
+    def test_filters_before_paging(self):
+        """
+        get_page() should apply the filters before paging
+        """
+        page = get_page(self.entries, {'status': 'offline'}, 1, 2)
+        self.assertEqual([e['device'] for e in page],
+                         ['0.0.0002', '0.0.0004'])
+        self.assertEqual(page.total, 5)
+
+    def test_filter_list_values(self):
+        """
+        get_page() should match a list of values and list fields
+        """
+        page = get_page(self.entries,
+                        {'device': ['0.0.0001', '0.0.0003'],
+                         'chpids': '03'})
+        self.assertEqual([e['device'] for e in page], ['0.0.0003'])
+        page = get_page(self.entries, {'unknown': 'value'})
+        self.assertEqual(page, [])
+        self.assertEqual(page.total, 0)
+
+    def test_filter_partial_match(self):
+        """
+        get_page() should match values as wok does, with re.match
+        """
+        page = get_page(self.entries, {'device': '0.0.000[13]'})
+        self.assertEqual([e['device'] for e in page],
+                         ['0.0.0001', '0.0.0003'])
+        page = get_page(self.entries, {'status': 'on'})
+        self.assertEqual(page.total, 5)
+        page = get_page(self.entries, {'chpids': '0[89]'})
+        self.assertEqual([e['device'] for e in page],
+                         ['0.0.0008', '0.0.0009'])
+        page = get_page(self.entries, {'status': 'line'})
+        self.assertEqual(page, [])
+        page = get_page(self.entries, {'status': '['})
+        self.assertEqual(page, [])
+        self.assertTrue(match_filters({'name': 'encf0'}, {'name': 'enc'}))
+
+    def test_fields(self):
+        """
+        get_page() should only return the requested fields
+        """
+        page = get_page(self.entries, limit=1, fields='device, status')
+        self.assertEqual(page, [{'device': '0.0.0000', 'status': 'offline'}])
+        page = get_page(self.entries, limit=1, fields=['device'])
+        self.assertEqual(page, [{'device': '0.0.0000'}])
+
+    def test_search(self):
+        """
+        get_page() should search the returned fields, ignoring the case,
+        before paging
+        """
+        page = get_page(self.entries, limit=1, search='OFF')
+        self.assertEqual([e['device'] for e in page], ['0.0.0000'])
+        self.assertEqual(page.total, 5)
+        page = get_page(self.entries, search='07')
+        self.assertEqual([e['device'] for e in page], ['0.0.0007'])
+        page = get_page(self.entries, fields='device', search='07')
+        self.assertEqual(page, [{'device': '0.0.0007'}])
+        page = get_page(self.entries, fields='device', search='offline')
+        self.assertEqual(page.total, 0)
+
+    def test_sort(self):
+        """
+        get_page() should sort the entries by the given keys before paging
+        """
+        page = get_page(self.entries, limit=2, sort='-device')
+        self.assertEqual([e['device'] for e in page],
+                         ['0.0.0009', '0.0.0008'])
+        self.assertEqual(page.total, 10)
+        page = get_page(self.entries, limit=3, sort='-status,device')
+        self.assertEqual([e['device'] for e in page],
+                         ['0.0.0001', '0.0.0003', '0.0.0005'])
+        page = get_page(self.entries, {'status': 'offline'}, 1, 1,
+                        sort=['unknown', '-device'])
+        self.assertEqual([e['device'] for e in page], ['0.0.0006'])
+
+    def test_invalid_offset_limit(self):
+        """
+        get_page() should raise InvalidParameter for a bad offset or limit
+        """
+        self.assertRaises(exception.InvalidParameter, get_page,
+                          self.entries, offset='-1')
+        self.assertRaises(exception.InvalidParameter, get_page,
+                          self.entries, limit='ten')
+
+
+class ConfFileUnitTests(unittest.TestCase):
+    """
+    Unit tests for ConfFile
+    """
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.conf_dir)
+        self.path = os.path.join(self.conf_dir, 'zfcp.conf')
+        with open(self.path, 'w') as conf:
+            conf.write('# LUNs\n'
+                       '0.0.1000 0x5005076801102991 0x0001000000000000\n')
+        os.chmod(self.path, 0o600)
+
+    def read_conf(self):
+        with open(self.path) as conf:
+            return conf.read()
+
+    def test_update(self):
+        """
+        update() adds missing entries and removes entries matching the
+        hexadecimal numbers in any form, keeping the file mode
+        """
+        conf_file = ConfFile(self.path)
+        conf_file.update(add_lines=[
+            '0.0.1000 0x5005076801102991 0x1000000000000',
+            '0.0.1001 0x0 0x0', '0.0.1001 0x0 0x0'])
+        self.assertTrue(conf_file.has_entry('0.0.1000 0x5005076801102991 '
+                                            '0x0001000000000000'))
+        conf_file.update(remove_lines=['0.0.1000 0x5005076801102991 '
+                                       '0x0001000000000000'])
+        self.assertEqual(self.read_conf(), '# LUNs\n0.0.1001 0x0 0x0\n')
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+        self.assertFalse(conf_file.has_device('0.0.1000'))
+        self.assertTrue(conf_file.has_device('0.0.1001'))
+
+    def test_update_revert(self):
+        """
+        update() returns the lines added and removed, to revert it
+        """
+        conf_file = ConfFile(self.path)
+        before = self.read_conf()
+        added, removed = conf_file.update(
+            add_device_lines=['0.0.1001 0x0 0x0'],
+            remove_devices=['0.0.1000'])
+        self.assertEqual(added, ['0.0.1001 0x0 0x0'])
+        self.assertEqual(len(removed), 1)
+        conf_file.update(add_lines=removed, remove_lines=added)
+        self.assertEqual(sorted(self.read_conf().splitlines()),
+                         sorted(before.splitlines()))
+
+    def test_external_change(self):
+        """
+        changes of the file by other processes are not lost
+        """
+        conf_file = ConfFile(self.path)
+        self.assertTrue(conf_file.has_device('0.0.1000'))
+        with open(self.path, 'a') as conf:
+            conf.write('0.0.1002 0x0 0x0\n')
+        conf_file.update(remove_devices=['0.0.1000'])
+        self.assertEqual(self.read_conf(), '# LUNs\n0.0.1002 0x0 0x0\n')
+
+    def test_add_device_lines(self):
+        """
+        add_device_lines are only added for devices without any entry
+        """
+        conf_file = ConfFile(self.path)
+        conf_file.update(add_device_lines=['0.0.1000 0x0 0x0',
+                                           '0.0.1001 0x0 0x0'])
+        self.assertEqual(self.read_conf(),
+                         '# LUNs\n'
+                         '0.0.1000 0x5005076801102991 0x0001000000000000\n'
+                         '0.0.1001 0x0 0x0\n')
+
+    def test_missing_file(self):
+        """
+        a missing file has no entries and is only created by an update()
+        which adds entries
+        """
+        path = os.path.join(self.conf_dir, 'dasd.conf')
+        conf_file = ConfFile(path)
+        self.assertFalse(conf_file.has_device('0.0.0150'))
+        conf_file.update(remove_devices=['0.0.0150'])
+        self.assertFalse(os.path.exists(path))
+        conf_file.update(add_lines=['0.0.0150'])
+        self.assertTrue(conf_file.has_device('0.0.0150'))
+
+    def test_concurrent_writers(self):
+        """
+        updates of different instances of the same file, as done by
+        different processes, are all applied
+        """
+        def add(index):
+            ConfFile(self.path).update(add_lines=['0.0.%04x 0x0 0x0'
+                                                  % index])
+        threads = [threading.Thread(target=add, args=(index,))
+                   for index in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.read_conf().splitlines()), 18)
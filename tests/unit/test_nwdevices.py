@@ -17,19 +17,28 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
+import augeas
 import mock
+import os
 import re
+import shutil
+import tempfile
 import unittest
 
 import wok.exception as exception
 from model.nwdevices import _bring_offline, _bring_online
+from model.nwdevices import _bulk_configure, _bulk_unconfigure
 from model.nwdevices import _configure_interface, _create_ifcfg_file
-from model.nwdevices import _format_znetconf, _get_configured_devices
+from model.nwdevices import _format_znetconf, _get_bulk_interfaces
+from model.nwdevices import _get_configured_devices
+from model.nwdevices import _get_sysfs_configured_devices
+from model.nwdevices import _get_sysfs_unconfigured_devices
 from model.nwdevices import _get_unconfigured_devices, _is_interface_online
 from model.nwdevices import NetworkDeviceModel, NetworkDevicesModel
 from model.nwdevices import _persist_interface
 from model.nwdevices import _unconfigure_interface, _unpersist_interface
 from model.nwdevices import _validate_device, _write_ifcfg_params
+from model.nwdevices import _write_ifcfg_params_list, IfcfgSession
 
 ifcfg_path = 'etc/sysconfig/network-scripts/ifcfg-enccw<deviceid>'
 
@@ -42,6 +51,7 @@ ZNETCONF_DEV_NAME = "Name"
 ZNETCONF_STATE = "State"
 UNIQUE_COL_NAME = "name"
 ENCCW = 'enccw'
+OPTIONS = 'OPTIONS'
 
 UNCONF_HDR_PATTERN = r'(' + re.escape(ZNETCONF_DEV_IDS) + r')\s+' \
                      r'(' + re.escape(ZNETCONF_TYPE) + r')\s+' \
@@ -652,6 +662,11 @@ class WriteIfcfgParamsUnitTests(unittest.TestCase):
     """
     unit tests for _write_ifcfg_params() method using  mock module
     """
+    def setUp(self):
+        patcher = mock.patch('model.nwdevices.ifcfg_session', IfcfgSession())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @mock.patch('model.nwdevices._form_cfg_options_attr', autospec=True)
     @mock.patch('model.nwdevices._get_configured_devices', autospec=True)
     @mock.patch('model.nwdevices.augeas', autospec=True)
@@ -774,6 +789,98 @@ class WriteIfcfgParamsUnitTests(unittest.TestCase):
         self.assertTrue(mock_wok_log.info.called, msg='Expected call to '
                         'mock_wok_log.info(). Not called')
 
+    @mock.patch('model.nwdevices._get_configured_devices', autospec=True)
+    @mock.patch('model.nwdevices.augeas', autospec=True)
+    @mock.patch('model.nwdevices.wok_log', autospec=True)
+    def test_write_list_single_session(self, mock_wok_log, mock_augeas,
+                                       mock_get_configured_devices):
+        """
+        unit test to validate _write_ifcfg_params_list() writes several
+        devices with a single save and reuses the augeas session
+        expected behaviour: augeas is opened once and saved once per call
+        """
+        devices = ['0.0.0101', '0.0.0201']
+        mock_get_configured_devices.return_value = dict(
+            (ENCCW + device, {'name': ENCCW + device,
+                              'device_ids': [device]})
+            for device in devices)
+        parser_mock = mock_augeas.Augeas.return_value
+        parser_mock.get.return_value = None
+
+        _write_ifcfg_params_list(dict.fromkeys(devices, 1))
+        _write_ifcfg_params(devices[0], 0)
+        self.assertEqual(mock_augeas.Augeas.call_count, 1)
+        self.assertEqual(parser_mock.load.call_count, 2)
+        self.assertEqual(parser_mock.save.call_count, 2)
+        options = [args for args, kwargs in parser_mock.set.call_args_list
+                   if args[0].endswith('/' + OPTIONS)]
+        self.assertEqual(options, [
+            (ifcfg_path.replace('<deviceid>', devices[0]) + '/' + OPTIONS,
+             '"layer2=1 portno=1"'),
+            (ifcfg_path.replace('<deviceid>', devices[1]) + '/' + OPTIONS,
+             '"layer2=1 portno=1"'),
+            (ifcfg_path.replace('<deviceid>', devices[0]) + '/' + OPTIONS,
+             '"layer2=1 portno=0"')])
+
+    @mock.patch('model.nwdevices._get_configured_devices', autospec=True)
+    @mock.patch('model.nwdevices.augeas', autospec=True)
+    @mock.patch('model.nwdevices.wok_log', autospec=True)
+    def test_write_drops_session_on_error(self, mock_wok_log, mock_augeas,
+                                          mock_get_configured_devices):
+        """
+        unit test to validate the augeas session is reopened after a
+        failed save
+        expected behaviour: the next write uses a new augeas session
+        """
+        device = '0.0.0101'
+        mock_get_configured_devices.return_value = \
+            {ENCCW + device: {'name': ENCCW + device, 'device_ids': []}}
+        parser_mock = mock_augeas.Augeas.return_value
+        parser_mock.save.side_effect = [Exception('dummy_error'), None]
+
+        self.assertRaises(exception.OperationFailed,
+                          _write_ifcfg_params, device, 0)
+        _write_ifcfg_params(device, 0)
+        self.assertEqual(mock_augeas.Augeas.call_count, 2)
+
+
+class IfcfgSessionTests(unittest.TestCase):
+    """
+    tests of the ifcfg augeas session against augeas on a temporary root
+    """
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.scripts_dir = os.path.join(self.root, 'etc', 'sysconfig',
+                                        'network-scripts')
+        os.makedirs(self.scripts_dir)
+        with open(os.path.join(self.root, 'etc', 'hosts'), 'w') as f:
+            f.write('127.0.0.1 localhost\n')
+        try:
+            parser = augeas.Augeas(self.root,
+                                   flags=augeas.Augeas.NO_LOAD |
+                                   augeas.Augeas.NO_MODL_AUTOLOAD)
+            available = bool(parser.match('/augeas/version'))
+            parser.close()
+        except Exception:
+            available = False
+        if not available:
+            self.skipTest('augeas is not available')
+
+    def test_only_ifcfg_parsed(self):
+        session = IfcfgSession(self.root)
+        session.write({'0.0.f500': ({'DEVICE': ENCCW + '0.0.f500'}, 1)})
+
+        parser = session._get_parser()
+        self.assertEqual(parser.match('/augeas/load/*'),
+                         ['/augeas/load/Shellvars'])
+        self.assertEqual(parser.match('/files/etc/hosts'), [])
+        with open(os.path.join(self.scripts_dir,
+                               'ifcfg-enccw0.0.f500')) as f:
+            self.assertEqual(f.read().splitlines(),
+                             ['DEVICE=enccw0.0.f500',
+                              'OPTIONS="layer2=1 portno=1"'])
+
 
 class IsInterfaceOnlineUnitTests(unittest.TestCase):
     """
@@ -1436,3 +1543,210 @@ class ValidateDeviceUnitTests(unittest.TestCase):
         _validate_device('0.0.1234')
         self.assertTrue(mock_wok_log.info.called, msg='Expected call to '
                         'mock_wok_log.info(). Not called')
+
+
+class SysfsQethDevicesUnitTests(unittest.TestCase):
+    """
+    unit tests for reading qeth devices from a fake sysfs tree
+    """
+    def setUp(self):
+        self.sysfs = tempfile.mkdtemp()
+        self.ccw_path = os.path.join(self.sysfs, 'ccw_qeth') + '/'
+        self.group_path = os.path.join(self.sysfs, 'ccwgroup_qeth') + '/'
+        os.mkdir(self.ccw_path)
+        os.mkdir(self.group_path)
+        # configured triplet on CHPID 05, un-configured triplets on
+        # CHPIDs 06 and 07, and an incomplete one on CHPID 08
+        for subch, devno, chpid in [(0, 0xf500, '05'), (1, 0xf501, '05'),
+                                    (2, 0xf502, '05'), (3, 0xf600, '06'),
+                                    (4, 0xf601, '06'), (5, 0xf602, '06'),
+                                    (6, 0xf701, '07'), (7, 0xf702, '07'),
+                                    (8, 0xf703, '07'), (9, 0xf704, '07'),
+                                    (10, 0xf800, '08'), (11, 0xf801, '08')]:
+            self._add_ccw_device(subch, '0.0.%04x' % devno, chpid)
+        group_dir = self._add_dir(self.group_path, '0.0.f500')
+        for index in range(3):
+            os.symlink(self.ccw_path + '0.0.f50%d' % index,
+                       os.path.join(group_dir, 'cdev%d' % index))
+            os.symlink(group_dir, os.path.join(self.ccw_path,
+                                               '0.0.f50%d' % index,
+                                               'group_device'))
+        for attr, value in [('if_name', 'enccw0.0.f500'), ('online', '1'),
+                            ('portno', '0'), ('card_type', 'OSD_1000'),
+                            ('chpid', '05')]:
+            self._write_attr(group_dir, attr, value)
+
+    def tearDown(self):
+        shutil.rmtree(self.sysfs)
+
+    def _add_dir(self, path, name):
+        path = os.path.join(path, name)
+        os.makedirs(path)
+        return path
+
+    def _write_attr(self, path, attr, value):
+        with open(os.path.join(path, attr), 'w') as attr_file:
+            attr_file.write(value + '\n')
+
+    def _add_ccw_device(self, subch, device_id, chpid):
+        subch_dir = self._add_dir(self.sysfs, 'css0/0.0.%04x' % subch)
+        self._write_attr(subch_dir, 'chpids', chpid + ' 00 00 00 00 00 00 00')
+        device_dir = self._add_dir(subch_dir, device_id)
+        self._write_attr(device_dir, 'cutype', '1731/01')
+        os.symlink(device_dir, self.ccw_path + device_id)
+
+    def test_configured_devices(self):
+        with mock.patch('model.nwdevices.SYSFS_TRIPLET_PATH',
+                        self.group_path):
+            devices = _get_sysfs_configured_devices()
+        self.assertEqual(devices, [{
+            'device_ids': ['0.0.f500', '0.0.f501', '0.0.f502'],
+            'name': 'enccw0.0.f500', 'state': 'online',
+            'card_type': 'OSD_1000', 'chpid': '05', 'driver': 'qeth',
+            'type': '1731/01', 'osa_portno': 0}])
+
+    def test_unconfigured_devices(self):
+        with mock.patch('model.nwdevices.SYSFS_QETH_CCW_PATH',
+                        self.ccw_path):
+            devices = _get_sysfs_unconfigured_devices()
+        self.assertEqual([device['device_ids'] for device in devices],
+                         [['0.0.f600', '0.0.f601', '0.0.f602'],
+                          ['0.0.f702', '0.0.f703', '0.0.f704']])
+        self.assertEqual(devices[0], {
+            'device_ids': ['0.0.f600', '0.0.f601', '0.0.f602'],
+            'name': '0.0.f600', 'state': 'Unconfigured',
+            'card_type': 'OSA (QDIO)', 'chpid': '06', 'driver': 'qeth',
+            'type': '1731/01', 'osa_portno': 'n/a'})
+
+    @mock.patch('model.nwdevices.run_command', autospec=True)
+    def test_get_configured_devices_by_name(self, mock_run_command):
+        with mock.patch('model.nwdevices.SYSFS_TRIPLET_PATH',
+                        self.group_path):
+            devices = _get_configured_devices(key=UNIQUE_COL_NAME)
+        self.assertEqual(devices.keys(), ['enccw0.0.f500'])
+        self.assertFalse(mock_run_command.called,
+                         msg='Unexpected call to mock_run_command()')
+
+    @mock.patch('model.nwdevices.utils', autospec=True)
+    @mock.patch('model.nwdevices.run_command', autospec=True)
+    def test_get_unconfigured_devices_no_sysfs(self, mock_run_command,
+                                               mock_utils):
+        """
+        znetconf -u is used when the qeth driver is not in sysfs
+        """
+        mock_run_command.return_value = ['', '', 0]
+        with mock.patch('model.nwdevices.SYSFS_QETH_CCW_PATH',
+                        self.sysfs + '/not_loaded/'):
+            _get_unconfigured_devices()
+        mock_run_command.assert_called_once_with(['znetconf', '-u'])
+
+
+class BulkNetworkDevicesUnitTests(unittest.TestCase):
+    """
+    unit tests for bulk configure/unconfigure of network devices
+    """
+    @mock.patch('model.nwdevices._get_unconfigured_devices', autospec=True)
+    @mock.patch('model.nwdevices._get_configured_devices', autospec=True)
+    def test_get_bulk_interfaces(self, mock_configured, mock_unconfigured):
+        mock_configured.return_value = {'enccw0.0.f500': {}}
+        mock_unconfigured.return_value = {'0.0.f503': {}}
+        self.assertEqual(_get_bulk_interfaces([u'0.0.f503', 'enccw0.0.f500',
+                                               '0.0.f503']),
+                         ['0.0.f503', '0.0.f500'])
+        self.assertRaises(exception.NotFoundError, _get_bulk_interfaces,
+                          ['0.0.f500', '0.0.f506'])
+        for devices in [[], '0.0.f500', ['0.0.f5']]:
+            self.assertRaises(exception.InvalidParameter,
+                              _get_bulk_interfaces, devices)
+
+    @mock.patch('model.nwdevices._report_bulk_result', autospec=True)
+    @mock.patch('model.nwdevices.device_state', autospec=True)
+    @mock.patch('model.nwdevices.os', autospec=True)
+    @mock.patch('model.nwdevices._write_ifcfg_params_list', autospec=True)
+    @mock.patch('model.nwdevices._create_ifcfg_file', autospec=True)
+    @mock.patch('model.nwdevices._get_osaport', autospec=True)
+    @mock.patch('model.nwdevices._bring_offline', autospec=True)
+    @mock.patch('model.nwdevices._bring_online', autospec=True)
+    @mock.patch('model.nwdevices._is_interface_online', autospec=True)
+    def test_bulk_configure(self, mock_is_online, mock_bring_online,
+                            mock_bring_offline, mock_get_osaport,
+                            mock_create_ifcfg_file, mock_write_ifcfg_params,
+                            mock_os, mock_device_state, mock_report):
+        """
+        all the devices are persisted with a single write and a device
+        failing to come online is reported without stopping the others
+        """
+        devices = ['0.0.f500', '0.0.f501', '0.0.f503', '0.0.f506']
+        online = ['0.0.f500', '0.0.f501']
+        mock_is_online.side_effect = lambda device: device in online
+
+        def bring_online(device, osa_portno):
+            if device == '0.0.f506':
+                raise exception.OperationFailed('GS390XIONW001E',
+                                                {'device': device,
+                                                 'error': 'dummy_error'})
+            return osa_portno
+        mock_bring_online.side_effect = bring_online
+        mock_get_osaport.side_effect = lambda device: {'0.0.f500': 0,
+                                                       '0.0.f501': 1}[device]
+        mock_os.path.isfile.return_value = True
+        cb = mock.Mock()
+        _bulk_configure(cb, (devices, 1))
+        self.assertEqual(sorted(mock_bring_online.call_args_list),
+                         [mock.call('0.0.f503', 1), mock.call('0.0.f506', 1)])
+        mock_create_ifcfg_file.assert_called_once_with('0.0.f503')
+        mock_write_ifcfg_params.assert_called_once_with(
+            {'0.0.f501': 1, '0.0.f503': 1})
+        self.assertFalse(mock_bring_offline.called,
+                         msg='Unexpected call to _bring_offline()')
+        # the requested port is not silently ignored for online devices
+        mock_report.assert_called_once_with(
+            cb, devices, {'0.0.f500': 'already online on OSA port 0',
+                          '0.0.f506': mock.ANY}, 'configured',
+            'GS390XIONW012E')
+
+    @mock.patch('model.nwdevices.device_state', autospec=True)
+    @mock.patch('model.nwdevices.os', autospec=True)
+    @mock.patch('model.nwdevices._write_ifcfg_params_list', autospec=True)
+    @mock.patch('model.nwdevices._create_ifcfg_file', autospec=True)
+    @mock.patch('model.nwdevices._bring_offline', autospec=True)
+    @mock.patch('model.nwdevices._bring_online', autospec=True)
+    @mock.patch('model.nwdevices._is_interface_online', autospec=True)
+    def test_bulk_configure_rollback(self, mock_is_online, mock_bring_online,
+                                     mock_bring_offline,
+                                     mock_create_ifcfg_file,
+                                     mock_write_ifcfg_params, mock_os,
+                                     mock_device_state):
+        """
+        devices brought online are brought back offline if persisting
+        them fails
+        """
+        devices = ['0.0.f500', '0.0.f503']
+        mock_is_online.return_value = False
+        mock_bring_online.side_effect = lambda device, osa_portno: 0
+        mock_write_ifcfg_params.side_effect = exception.OperationFailed(
+            'GS390XIONW002E', {'device': '', 'ifcfg_file_path': '',
+                               'error': 'dummy_error'})
+        cb = mock.Mock()
+        _bulk_configure(cb, (devices, None))
+        self.assertEqual(sorted(mock_bring_offline.call_args_list),
+                         [mock.call('0.0.f500'), mock.call('0.0.f503')])
+        self.assertFalse(cb.call_args[0][1])
+        mock_device_state.invalidate.assert_called_once_with(
+            'ccw', 'ccwgroup')
+
+    @mock.patch('model.nwdevices.device_state', autospec=True)
+    @mock.patch('model.nwdevices._unpersist_interface', autospec=True)
+    @mock.patch('model.nwdevices._bring_offline', autospec=True)
+    @mock.patch('model.nwdevices._is_interface_online', autospec=True)
+    def test_bulk_unconfigure(self, mock_is_online, mock_bring_offline,
+                              mock_unpersist_interface, mock_device_state):
+        devices = ['0.0.f500', '0.0.f503']
+        mock_is_online.side_effect = lambda device: device == '0.0.f500'
+        cb = mock.Mock()
+        _bulk_unconfigure(cb, devices)
+        mock_bring_offline.assert_called_once_with('0.0.f500')
+        self.assertEqual(mock_unpersist_interface.call_args_list,
+                         [mock.call('0.0.f500'), mock.call('0.0.f503')])
+        cb.assert_called_with('Successfully un-configured network devices '
+                              'enccw0.0.f500, enccw0.0.f503', True)
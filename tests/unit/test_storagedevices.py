@@ -19,14 +19,22 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
 import mock
+import os
+import shutil
+import tempfile
 import unittest
 
 import wok.exception as exception
 from model.storagedevices import _bring_offline, _bring_online
+from model.storagedevices import _bulk_online, _bulk_offline
+from model.storagedevices import _expand_devices, _format_device_ranges
+from model.storagedevices import _format_failed_devices
+from model.storagedevices import _bulk_persist, _get_bulk_devices
 from model.storagedevices import _byte_to_binary, _device_offline
 from model.storagedevices import _device_online, _format_lscss
 from model.storagedevices import _get_dasdeckd_devices, _get_deviceinfo
-from model.storagedevices import _get_paths, _get_zfcp_devices
+from model.storagedevices import _get_paths, _get_sysfs_deviceinfo
+from model.storagedevices import _get_sysfs_devicesinfo, _get_zfcp_devices
 from model.storagedevices import _hex_to_binary, _is_dasdeckd_device
 from model.storagedevices import _is_dasdeckd_persisted, _is_online
 from model.storagedevices import _is_zfcp_device, _list_devicesinfo
@@ -43,6 +51,30 @@ DASD_CONF = '/etc/dasd.conf'
 ZFCP_CONF = '/etc/zfcp.conf'
 
 
+class ConfFilesTestCase(unittest.TestCase):
+    """
+    Test case with DASD_CONF and ZFCP_CONF in a temporary directory
+    """
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.conf_dir)
+        self.dasd_conf = os.path.join(self.conf_dir, 'dasd.conf')
+        self.zfcp_conf = os.path.join(self.conf_dir, 'zfcp.conf')
+        for name, value in [('DASD_CONF', self.dasd_conf),
+                            ('ZFCP_CONF', self.zfcp_conf)]:
+            patcher = mock.patch('model.storagedevices.' + name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_conf(self, conf_file, content):
+        with open(conf_file, 'w') as conf:
+            conf.write(content)
+
+    def read_conf(self, conf_file):
+        with open(conf_file) as conf:
+            return conf.read()
+
+
 class ListDevicesInfoUnitTests(unittest.TestCase):
     """
     Unit tests for _list_devicesinfo() method
@@ -514,6 +546,61 @@ class GetListUnitTests(unittest.TestCase):
                           storagedevicesmodel.get_list)
         mock_log.error.assert_called_with("dummy_err")
 
+    @mock.patch('model.storagedevices.device_state')
+    @mock.patch('model.storagedevices.run_command', autospec=True)
+    @mock.patch('model.storagedevices._get_sysfs_devicesinfo', autospec=True)
+    @mock.patch('model.storagedevices.utils.get_directories', autospec=True)
+    def test_get_list_page(self, mock_get_dirs, mock_sysfs_devicesinfo,
+                           mock_run_command, mock_state):
+        """
+        unit test to validate get_list() of StorageDevicesModel()
+        only reads the devices of the requested page
+        """
+        mock_state.live = False
+        paths = ['/sys/bus/ccw/drivers/zfcp/0.0.%04x/' % i
+                 for i in range(10)]
+        mock_get_dirs.return_value = paths
+        mock_sysfs_devicesinfo.side_effect = \
+            lambda paths: [{'device': p.split('/')[-2], 'status': 'online'}
+                           for p in paths]
+        devices = StorageDevicesModel().get_list('zfcp', _offset='4',
+                                                 _limit='2',
+                                                 _fields='device')
+        mock_sysfs_devicesinfo.assert_called_once_with(paths[4:6])
+        self.assertFalse(mock_run_command.called)
+        self.assertEqual(devices, [{'device': '0.0.0004'},
+                                   {'device': '0.0.0005'}])
+        self.assertEqual(devices.total, 10)
+
+    @mock.patch('model.storagedevices.device_state')
+    @mock.patch('model.storagedevices.run_command', autospec=True)
+    @mock.patch('model.storagedevices._get_sysfs_devicesinfo', autospec=True)
+    @mock.patch('model.storagedevices.utils.get_directories', autospec=True)
+    def test_get_list_page_search_sort(self, mock_get_dirs,
+                                       mock_sysfs_devicesinfo,
+                                       mock_run_command, mock_state):
+        """
+        unit test to validate get_list() of StorageDevicesModel()
+        searches and sorts all the devices before paging them
+        """
+        mock_state.live = False
+        paths = ['/sys/bus/ccw/drivers/zfcp/0.0.%04x/' % i
+                 for i in range(10)]
+        mock_get_dirs.return_value = paths
+        mock_sysfs_devicesinfo.side_effect = \
+            lambda paths: [{'device': p.split('/')[-2], 'status': 'online'}
+                           for p in paths]
+        devices = StorageDevicesModel().get_list('zfcp', _offset='1',
+                                                 _limit='2',
+                                                 _fields='device',
+                                                 _search='0.0.000',
+                                                 _sort='-device')
+        mock_sysfs_devicesinfo.assert_called_once_with(paths)
+        self.assertFalse(mock_run_command.called)
+        self.assertEqual(devices, [{'device': '0.0.0008'},
+                                   {'device': '0.0.0007'}])
+        self.assertEqual(devices.total, 10)
+
 
 class GetStoragedeviceUnitTests(unittest.TestCase):
     """
@@ -1141,63 +1228,47 @@ class IsOnlineUnitTests(unittest.TestCase):
             self.assertEqual(status, False)
 
 
-class IsDasdEckdPersistedUnitTests(unittest.TestCase):
+class IsDasdEckdPersistedUnitTests(ConfFilesTestCase):
     """
     Unit tests for _is_dasdeckd_persisted()
     """
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_device_persistsed(self, mock_os):
+    def test_device_persistsed(self):
         """
         unit test to validate _is_dasdeckd_persisted() method
-        success scenario(ie, dasd-eckd device is persisted and
-        user has read access to /etc/dasd.conf)
-        mock_os: mock python os module imported in model.storagedevices
+        success scenario(ie, dasd-eckd device is persisted)
         on scuccess, _is_dasdeckd_persisted() should return True
         """
-        device = "dummy_device"
-        mock_os.access.return_value = True
-        open_mock = mock.mock_open(read_data='dummy_device')
-        with mock.patch('model.storagedevices.open', open_mock, create=True):
-            status = _is_dasdeckd_persisted(device)
-            mock_os.access.assert_called_once_with(DASD_CONF, mock_os.R_OK)
-            self.assertTrue(status)
-            open_mock.assert_called_once_with(DASD_CONF)
+        self.write_conf(self.dasd_conf, '0.0.0150\n0.0.0151 use_diag=1\n')
+        self.assertTrue(_is_dasdeckd_persisted('0.0.0151'))
+        self.assertTrue(_is_dasdeckd_persisted(u'0.0.0150'))
 
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_device_not_persistsed(self, mock_os):
+    def test_device_not_persistsed(self):
         """
         unit test to validate _is_dasdeckd_persisted() method for a
-        device which is not persisted
-        mock_os: mock python os module imported in model.storagedevices
+        device which is not persisted, even if another device id
+        contains its id
         _is_dasdeckd_persisted() should return False
         """
-        device = "dummy_device"
-        mock_os.access.return_value = True
-        open_mock = mock.mock_open(read_data='No Content')
-        with mock.patch('model.storagedevices.open', open_mock, create=True):
-            status = _is_dasdeckd_persisted(device)
-            mock_os.access.assert_called_once_with(DASD_CONF, mock_os.R_OK)
-            self.assertFalse(status)
-            open_mock.assert_called_once_with(DASD_CONF)
+        self.write_conf(self.dasd_conf, '# 0.0.0150\n0.0.01500\n')
+        self.assertFalse(_is_dasdeckd_persisted('0.0.0150'))
 
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_persisted_no_access(self, mock_os):
+    def test_persisted_conf_changed(self):
+        """
+        unit test to validate _is_dasdeckd_persisted() method sees the
+        changes of /etc/dasd.conf made by other processes
+        """
+        self.write_conf(self.dasd_conf, '0.0.0150\n')
+        self.assertFalse(_is_dasdeckd_persisted('0.0.0151'))
+        self.write_conf(self.dasd_conf, '0.0.0150\n0.0.0151\n')
+        self.assertTrue(_is_dasdeckd_persisted('0.0.0151'))
+
+    def test_persisted_no_file(self):
         """
         unit test to validate _is_dasdeckd_persisted() method
-        failure scenario(os.acces returns False ie.,
-        failed to access /etc/dasd.conf file)
-        mock_os: mock python os module imported in model.storagedevices
+        when /etc/dasd.conf doesn't exist
         _is_dasdeckd_persisted() should return False
         """
-        device = "dummy_device"
-        mock_os.access.return_value = False
-        open_mock = mock.mock_open(read_data='No Content')
-        with mock.patch('model.storagedevices.open', open_mock, create=True):
-            status = _is_dasdeckd_persisted(device)
-            mock_os.access.assert_called_once_with(DASD_CONF, mock_os.R_OK)
-            self.assertFalse(status)
-            self.assertFalse(open_mock.called,
-                             msg='Unexpected call to open_mock()')
+        self.assertFalse(_is_dasdeckd_persisted('0.0.0150'))
 
 
 class IsDasdEckdDeviceUnitTests(unittest.TestCase):
@@ -1272,138 +1343,74 @@ class IszFCPDeviceUnitTests(unittest.TestCase):
         self.assertEqual(actual_out, expected_out)
 
 
-class PersistDasdEckdDeviceUnitTests(unittest.TestCase):
+class PersistDasdEckdDeviceUnitTests(ConfFilesTestCase):
     """
     unit tests for _persist_dasdeckd_device() method
     """
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_persist_dasdeckd_success(self, mock_os):
+    def test_persist_dasdeckd_success(self):
         """
         unit test to validate persisting dasd-eckd device, success
-        scenario(os.system return code is 0)
-        mock_os: mock of python os module imported in storagedevices
+        scenario
         on success, _persist_dasdeckd_device() method doesn't return anything
+        and the device is added once to dasd.conf
         """
-        mock_os.system.return_value = 0
-        mock_os.access.return_value = True
-        device = "dummy_device"
-        command = 'flock -w 1 %s -c \"echo %s >> %s\"' \
-                  % (DASD_CONF, device, DASD_CONF)
-        _persist_dasdeckd_device(device)
-        mock_os.access.assert_called_once_with(DASD_CONF, mock_os.W_OK)
-        mock_os.system.assert_called_once_with(command)
+        self.write_conf(self.dasd_conf, '0.0.0150\n')
+        _persist_dasdeckd_device('0.0.0151')
+        _persist_dasdeckd_device('0.0.0151')
+        self.assertEqual(self.read_conf(self.dasd_conf),
+                         '0.0.0150\n0.0.0151\n')
 
     @mock.patch('model.storagedevices.wok_log', autospec=True)
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_persist_dasdeckd_failtowrite_tofile(self, mock_os, mock_log):
+    def test_persist_dasdeckd_failtowrite_tofile(self, mock_log):
         """
         unit test to validate persisting dasd-eckd device, failure
-        scenario(os.system return code is not zero)
-        mock_os: mock of python os module imported in storagedevices
+        scenario(dasd.conf can not be written)
         mock_log: mock of wok_log imported in model.storagedevices
         on failure, _persist_dasdeckd_device() raises OperationFailed exception
         """
-        mock_os.system.return_value = 1
-        mock_os.access.return_value = True
-        device = "dummy_device"
-        command = 'flock -w 1 %s -c \"echo %s >> %s\"' \
-                  % (DASD_CONF, device, DASD_CONF)
-        self.assertRaises(exception.OperationFailed,
-                          _persist_dasdeckd_device, device)
-        mock_os.access.assert_called_once_with(DASD_CONF, mock_os.W_OK)
-        mock_os.system.assert_called_once_with(command)
-        mock_log.error.assert_called_with("Failed to persist "
-                                          "dasd-eckd device: %s" % device)
+        device = "0.0.0150"
+        with mock.patch('model.storagedevices.DASD_CONF',
+                        os.path.join(self.conf_dir, 'missing', 'dasd.conf')):
+            self.assertRaises(exception.OperationFailed,
+                              _persist_dasdeckd_device, device)
+        self.assertIn("Failed to persist dasd-eckd device: %s" % device,
+                      mock_log.error.call_args[0][0])
 
-    @mock.patch('model.storagedevices.wok_log', autospec=True)
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_persist_dasdeckd_failtoaccess_file(self, mock_os, mock_log):
-        """
-        unit test to validate persisting dasd-eckd device, failure
-        scenario(os.accsess returns False, ie, failed to
-        access dasd.conf file in write mode)
-        mock_os: mock of python os module imported in storagedevices
-        mock_log: mock of wok_log imported in model.storagedevices
-        on failure, _persist_dasdeckd_device() raises OperationFailed exception
-        """
-        mock_os.access.return_value = False
-        device = "dummy_device"
-        self.assertRaises(exception.OperationFailed,
-                          _persist_dasdeckd_device, device)
-        mock_os.access.assert_called_once_with(DASD_CONF, mock_os.W_OK)
-        self.assertFalse(mock_os.system.called,
-                         msg='Unexpected call to mock_os.system()')
-        mock_log.error.assert_called_with("Failed to persist "
-                                          "dasd-eckd device: %s" % device)
 
-
-class UnPersistDasdEckdUnitTests(unittest.TestCase):
+class UnPersistDasdEckdUnitTests(ConfFilesTestCase):
     """
     unit tests for _unpersist_dasdeckd_device() method
     """
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_unpersist_dasdeckd_success(self, mock_os):
+    def test_unpersist_dasdeckd_success(self):
         """
         unit test to validate un persisting dasd-eckd
         device(removing dasd-eckd device id from dasd.conf file),
-        success scenario(os.system return code is 0)
-        mock_os: mock of python os module imported in storagedevices
+        success scenario
         on success, _unpersist_dasdeckd_device()
          method doesn't return anything
         """
-        mock_os.system.return_value = 0
-        mock_os.access.return_value = True
-        device = "dummy_device"
-        command = 'flock -w 1 %s -c \"sed -i \'/%s/Id\' %s\"' \
-                  % (DASD_CONF, device, DASD_CONF)
-        _unpersist_dasdeckd_device(device)
-        mock_os.access.assert_called_once_with(DASD_CONF, mock_os.W_OK)
-        mock_os.system.assert_called_once_with(command)
+        self.write_conf(self.dasd_conf, '0.0.0150\n0.0.0151 use_diag=1\n'
+                                        '0.0.01510\n')
+        _unpersist_dasdeckd_device('0.0.0151')
+        self.assertEqual(self.read_conf(self.dasd_conf),
+                         '0.0.0150\n0.0.01510\n')
 
     @mock.patch('model.storagedevices.wok_log', autospec=True)
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_unpersist_dasdeckd_failtowrite_tofile(self, mock_os, mock_log):
+    def test_unpersist_dasdeckd_failtowrite_tofile(self, mock_log):
         """
         unit test to validate un persisting dasd-eckd device, failure
-        scenario(os.system return code is not zero)
-        mock_os: mock of python os module imported in storagedevices
+        scenario(dasd.conf can not be read)
         mock_log: mock of wok_log imported in model.storagedevices
         on failure, _unpersist_dasdeckd_device()
         raises OperationFailed exception
         """
-        mock_os.system.return_value = 1
-        mock_os.access.return_value = True
-        device = "dummy_device"
-        command = 'flock -w 1 %s -c \"sed -i \'/%s/Id\' %s\"' \
-                  % (DASD_CONF, device, DASD_CONF)
-        self.assertRaises(exception.OperationFailed,
-                          _unpersist_dasdeckd_device, device)
-        mock_os.access.assert_called_once_with(DASD_CONF, mock_os.W_OK)
-        mock_os.system.assert_called_once_with(command)
-        mock_log.error.assert_called_with("Failed to unpersist"
-                                          " dasd-eckd device: %s" % device)
-
-    @mock.patch('model.storagedevices.wok_log', autospec=True)
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_unpersist_dasdeckd_failtoaccess_file(self, mock_os, mock_log):
-        """
-        unit test to validate un persisting dasd-eckd device, failure
-        scenario - os.accsess returns False, ie, failed to
-        access dasd.conf file in write mode
-        mock_os: mock of python os module imported in storagedevices
-        mock_log: mock of wok_log imported in model.storagedevices
-        on failure, _unpersist_dasdeckd_device()
-        raises OperationFailed exception
-        """
-        mock_os.access.return_value = False
-        device = "dummy_device"
-        self.assertRaises(exception.OperationFailed,
-                          _unpersist_dasdeckd_device, device)
-        mock_os.access.assert_called_once_with(DASD_CONF, mock_os.W_OK)
-        mock_log.error.assert_called_with("Failed to unpersist "
-                                          "dasd-eckd device: %s" % device)
-        self.assertFalse(mock_os.system.called,
-                         msg='Unexpected call to mock_os.system()')
+        device = "0.0.0150"
+        with mock.patch('model.storagedevices.DASD_CONF',
+                        self.conf_dir):
+            self.assertRaises(exception.OperationFailed,
+                              _unpersist_dasdeckd_device, device)
+        self.assertIn("Failed to unpersist dasd-eckd device: %s" % device,
+                      mock_log.error.call_args[0][0])
 
 
 class BringOnlineUnitTests(unittest.TestCase):
@@ -1484,137 +1491,384 @@ class BringOfflineUnitTests(unittest.TestCase):
                                           " Error: dummy error" % device)
 
 
-class PersistZFCPDeviceUnitTests(unittest.TestCase):
+class PersistZFCPDeviceUnitTests(ConfFilesTestCase):
     """
     unit tests for _persist_zfcp_device() method
     """
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_persist_zfcp_success(self, mock_os):
+    def test_persist_zfcp_success(self):
         """
-        unit test to validate persisting zfcp device, success
-        scenario(os.system return code is 0)
-        mock_os: mock of python os module imported in storagedevices
+        unit test to validate persisting zfcp device, success scenario
         on success, _persist_zfcp_device() method doesn't return anything
         """
-        mock_os.system.return_value = 0
-        mock_os.access.return_value = True
-        device = "dummy_device"
-        persist_data = device + ' 0x0000000000000000 0x0000000000000000'
-        command = 'flock -w 1 %s -c \"echo %s >> %s\"' \
-                  % (ZFCP_CONF, persist_data, ZFCP_CONF)
-        _persist_zfcp_device(device)
-        mock_os.access.assert_called_once_with(ZFCP_CONF, mock_os.W_OK)
-        mock_os.system.assert_called_once_with(command)
+        self.write_conf(self.zfcp_conf, '0.0.1000 0x0 0x0\n')
+        _persist_zfcp_device('0.0.1000')
+        _persist_zfcp_device('0.0.1001')
+        self.assertEqual(self.read_conf(self.zfcp_conf),
+                         '0.0.1000 0x0 0x0\n'
+                         '0.0.1001 0x0000000000000000 0x0000000000000000\n')
 
     @mock.patch('model.storagedevices.wok_log', autospec=True)
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_persist_zfcp_failtowrite_tofile(self, mock_os, mock_log):
+    def test_persist_zfcp_failtowrite_tofile(self, mock_log):
         """
         unit test to validate persisting zfcp device, failure
-        scenario(os.system return code is not zero)
-        mock_os: mock of python os module imported in storagedevices
+        scenario(zfcp.conf can not be written)
         mock_log: mock of wok_log imported in model.storagedevices
         on failure, _persist_zfcp_device() raises OperationFailed exception
         """
-        mock_os.system.return_value = 1
-        mock_os.access.return_value = True
-        device = "dummy_device"
-        persist_data = device + ' 0x0000000000000000 0x0000000000000000'
-        command = 'flock -w 1 %s -c \"echo %s >> %s\"' \
-                  % (ZFCP_CONF, persist_data, ZFCP_CONF)
-        self.assertRaises(exception.OperationFailed,
-                          _persist_zfcp_device, device)
-        mock_os.access.assert_called_once_with(ZFCP_CONF, mock_os.W_OK)
-        mock_os.system.assert_called_once_with(command)
-        mock_log.error.assert_called_with("Failed to persist "
-                                          "zfcp device: %s" % device)
+        device = "0.0.1000"
+        with mock.patch('model.storagedevices.ZFCP_CONF',
+                        os.path.join(self.conf_dir, 'missing', 'zfcp.conf')):
+            self.assertRaises(exception.OperationFailed,
+                              _persist_zfcp_device, device)
+        self.assertIn("Failed to persist zfcp device: %s" % device,
+                      mock_log.error.call_args[0][0])
 
-    @mock.patch('model.storagedevices.wok_log', autospec=True)
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_persist_zfcp_failtoaccess_file(self, mock_os, mock_log):
-        """
-        unit test to validate persisting zfcp device, failure
-        scenario(os.accsess returns False, ie, failed to
-        access zfcp.conf file in write mode)
-        mock_os: mock of python os module imported in storagedevices
-        mock_log: mock of wok_log imported in model.storagedevices
-        on failure, _persist_zfcp_device() raises OperationFailed exception
-        """
-        mock_os.access.return_value = False
-        device = "dummy_device"
-        self.assertRaises(exception.OperationFailed,
-                          _persist_zfcp_device, device)
-        mock_os.access.assert_called_once_with(ZFCP_CONF, mock_os.W_OK)
-        self.assertFalse(mock_os.system.called,
-                         msg='Unexpected call to mock_os.system()')
-        mock_log.error.assert_called_with("Failed to persist "
-                                          "zfcp device: %s" % device)
 
-
-class UnPersistZFCPUnitTests(unittest.TestCase):
+class UnPersistZFCPUnitTests(ConfFilesTestCase):
     """
     unit tests for _unpersist_zfcp_device() method
     """
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_unpersist_zfcp_success(self, mock_os):
+    def test_unpersist_zfcp_success(self):
         """
-        unit test to validate un persisting zfcp
-        device(removing zfcp device id from zfcp.conf file),
-        success scenario(os.system return code is 0)
-        mock_os: mock of python os module imported in storagedevices
-        on success, _unpersist_zfcp_device()
-        method doesn't return anything
+        unit test to validate un persisting zfcp device, removing all
+        the entries of the device from zfcp.conf, success scenario
+        on success, _unpersist_zfcp_device() method doesn't return anything
         """
-        mock_os.system.return_value = 0
-        mock_os.access.return_value = True
-        device = "dummy_device"
-        command = 'flock -w 1 %s -c \"sed -i \'/%s/Id\' %s\"' \
-                  % (ZFCP_CONF, device, ZFCP_CONF)
-        _unpersist_zfcp_device(device)
-        mock_os.access.assert_called_once_with(ZFCP_CONF, mock_os.W_OK)
-        mock_os.system.assert_called_once_with(command)
+        self.write_conf(self.zfcp_conf,
+                        '0.0.1000 0x0 0x0\n'
+                        '0.0.1001 0x5005076801102991 0x0001000000000000\n'
+                        '0.0.1000 0x5005076801102991 0x0001000000000000\n')
+        _unpersist_zfcp_device('0.0.1000')
+        self.assertEqual(self.read_conf(self.zfcp_conf),
+                         '0.0.1001 0x5005076801102991 0x0001000000000000\n')
 
     @mock.patch('model.storagedevices.wok_log', autospec=True)
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_unpersist_zfcp_failtowrite_tofile(self, mock_os, mock_log):
+    def test_unpersist_zfcp_failtowrite_tofile(self, mock_log):
         """
         unit test to validate un persisting zfcp device, failure
-        scenario(os.system return code is not zero)
-        mock_os: mock of python os module imported in storagedevices
+        scenario(zfcp.conf can not be read)
         mock_log: mock of wok_log imported in model.storagedevices
-        on failure, _unpersist_zfcp_device()
-        raises OperationFailed exception
+        on failure, _unpersist_zfcp_device() raises OperationFailed exception
         """
-        mock_os.system.return_value = 1
-        mock_os.access.return_value = True
-        device = "dummy_device"
-        command = 'flock -w 1 %s -c \"sed -i \'/%s/Id\' %s\"' \
-                  % (ZFCP_CONF, device, ZFCP_CONF)
-        self.assertRaises(exception.OperationFailed,
-                          _unpersist_zfcp_device, device)
-        mock_os.access.assert_called_once_with(ZFCP_CONF, mock_os.W_OK)
-        mock_os.system.assert_called_once_with(command)
-        mock_log.error.assert_called_with("Failed to unpersist"
-                                          " zfcp device: %s" % device)
+        device = "0.0.1000"
+        with mock.patch('model.storagedevices.ZFCP_CONF',
+                        self.conf_dir):
+            self.assertRaises(exception.OperationFailed,
+                              _unpersist_zfcp_device, device)
+        self.assertIn("Failed to unpersist zfcp device: %s" % device,
+                      mock_log.error.call_args[0][0])
 
-    @mock.patch('model.storagedevices.wok_log', autospec=True)
-    @mock.patch('model.storagedevices.os', autospec=True)
-    def test_unpersist_zfcp_failtoaccess_file(self, mock_os, mock_log):
-        """
-        unit test to validate un persisting zfcp device, failure
-        scenario - os.accsess returns False, ie, failed to
-        access zfcp.conf file in write mode
-        mock_os: mock of python os module imported in storagedevices
-        mock_log: mock of wok_log imported in model.storagedevices
-        on failure, _unpersist_zfcp_device()
-        raises OperationFailed exception
-        """
-        mock_os.access.return_value = False
-        device = "dummy_device"
-        self.assertRaises(exception.OperationFailed,
-                          _unpersist_zfcp_device, device)
-        mock_os.access.assert_called_once_with(ZFCP_CONF, mock_os.W_OK)
-        mock_log.error.assert_called_with("Failed to unpersist "
-                                          "zfcp device: %s" % device)
-        self.assertFalse(mock_os.system.called,
-                         msg='Unexpected call to mock_os.system()')
+
+class GetSysfsDeviceInfoUnitTests(unittest.TestCase):
+    """
+    unit tests for reading lscss columns from sysfs
+    """
+    def setUp(self):
+        self.sysfs = tempfile.mkdtemp()
+        self.subchannel_dir = os.path.join(self.sysfs, 'css0', '0.0.0002')
+        self.device_dir = os.path.join(self.subchannel_dir, '0.0.0202')
+        os.makedirs(self.device_dir)
+        for attr, value in [('pimpampom', 'e0 c0 ff'),
+                            ('chpids', 'b0 b1 0d 00 00 00 00 00')]:
+            self._write_attr(self.subchannel_dir, attr, value)
+        for attr, value in [('online', '1'), ('devtype', '3390/0c'),
+                            ('cutype', '3990/e9')]:
+            self._write_attr(self.device_dir, attr, value)
+        self.device_path = os.path.join(self.sysfs, '0.0.0202')
+        os.symlink(self.device_dir, self.device_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.sysfs)
+
+    def _write_attr(self, path, attr, value):
+        with open(os.path.join(path, attr), 'w') as attr_file:
+            attr_file.write(value + '\n')
+
+    def test_get_sysfs_deviceinfo(self):
+        """
+        sysfs attributes are formatted as lscss output
+        """
+        expected = {'device': '0.0.0202', 'sub_channel': '0.0.0002',
+                    'device_type': '3390/0c', 'cu_type': '3990/e9',
+                    'status': 'online',
+                    'enabled_chipids': ['b0', 'b1'],
+                    'installed_chipids': ['b0', 'b1', '0d']}
+        self.assertEqual(_get_sysfs_deviceinfo(self.device_path), expected)
+        lscss_row = {"Device": "0.0.0202", "Subchan": "0.0.0002",
+                     "DevType": "3390/0c", "CU Type": "3990/e9",
+                     "Use": "yes", "PIM": "e0", "PAM": "c0",
+                     "POM": "ff", "CHPIDs": "b0b10d00 00000000"}
+        self.assertEqual(_format_lscss(lscss_row), expected)
+
+    def test_get_sysfs_deviceinfo_offline(self):
+        self._write_attr(self.device_dir, 'online', '0')
+        device_info = _get_sysfs_deviceinfo(self.device_path + '/')
+        self.assertEqual(device_info['status'], 'offline')
+
+    def test_get_sysfs_devicesinfo_missing_attr(self):
+        """
+        devices are read from lscss when sysfs lacks an attribute
+        """
+        os.remove(os.path.join(self.subchannel_dir, 'pimpampom'))
+        self.assertIsNone(_get_sysfs_deviceinfo(self.device_path))
+        self.assertIsNone(_get_sysfs_devicesinfo([self.device_path]))
+
+    @mock.patch('model.storagedevices.run_command', autospec=True)
+    @mock.patch('model.storagedevices.utils', autospec=True)
+    def test_get_list_sysfs(self, mock_utils, mock_run_command):
+        mock_utils.get_directories.return_value = [self.device_path + '/']
+        devices = StorageDevicesModel().get_list(_type='dasd-eckd')
+        self.assertEqual([d['device'] for d in devices], ['0.0.0202'])
+        self.assertFalse(mock_run_command.called,
+                         msg='Unexpected call to mock_run_command()')
+
+    @mock.patch('model.storagedevices._get_sysfs_deviceinfo')
+    @mock.patch('model.storagedevices.run_command', autospec=True)
+    @mock.patch('model.storagedevices.utils', autospec=True)
+    def test_get_list_sysfs_filters(self, mock_utils, mock_run_command,
+                                    mock_deviceinfo):
+        """
+        only the devices matching the filters are formatted
+        """
+        offline_dir = os.path.join(self.subchannel_dir, '0.0.0203')
+        os.makedirs(offline_dir)
+        for attr, value in [('online', '0'), ('devtype', '3390/0c'),
+                            ('cutype', '3990/e9')]:
+            self._write_attr(offline_dir, attr, value)
+        mock_utils.get_directories.return_value = [self.device_path + '/',
+                                                   offline_dir + '/']
+        mock_deviceinfo.side_effect = lambda path: {'device': path}
+        model = StorageDevicesModel()
+
+        devices = model.get_list(_type='dasd-eckd',
+                                 _filters={'status': 'offline',
+                                           'installed_chipids': '0d'})
+        mock_deviceinfo.assert_called_once_with(offline_dir + '/')
+        self.assertEqual(devices.total, 1)
+
+        devices = model.get_list(_type='dasd-eckd',
+                                 _filters={'cu_type': '3990/e9',
+                                           'enabled_chipids': '0d'})
+        self.assertEqual(devices, [])
+        self.assertFalse(mock_run_command.called,
+                         msg='Unexpected call to mock_run_command()')
+
+
+class BulkDevicesUnitTests(unittest.TestCase):
+    """
+    unit tests for bulk online/offline of storage devices
+    """
+    def test_expand_devices(self):
+        devices, input_ids = _expand_devices(['0150', '0.0.0152 - 0.0.0154',
+                                              u'0.0.0150', '0.1.0001'])
+        self.assertEqual(devices, ['0.0.0150', '0.0.0152', '0.0.0153',
+                                   '0.0.0154', '0.1.0001'])
+        self.assertEqual(input_ids, {'0.0.0150': '0150',
+                                     '0.0.0152': '0.0.0152 - 0.0.0154',
+                                     '0.0.0153': '0.0.0152 - 0.0.0154',
+                                     '0.0.0154': '0.0.0152 - 0.0.0154',
+                                     '0.1.0001': '0.1.0001'})
+
+    def test_expand_devices_invalid(self):
+        for devices in [[], '0.0.0150', ['0.0.0154-0.0.0150'],
+                        ['0.0.0150-0.1.0160'], ['0.0.01z0']]:
+            self.assertRaises(exception.InvalidParameter, _expand_devices,
+                              devices)
+
+    def test_format_device_ranges(self):
+        self.assertEqual(_format_device_ranges(['0.0.0160', '0.0.0151',
+                                                '0.0.0150', '0.0.0152',
+                                                '0.1.0153']),
+                         '0.0.0150-0.0.0152,0.0.0160,0.1.0153')
+
+    def test_format_failed_devices(self):
+        """
+        failed devices are reported with the device ids given by the caller
+        """
+        devices = ['0.0.0150', '0.0.0151', '0.0.0152', '0.0.1000']
+        input_ids = {'0.0.0150': '150', '0.0.0151': '0.0.0151-0.0.0152',
+                     '0.0.0152': '0.0.0151-0.0.0152', '0.0.1000': '1000'}
+        failed = {'0.0.1000': 'busy', '0.0.0152': 'busy', '0.0.0150': 'rc'}
+        self.assertEqual(
+            _format_failed_devices(failed, devices, input_ids),
+            ('150, 0.0.0151-0.0.0152, 1000',
+             '150: rc, 0.0.0151-0.0.0152 (0.0.0152): busy, 1000: busy'))
+
+    @mock.patch('model.storagedevices._get_zfcp_devices', autospec=True)
+    @mock.patch('model.storagedevices._get_dasdeckd_devices', autospec=True)
+    def test_get_bulk_devices(self, mock_dasdeckd, mock_zfcp):
+        mock_dasdeckd.return_value = ['0.0.0150', '0.0.0151', '0.0.0200']
+        mock_zfcp.return_value = ['0.0.1000']
+        devices = _get_bulk_devices(['0.0.0150-0.0.0151', '1000'])
+        self.assertEqual(devices, (['0.0.0150', '0.0.0151', '0.0.1000'],
+                                   set(['0.0.0150', '0.0.0151']),
+                                   set(['0.0.1000']),
+                                   {'0.0.0150': '0.0.0150-0.0.0151',
+                                    '0.0.0151': '0.0.0150-0.0.0151',
+                                    '0.0.1000': '1000'}))
+        # the missing numbers of a sparse range are skipped
+        devices = _get_bulk_devices(['0.0.014f-0.0.0152', '0.0.0151'])
+        self.assertEqual(devices[:3], (['0.0.0150', '0.0.0151'],
+                                       set(['0.0.0150', '0.0.0151']),
+                                       set()))
+        self.assertEqual(devices[3]['0.0.0151'], '0.0.0151')
+        # devices given explicitly and ranges without devices must exist
+        for devices in [['0.0.0150-0.0.0151', '0.0.0152'],
+                        ['0.0.0150', '0.0.0300-0.0.03ff']]:
+            self.assertRaises(exception.NotFoundError, _get_bulk_devices,
+                              devices)
+        mock_dasdeckd.assert_called_with()
+        self.assertEqual(mock_dasdeckd.call_count, 4)
+
+    def test_bulk_persist(self):
+        conf_dir = tempfile.mkdtemp()
+        dasd_conf = os.path.join(conf_dir, 'dasd.conf')
+        zfcp_conf = os.path.join(conf_dir, 'zfcp.conf')
+        try:
+            with open(zfcp_conf, 'w') as conf:
+                conf.write('0.0.1000 0x0000000000000000 0x0000000000000000\n'
+                           '\n'
+                           '0.0.1001 0x5005076801102991 0x0001000000000000\n'
+                           '0.0.1001 0x5005076801102991 0x0002000000000000\n')
+            with mock.patch.multiple('model.storagedevices',
+                                     DASD_CONF=dasd_conf,
+                                     ZFCP_CONF=zfcp_conf):
+                _bulk_persist(set(['0.0.0151', '0.0.0150']),
+                              set(['0.0.1000', '0.0.1002']), True)
+                _bulk_persist(set(), set(['0.0.1001']), False)
+            with open(zfcp_conf) as conf:
+                self.assertEqual(conf.read(),
+                                 '0.0.1000 0x0000000000000000 '
+                                 '0x0000000000000000\n'
+                                 '\n'
+                                 '0.0.1002 0x0000000000000000 '
+                                 '0x0000000000000000\n')
+            with open(dasd_conf) as conf:
+                self.assertEqual(conf.read(), '0.0.0150\n0.0.0151\n')
+        finally:
+            shutil.rmtree(conf_dir)
+
+    def test_bulk_persist_already_persisted(self):
+        """
+        devices already persisted with options or LUNs get no other entry
+        """
+        conf_dir = tempfile.mkdtemp()
+        dasd_conf = os.path.join(conf_dir, 'dasd.conf')
+        zfcp_conf = os.path.join(conf_dir, 'zfcp.conf')
+        dasd_content = '0.0.0150 use_diag=1\n'
+        zfcp_content = '0.0.1000 0x5005076801102991 0x0001000000000000\n'
+        try:
+            with open(dasd_conf, 'w') as conf:
+                conf.write(dasd_content)
+            with open(zfcp_conf, 'w') as conf:
+                conf.write(zfcp_content)
+            with mock.patch.multiple('model.storagedevices',
+                                     DASD_CONF=dasd_conf,
+                                     ZFCP_CONF=zfcp_conf):
+                _bulk_persist(set(['0.0.0150']), set(['0.0.1000']), True)
+            with open(dasd_conf) as conf:
+                self.assertEqual(conf.read(), dasd_content)
+            with open(zfcp_conf) as conf:
+                self.assertEqual(conf.read(), zfcp_content)
+        finally:
+            shutil.rmtree(conf_dir)
+
+    @mock.patch('model.storagedevices.utils.get_conf_file', autospec=True)
+    @mock.patch('model.storagedevices._is_online', autospec=True)
+    @mock.patch('model.storagedevices.run_command', autospec=True)
+    def test_bulk_online(self, mock_run_command, mock_is_online,
+                         mock_get_conf_file):
+        online = set(['0.0.0151'])
+        devices = ['0.0.0150', '0.0.0151', '0.0.0152', '0.0.1000']
+
+        def run_command(command):
+            online.update(devices)
+            return '', '', 0
+        mock_run_command.side_effect = run_command
+        mock_is_online.side_effect = lambda device: device in online
+        mock_get_conf_file.return_value.update.return_value = ([], [])
+        cb = mock.Mock()
+        _bulk_online(cb, (devices, set(devices[:3]), set(devices[3:]),
+                          dict((device, device) for device in devices)))
+        mock_run_command.assert_called_once_with(
+            ['chccwdev', '-e', '0.0.0150,0.0.0152,0.0.1000'])
+        self.assertEqual(mock_get_conf_file.call_args_list,
+                         [mock.call(DASD_CONF), mock.call(ZFCP_CONF)])
+        self.assertEqual(
+            mock_get_conf_file.return_value.update.call_args_list,
+            [mock.call(
+                add_device_lines=['0.0.0150', '0.0.0151', '0.0.0152']),
+             mock.call(add_device_lines=['0.0.1000 0x0000000000000000 '
+                                         '0x0000000000000000'])])
+        cb.assert_any_call('Bringing devices online: 1 of 3 done')
+        cb.assert_any_call('Bringing devices online: 3 of 3 done')
+        cb.assert_called_with('Successfully brought devices '
+                              '0.0.0150-0.0.0152,0.0.1000 online', True)
+
+    @mock.patch('model.storagedevices._is_online', autospec=True)
+    @mock.patch('model.storagedevices.run_command', autospec=True)
+    def test_bulk_online_persist_rollback(self, mock_run_command,
+                                          mock_is_online):
+        """
+        dasd.conf is restored if zfcp.conf fails to be updated
+        """
+        conf_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, conf_dir)
+        dasd_conf = os.path.join(conf_dir, 'dasd.conf')
+        with open(dasd_conf, 'w') as conf:
+            conf.write('0.0.0151 use_diag=1\n')
+        online = set()
+
+        def run_command(command):
+            if command[1] == '-e':
+                online.update(devices)
+            else:
+                online.difference_update(devices)
+            return '', '', 0
+        mock_run_command.side_effect = run_command
+        mock_is_online.side_effect = lambda device: device in online
+        cb = mock.Mock()
+        devices = ['0.0.0150', '0.0.1000']
+        # zfcp.conf can't be written over a directory
+        with mock.patch.multiple('model.storagedevices',
+                                 DASD_CONF=dasd_conf, ZFCP_CONF=conf_dir):
+            _bulk_online(cb, (devices, set(devices[:1]), set(devices[1:]),
+                              dict((device, device) for device in devices)))
+        with open(dasd_conf) as conf:
+            self.assertEqual(conf.read(), '0.0.0151 use_diag=1\n')
+        self.assertEqual(online, set())
+        self.assertFalse(cb.call_args[0][1])
+
+    @mock.patch('model.storagedevices.utils.get_conf_file', autospec=True)
+    @mock.patch('model.storagedevices._is_online', autospec=True)
+    @mock.patch('model.storagedevices.run_command', autospec=True)
+    def test_bulk_offline_rollback(self, mock_run_command, mock_is_online,
+                                   mock_get_conf_file):
+        """
+        devices brought offline are brought back online if any fails
+        """
+        online = set(['0.0.0150', '0.0.0151'])
+
+        def run_command(command):
+            if command[1] == '-d':
+                online.discard('0.0.0150')
+                return '', 'Device 0.0.0151 is busy', 1
+            online.add('0.0.0150')
+            return '', '', 0
+        mock_run_command.side_effect = run_command
+        mock_is_online.side_effect = lambda device: device in online
+        cb = mock.Mock()
+        devices = ['0.0.0150', '0.0.0151']
+        input_ids = {'0.0.0150': '150-151', '0.0.0151': '150-151'}
+        with mock.patch('model.storagedevices._format_failed_devices',
+                        wraps=_format_failed_devices) as mock_format:
+            _bulk_offline(cb, (devices, set(devices), set(), input_ids))
+        mock_format.assert_called_once_with({'0.0.0151': mock.ANY},
+                                            devices, input_ids)
+        mock_run_command.assert_has_calls([
+            mock.call(['chccwdev', '-d', '0.0.0150-0.0.0151']),
+            mock.call(['chccwdev', '-e', '0.0.0150'])])
+        self.assertEqual(online, set(devices))
+        self.assertFalse(mock_get_conf_file.called,
+                         msg='Unexpected call to get_conf_file()')
+        self.assertFalse(cb.call_args[0][1])
@@ -17,23 +17,99 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
+import mock
+import os
+import shutil
+import tempfile
 import unittest
 
 from model import utils
+from model.tape_devs import TapeDevModel
+from wok.exception import NotFoundError
 
 
 class TapeDevTests(unittest.TestCase):
     """
     unit tests for Tape devices
     """
-    def test_lstape_parser(self):
-        output = """Generic Device        Target       Vendor   Model            Type     State
-sg3     st0           1:0:2:0      IBM      ULT3580-HH6      tapedrv  running
-sg3     st0           1:0:2:0      IBM      ULT3580-HH6      tapedrv  running
-sg3     st0           1:0:2:0      IBM      ULT3580-HH6      tapedrv  running
-"""
-
-        final_list = utils.parse_tape_list(output)
-        self.assertEqual(len(final_list), 3)
-        self.assertEqual(final_list[0]['Generic'], 'sg3')
-        self.assertEqual(final_list[0]['Target'], '1:0:2:0')
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.sg_dir = os.path.join(self.tmp_dir, 'scsi_generic') + '/'
+        os.mkdir(self.sg_dir)
+
+    def _add_sg_dev(self, sg_dev, scsi_dev, nodes=(), **attrs):
+        scsi_dev_dir = os.path.join(self.tmp_dir, scsi_dev)
+        os.mkdir(scsi_dev_dir)
+        for node in nodes:
+            os.makedirs(os.path.join(scsi_dev_dir, node))
+        for attr, value in attrs.iteritems():
+            with open(os.path.join(scsi_dev_dir, attr), 'w') as f:
+                f.write(value if attr == 'vpd_pg80' else value + '\n')
+        os.mkdir(self.sg_dir + sg_dev)
+        os.symlink(scsi_dev_dir, self.sg_dir + sg_dev + '/device')
+
+    def test_tape_list(self):
+        self._add_sg_dev('sg10', '1:0:2:0',
+                         ['scsi_tape/st1', 'scsi_tape/nst1',
+                          'scsi_tape/st1a'],
+                         type='1', vendor='IBM', model='ULT3580-HH6',
+                         state='running', hba_id='0.0.1900',
+                         wwpn='0x5005076302001234',
+                         fcp_lun='0x0000000000000000')
+        self._add_sg_dev('sg2', '1:0:2:1', ['scsi_changer/sch0'], type='8',
+                         vendor='IBM', model='3573-TL    Library',
+                         state='offline')
+        # disk
+        self._add_sg_dev('sg0', '0:0:0:1', type='0', vendor='IBM',
+                         model='2107900')
+
+        with mock.patch('model.utils.sg_dir', self.sg_dir):
+            tape_list = utils.get_final_tape_list()
+        self.assertEqual([tape['Generic'] for tape in tape_list],
+                         ['sg2', 'sg10'])
+        self.assertEqual(tape_list[0]['Device'], 'sch0')
+        self.assertEqual(tape_list[0]['Type'], 'changer')
+        self.assertEqual(tape_list[0]['Model'], '3573-TL    Library')
+        self.assertIsNone(tape_list[0]['hbaId'])
+        self.assertEqual(tape_list[1], {
+            'Generic': 'sg10', 'Device': 'st1', 'Target': '1:0:2:0',
+            'Vendor': 'IBM', 'Model': 'ULT3580-HH6', 'Type': 'tapedrv',
+            'State': 'running', 'hbaId': '0.0.1900',
+            'remoteWwpn': '0x5005076302001234',
+            'lunId': '0x0000000000000000'})
+
+    def _add_tape_drive(self, sg_dev, scsi_dev, st_dev, hba_id, serial):
+        self._add_sg_dev(sg_dev, scsi_dev, ['scsi_tape/' + st_dev],
+                         type='1', vendor='IBM', model='ULT3580-HH6',
+                         state='running', hba_id=hba_id,
+                         wwpn='0x5005076302001234',
+                         fcp_lun='0x0000000000000000',
+                         vpd_pg80='\x01\x80\x00\x0a' + serial)
+        st_dir = os.path.join(self.tmp_dir, scsi_dev, 'scsi_tape', st_dev)
+        for attr, value in [('default_blksize', '262144'),
+                            ('default_density', '-1')]:
+            with open(os.path.join(st_dir, attr), 'w') as f:
+                f.write(value + '\n')
+
+    def test_tape_inventory(self):
+        self._add_tape_drive('sg3', '1:0:2:0', 'st0', '0.0.1900',
+                             '1013000123')
+        self._add_tape_drive('sg4', '2:0:2:0', 'st1', '0.0.1901',
+                             '1013000123')
+        self._add_tape_drive('sg5', '1:0:3:0', 'st2', '0.0.1900',
+                             '1013000456')
+
+        with mock.patch('model.utils.sg_dir', self.sg_dir):
+            inventory = utils.get_tape_inventory()
+            self.assertRaises(NotFoundError, TapeDevModel().lookup, 'sg0')
+            self.assertEqual(TapeDevModel().lookup('sg4'), inventory['sg4'])
+        self.assertEqual(sorted(inventory), ['sg3', 'sg4', 'sg5'])
+        tape = inventory['sg3']
+        self.assertEqual(tape['path'], '/dev/st0')
+        self.assertEqual(tape['blocksize'], 262144)
+        self.assertIsNone(tape['density'])
+        self.assertEqual(tape['serial'], '1013000123')
+        self.assertEqual(tape['siblings'], ['sg4'])
+        self.assertEqual(inventory['sg4']['siblings'], ['sg3'])
+        self.assertEqual(inventory['sg5']['siblings'], [])
@@ -0,0 +1,66 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM Corp, 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import hashlib
+import json
+import mock
+import unittest
+
+from control.tape_devs import TapeDev
+from wok.exception import UnauthorizedError
+
+
+class TapeDevControlTests(unittest.TestCase):
+    """
+    unit tests for the ETag of the tape device resource
+    """
+    tape = {'Generic': 'sg10', 'Device': 'st1', 'Type': 'tapedrv',
+            'State': 'running'}
+
+    def setUp(self):
+        self.model = mock.MagicMock()
+        self.model.tapedev_lookup.return_value = dict(self.tape)
+        for name in ['cherrypy', 'cptools', 'template']:
+            patcher = mock.patch('control.tape_devs.' + name)
+            setattr(self, 'mock_' + name, patcher.start())
+            self.addCleanup(patcher.stop)
+        self.mock_cherrypy.response.headers = {}
+
+    def test_get_etag(self):
+        res = TapeDev(self.model, 'sg10')
+        with mock.patch.object(res, 'is_authorized', return_value=True):
+            res.get()
+
+        self.model.tapedev_lookup.assert_called_once_with('sg10')
+        etag = hashlib.md5(json.dumps(self.tape, sort_keys=True)).hexdigest()
+        self.assertEqual(self.mock_cherrypy.response.headers['ETag'],
+                         '"%s"' % etag)
+        self.mock_cptools.validate_etags.assert_called_once_with()
+        self.mock_template.render.assert_called_once_with(mock.ANY,
+                                                          self.tape)
+
+    def test_get_unauthorized(self):
+        # unauthorized callers get neither the ETag nor 304 Not Modified
+        res = TapeDev(self.model, 'sg10')
+        with mock.patch.object(res, 'is_authorized', return_value=False):
+            self.assertRaises(UnauthorizedError, res.get)
+
+        self.assertNotIn('ETag', self.mock_cherrypy.response.headers)
+        self.assertFalse(self.mock_cptools.validate_etags.called)
+        self.assertFalse(self.mock_template.render.called)
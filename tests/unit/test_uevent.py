@@ -0,0 +1,153 @@
+#
+# Project Ginger S390x
+#
+# Copyright IBM Corp, 2016
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import mock
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from model.uevent import DeviceStateStore, FakeEventSource, parse_uevent
+from model.uevent import STORAGE_SUBSYSTEMS
+
+
+class ParseUeventUnitTests(unittest.TestCase):
+    """
+    unit tests for parse_uevent()
+    """
+    def test_parse_kernel_uevent(self):
+        data = 'change@/devices/css0/0.0.0001/0.0.0150\0ACTION=change\0' \
+               'DEVPATH=/devices/css0/0.0.0001/0.0.0150\0SUBSYSTEM=ccw\0' \
+               'SEQNUM=1823\0'
+        self.assertEqual(parse_uevent(data),
+                         {'ACTION': 'change',
+                          'DEVPATH': '/devices/css0/0.0.0001/0.0.0150',
+                          'SUBSYSTEM': 'ccw',
+                          'SEQNUM': '1823'})
+
+    def test_parse_udev_message(self):
+        self.assertIsNone(parse_uevent('libudev\0\xfe\xed\xca\xfe'))
+
+
+class DeviceStateStoreUnitTests(unittest.TestCase):
+    """
+    unit tests for DeviceStateStore driven by FakeEventSource
+    """
+    def setUp(self):
+        self.store = DeviceStateStore()
+        self.source = FakeEventSource()
+        self.assertTrue(self.store.start(self.source))
+        self.loader = mock.Mock(side_effect=lambda: [{'device': '0.0.0150'}])
+
+    def tearDown(self):
+        self.store.stop()
+
+    def test_not_live(self):
+        self.store.stop()
+        self.store.get('storagedevices', ['ccw'], self.loader)
+        self.store.get('storagedevices', ['ccw'], self.loader)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_cached_until_event(self):
+        first = self.store.get('storagedevices', ['ccw'], self.loader)
+        first[0]['device'] = 'modified'
+        second = self.store.get('storagedevices', ['ccw'], self.loader)
+        self.assertEqual(second, [{'device': '0.0.0150'}])
+        self.assertEqual(self.loader.call_count, 1)
+
+        self.source.emit('change', 'ccw', '/devices/css0/0.0.0001/0.0.0150')
+        self.source.wait()
+        self.store.get('storagedevices', ['ccw'], self.loader)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_chpid_event(self):
+        """
+        varying a channel path invalidates the CHPIDs of storage devices
+        """
+        self.store.get('storagedevices', STORAGE_SUBSYSTEMS, self.loader)
+        self.source.emit('change', 'chp', '/devices/css0/chp0.0d')
+        self.source.wait()
+        self.store.get('storagedevices', STORAGE_SUBSYSTEMS, self.loader)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_other_subsystem_event(self):
+        self.store.get('storagedevices', ['ccw'], self.loader)
+        self.source.emit('add', 'scsi_generic', '/devices/css0/sg0')
+        self.source.emit('add', 'block', '/devices/virtual/block/loop0')
+        self.source.wait()
+        self.store.get('storagedevices', ['ccw'], self.loader)
+        self.assertEqual(self.loader.call_count, 1)
+
+    def test_lost_events(self):
+        self.store.get('nwdevices', ['ccwgroup'], self.loader)
+        self.source.drop()
+        self.source.wait()
+        self.store.get('nwdevices', ['ccwgroup'], self.loader)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_loader_error_not_cached(self):
+        self.loader.side_effect = [Exception('lscss failed'), []]
+        self.assertRaises(Exception, self.store.get, 'storagedevices',
+                          ['ccw'], self.loader)
+        self.assertEqual(self.store.get('storagedevices', ['ccw'],
+                                        self.loader), [])
+
+    def test_get_item(self):
+        loader = mock.Mock(return_value={'sg3': {'State': 'running'}})
+        item = self.store.get_item('tapedevs', ['scsi'], loader, 'sg3')
+        item['State'] = 'offline'
+        self.assertEqual(self.store.get_item('tapedevs', ['scsi'], loader,
+                                             'sg3'), {'State': 'running'})
+        self.assertRaises(KeyError, self.store.get_item, 'tapedevs',
+                          ['scsi'], loader, 'sg4')
+        self.assertEqual(loader.call_count, 1)
+
+
+class WaitForPathsUnitTests(unittest.TestCase):
+    """
+    unit tests for DeviceStateStore.wait_for_paths()
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.lun_dir = os.path.join(self.tmp_dir, '0x0001000000000000')
+        self.store = DeviceStateStore()
+        self.source = FakeEventSource()
+        self.assertTrue(self.store.start(self.source))
+        self.addCleanup(self.store.stop)
+
+    def test_path_exists(self):
+        os.mkdir(self.lun_dir)
+        self.assertTrue(self.store.wait_for_paths([self.lun_dir], 0))
+
+    def test_woken_up_by_uevent(self):
+        def add_lun():
+            os.mkdir(self.lun_dir)
+            self.source.emit('add', 'scsi', '/devices/css0/0.0.0010/0.0.1000')
+
+        with mock.patch('model.uevent.PATH_WAIT_MIN_INTERVAL', 30), \
+                mock.patch('model.uevent.PATH_WAIT_MAX_INTERVAL', 30):
+            timer = threading.Timer(0.05, add_lun)
+            timer.start()
+            self.assertTrue(self.store.wait_for_paths([self.lun_dir], 10))
+            timer.join()
+
+    def test_timeout(self):
+        self.assertFalse(self.store.wait_for_paths([self.lun_dir], 0.05))
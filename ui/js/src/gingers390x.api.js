@@ -120,16 +120,6 @@ var gingers390x = {
     });
   },
 
-  listNetworks: function(suc, err) {
-    wok.requestJSON({
-      url: 'plugins/gingers390x/nwdevices?_configured=false',
-      type: 'GET',
-      contentType: 'application/json',
-      dataType: 'json',
-      success: suc,
-      error: err
-    });
-  },
   listNetworksOSA: function(device,suc, err) {
     wok.requestJSON({
       url: 'plugins/gingers390x/nwdevices/'+ device,
@@ -169,11 +159,12 @@ var gingers390x = {
       error: err
     });
   },
-listFCPluns: function(suc, err) {
+listFCPluns: function(filters, suc, err) {
     wok.requestJSON({
-      url: 'plugins/gingers390x/fcluns?type=disk&configured=false',
+      url: 'plugins/gingers390x/fcluns',
       type: 'GET',
       contentType: 'application/json',
+      data: filters,
       dataType: 'json',
       success: suc,
       error: function(data) {
@@ -262,32 +253,6 @@ listFCPluns: function(suc, err) {
       error: err
     });
   },
-  listFcpSanAdapter: function(suc, err) {
-    wok.requestJSON({
-      url: 'plugins/gingers390x/storagedevices?_type=zfcp&status=offline',
-      type: 'GET',
-      contentType: 'application/json',
-      dataType: 'json',
-      resend : true,
-      success: suc,
-      error: function(data) {
-        wok.message.error(data.responseJSON.reason);
-      }
-    });
-  },
-  listEckd: function(suc, err) {
-    wok.requestJSON({
-      url: 'plugins/gingers390x/storagedevices?_type=dasd-eckd&status=offline',
-      type: 'GET',
-      contentType: 'application/json',
-      dataType: 'json',
-      resend : true,
-      success: suc,
-      error: function(data) {
-        wok.message.error(data.responseJSON.reason);
-      }
-    });
-  },
   getFcpTapeDevices : function(suc , err){
       wok.requestJSON({
           url : 'plugins/gingers390x/lstapes',
@@ -58,7 +58,7 @@ gingers390x.initBootgrid = function(opts) {
 
   var gridId = opts['gridId'];
 
-  var grid = $('#' + gridId).bootgrid({
+  var settings = {
     selection: true,
     multiSelect: true,
     rowCount: -1,
@@ -74,7 +74,12 @@ gingers390x.initBootgrid = function(opts) {
       iconDown: "fa fa-sort-desc",
       iconUp: "fa fa-sort-asc"
     }
-  }).on("loaded.rs.jquery.bootgrid", function(e) {
+  };
+  if (opts['url']) {
+    $.extend(settings, gingers390x.serverPagingSettings(opts));
+  }
+
+  var grid = $('#' + gridId).bootgrid(settings).on("loaded.rs.jquery.bootgrid", function(e) {
     $('.input-group .glyphicon-search').removeClass('.glyphicon-search').addClass('fa fa-search');
     if ($('#' + gridId).bootgrid('getTotalRowCount') > 0) {
       // This need to be in if block to avoid showing no-record-found
@@ -89,6 +94,79 @@ gingers390x.initBootgrid = function(opts) {
   });
 };
 
+// Settings for grids whose rows are paged by the server: only the rows
+// of the current page are requested, using the _offset and _limit
+// parameters of the collection, and the total row count is read from
+// the X-Total-Count response header. The search phrase and the sorted
+// columns are passed as the _search and _sort parameters, so all the
+// rows of the collection are searched and sorted, using the values
+// returned by the server rather than the formatted cells.
+gingers390x.serverPagingSettings = function(opts) {
+  var request = null;
+  var current = 1;
+  var offset = 0;
+  return {
+    ajax: true,
+    url: opts['url'],
+    rowCount: [25, 50, 100],
+    ajaxSettings: {
+      method: 'GET',
+      cache: false,
+      beforeSend: function(xhr) {
+        request = xhr;
+      },
+      complete: function(xhr) {
+        if (xhr.status >= 400) {
+          gingers390x.hideBootgridLoading(opts);
+          gingers390x.showBootgridData(opts);
+          if ('onError' in opts) {
+            opts['onError'](xhr);
+          }
+        }
+      }
+    },
+    requestHandler: function(params) {
+      var query = $.extend({}, opts['requestParams']);
+      current = params.current;
+      offset = 0;
+      if (params.rowCount > 0) {
+        offset = (params.current - 1) * params.rowCount;
+        query['_offset'] = offset;
+        query['_limit'] = params.rowCount;
+      }
+      if (params.searchPhrase) {
+        query['_search'] = params.searchPhrase;
+      }
+      var sort = $.map(params.sort || {}, function(order, column) {
+        return (order === 'desc' ? '-' : '') + column;
+      });
+      if (sort.length > 0) {
+        query['_sort'] = sort.join(',');
+      }
+      return query;
+    },
+    responseHandler: function(rows) {
+      var total = parseInt(request.getResponseHeader('X-Total-Count'), 10);
+      if ('formatRows' in opts) {
+        rows = opts['formatRows'](rows, offset);
+      }
+      if ('onLoad' in opts) {
+        opts['onLoad'](rows);
+      }
+      return {
+        current: current,
+        rowCount: rows.length,
+        rows: rows,
+        total: isNaN(total) ? rows.length : total
+      };
+    }
+  };
+};
+
+gingers390x.reloadBootgridData = function(opts) {
+  $('#' + opts['gridId']).bootgrid('reload');
+};
+
 gingers390x.loadBootgridData = function(opts, data) {
   gingers390x.clearBootgridData(opts);
   gingers390x.appendBootgridData(opts, data);
@@ -63,7 +63,29 @@ gingers390x.initEckdBootgrid = function(opts) {
 
   opts['headers'] = JSON.stringify(headers);
   opts['loadingMessage'] = opts.bootGridListMsg;
+  opts['url'] = 'plugins/gingers390x/storagedevices';
+  opts['requestParams'] = {
+    _type: 'dasd-eckd',
+    status: 'offline',
+    _fields: 'device,installed_chipids,enabled_chipids'
+  };
+  opts['formatRows'] = gingers390x.eckd.formatRows;
+  opts['onLoad'] = function(rows) {
+    if (rows.length > 0) {
+      gingers390x.eckd.enableActionButton();
+    } else {
+      // This need to be in else block to avoid showing no-record-found
+      // for a second if data is present.
+      gingers390x.hideBootgridLoading(opts);
+      gingers390x.showBootgridData(opts);
+    }
+  };
+  opts['onError'] = function(data) {
+    wok.message.error(data.responseJSON.reason);
+  };
   gingers390x.initHeader(opts);
+  gingers390x.eckd.disableActionButton();
+  gingers390x.showBootgridLoading(opts);
   gingers390x.initBootgrid(opts);
   gingers390x.hideBootgridData(opts); //This will hide  No record found till data is not appended.
 
@@ -78,49 +100,34 @@ gingers390x.initEckdBootgrid = function(opts) {
     gingers390x.initEckdBootGridData(opts);
   });
 
-  gingers390x.initEckdBootGridData(opts);
   gingers390x.initEckdFinish(opts);
 
 };
 
+gingers390x.eckd.formatRows = function(result) {
+  function stringifyNestedObject(key, value) {
+    if (key === "installed_chipids" && typeof value === "object") {
+      value = value.join(',');
+    }
+    if (key === "enabled_chipids" && typeof value === "object") {
+      value = value.join(',');
+    }
+    return value;
+  }
+
+  return JSON.parse(JSON.stringify(result, stringifyNestedObject));
+};
+
 gingers390x.initEckdBootGridData = function(opts) {
 
-  var result = [];
   gingers390x.eckd.disableActionButton();
-  gingers390x.clearBootgridData(opts);
-  gingers390x.clearFilterData();
   opts['loadingMessage'] = opts.bootGridListMsg;
   gingers390x.showBootgridLoading(opts);
 
   gingers390x.hideBootgridData(opts);
 
-  gingers390x.listEckd(function(result) {
-    function stringifyNestedObject(key, value) {
-      if (key === "installed_chipids" && typeof value === "object") {
-        value = value.join(',');
-      }
-      if (key === "enabled_chipids" && typeof value === "object") {
-        value = value.join(',');
-      }
-      return value;
-    }
-
-    stringify_result = JSON.stringify(result, stringifyNestedObject);
-    stringify_result = JSON.parse(stringify_result);
-
-    gingers390x.loadBootgridData(opts, stringify_result);
-
-    if (stringify_result && stringify_result.length > 0) {
-      gingers390x.eckd.enableActionButton();
-    } else {
-      // This need to be in else block to avoid showing no-record-found
-      // for a second if data is present.
-      gingers390x.hideBootgridLoading(opts);
-      gingers390x.showBootgridData(opts);
-    }
-
-  });
-
+  // rows of the current page are requested again by the grid
+  gingers390x.reloadBootgridData(opts);
 };
 
 gingers390x.eckd.validateRowSelection = function(selectedRowIds) {
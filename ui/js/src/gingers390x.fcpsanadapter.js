@@ -57,7 +57,29 @@ gingers390x.initFcpSanAdapterBootgrid = function(opts) {
 
   opts['headers'] = JSON.stringify(headers);
   opts['loadingMessage'] = opts.bootGridListMsg;
+  opts['url'] = 'plugins/gingers390x/storagedevices';
+  opts['requestParams'] = {
+    _type: 'zfcp',
+    status: 'offline',
+    _fields: 'device,installed_chipids'
+  };
+  opts['formatRows'] = gingers390x.fcpsanadapter.formatRows;
+  opts['onLoad'] = function(rows) {
+    if (rows.length > 0) {
+      gingers390x.fcpsanadapter.enableActionButton();
+    } else {
+      // This need to be in else block to avoid showing no-record-found
+      // for a second if data is present.
+      gingers390x.hideBootgridLoading(opts);
+      gingers390x.showBootgridData(opts);
+    }
+  };
+  opts['onError'] = function(data) {
+    wok.message.error(data.responseJSON.reason);
+  };
   gingers390x.initHeader(opts);
+  gingers390x.fcpsanadapter.disableActionButton();
+  gingers390x.showBootgridLoading(opts);
   gingers390x.initBootgrid(opts);
   gingers390x.hideBootgridData(opts);
 
@@ -72,45 +94,31 @@ gingers390x.initFcpSanAdapterBootgrid = function(opts) {
     gingers390x.initFcpSanAdapterBootGridData(opts);
   });
 
-  gingers390x.initFcpSanAdapterBootGridData(opts);
   gingers390x.initFcpSanAdapterFinish(opts);
 
 };
 
+gingers390x.fcpsanadapter.formatRows = function(result) {
+  function stringifyNestedObject(key, value) {
+    if (key === "installed_chipids" && typeof value === "object") {
+      value = value.join(',');
+    }
+    return value;
+  }
+
+  return JSON.parse(JSON.stringify(result, stringifyNestedObject));
+};
+
 gingers390x.initFcpSanAdapterBootGridData = function(opts) {
 
-  var result = [];
   gingers390x.fcpsanadapter.disableActionButton();
-  gingers390x.clearBootgridData(opts);
-  gingers390x.clearFilterData();
   opts['loadingMessage'] = opts.bootGridListMsg;
   gingers390x.showBootgridLoading(opts);
 
   gingers390x.hideBootgridData(opts);
 
-  gingers390x.listFcpSanAdapter(function(result) {
-    function stringifyNestedObject(key, value) {
-      if (key === "installed_chipids" && typeof value === "object") {
-        value = value.join(',');
-      }
-      return value;
-    }
-
-    stringify_result = JSON.stringify(result, stringifyNestedObject);
-    stringify_result = JSON.parse(stringify_result);
-
-    gingers390x.loadBootgridData(opts, stringify_result);
-    if (stringify_result && stringify_result.length > 0) {
-      gingers390x.fcpsanadapter.enableActionButton();
-    } else {
-      // This need to be in else block to avoid showing no-record-found
-      // for a second if data is present.
-      gingers390x.hideBootgridLoading(opts);
-      gingers390x.showBootgridData(opts);
-    }
-
-  });
-
+  // rows of the current page are requested again by the grid
+  gingers390x.reloadBootgridData(opts);
 };
 
 gingers390x.fcpsanadapter.validateRowSelection = function(selectedRowIds) {
@@ -55,8 +55,30 @@ gingers390x.initNetworkBootgrid = function(actionButtonText) {
   }];
 
   opts['headers'] = JSON.stringify(headers);
+  opts['loadingMessage'] = i18n['GS390XNW006E'];
+  opts['url'] = 'plugins/gingers390x/nwdevices';
+  opts['requestParams'] = {
+    _configured: false,
+    _fields: 'name,chpid,card_type,device_ids'
+  };
+  opts['formatRows'] = gingers390x.network.formatRows;
+  opts['onLoad'] = function(rows) {
+    if (rows.length > 0) {
+      gingers390x.enableActionButton();
+    } else {
+      // This need to be in else block to avoid showing no-record-found
+      // for a second if data is present.
+      gingers390x.hideBootgridLoading(opts);
+      gingers390x.showBootgridData(opts);
+    }
+  };
+  opts['onError'] = function(error) {
+    wok.message.error(error.responseJSON.reason, '#alert-modal-nw-container', true);
+  };
 
   gingers390x.initHeader(opts);
+  gingers390x.disableActionButton();
+  gingers390x.showBootgridLoading(opts);
   gingers390x.initBootgrid(opts);
   gingers390x.hideBootgridData(opts); //This will hide  No reaord found till data is not appended.
 
@@ -67,7 +89,6 @@ gingers390x.initNetworkBootgrid = function(actionButtonText) {
     event.preventDefault();
   });
 
-  gingers390x.initNetworkBootGridData(opts);
   gingers390x.finishAction(opts);
 
   $('#network-refresh-btn').on('click', function(event) {
@@ -91,43 +112,26 @@ gingers390x.initNetworkBootgrid = function(actionButtonText) {
   });
 };
 
+gingers390x.network.formatRows = function(result) {
+  function stringifyNestedObject(key, value) {
+    if (key === "device_ids" && typeof value === "object") {
+      value = value.join(',');
+    }
+    return value;
+  }
+
+  return JSON.parse(JSON.stringify(result, stringifyNestedObject));
+};
+
 gingers390x.initNetworkBootGridData = function(opts) {
 
-  var result = [];
   gingers390x.disableActionButton();
-  gingers390x.clearBootgridData(opts);
-  gingers390x.clearFilterData();
   gingers390x.hideBootgridData(opts); //This will hide  No record found till data is not appended.
   opts['loadingMessage'] = i18n['GS390XNW006E'];
   gingers390x.showBootgridLoading(opts);
 
-  gingers390x.listNetworks(function(result) {
-
-    function stringifyNestedObject(key, value) {
-      if (key === "device_ids" && typeof value === "object") {
-        value = value.join(',');
-      }
-      return value;
-    }
-
-    stringify_result = JSON.stringify(result, stringifyNestedObject);
-    stringify_result = JSON.parse(stringify_result);
-
-    gingers390x.loadBootgridData(opts, stringify_result);
-
-    if (stringify_result && stringify_result.length > 0) {
-      gingers390x.enableActionButton();
-    } else {
-      // This need to be in else block to avoid showing no-record-found
-      // for a second if data is present.
-      gingers390x.hideBootgridLoading(opts);
-      gingers390x.showBootgridData(opts);
-    }
-  }, function(error){
-    gingers390x.hideBootgridLoading(opts);
-    gingers390x.showBootgridData(opts);
-    wok.message.error(error.responseJSON.reason, '#alert-modal-nw-container', true);
-  });
+  // rows of the current page are requested again by the grid
+  gingers390x.reloadBootgridData(opts);
 };
 
 gingers390x.enableNetworks = function(opts,osaval) {
@@ -88,6 +88,11 @@
 
   });
 }
+// LUNs listed in the grid, and added by "Add all"
+gingers390x.fcpLunsFilters = {
+  type: 'disk',
+  configured: 'false'
+};
 gingers390x.loadFCPLunsList = function() {
   gingers390x.addFCPActions();
   var opts = [];
@@ -126,11 +131,37 @@ gingers390x.loadFCPLunsList = function() {
     "invisible": true
   }];
   opts['headers'] = JSON.stringify(headers);
+  opts['url'] = 'plugins/gingers390x/fcluns';
+  opts['requestParams'] = $.extend({
+    _fields: 'hbaId,remoteWwpn,lunId,product,controllerSN'
+  }, gingers390x.fcpLunsFilters);
+  opts['formatRows'] = function(result, offset) {
+    for (var i = 0; i < result.length; i++) {
+      result[i]["Srno"] = offset + i;
+    }
+    return result;
+  };
+  opts['onLoad'] = function(rows) {
+    if (rows.length == 0) {
+      gingers390x.showBootgridData(opts);
+      gingers390x.hideBootgridLoading(opts);
+    }
+    gingers390x.enableAllFCPStorageDevicesButtons();
+
+    if (gingers390x.lunsScanStatus) {
+      gingers390x.disablerefreshLunsButton();
+    }
+  };
+  opts['onError'] = function(error) {
+    gingers390x.enableAllFCPStorageDevicesButtons();
+    wok.message.error(error.responseJSON.reason, '#alert-modal-storage-container', true);
+  };
 
   gingers390x.initHeader(opts);
+  gingers390x.disableAllFCPStorageDevicesButtons();
+  gingers390x.showBootgridLoading(opts);
   gingers390x.initBootgrid(opts);
   gingers390x.hideBootgridData(opts);
-  gingers390x.retrieveLunsList();
 
 };
 gingers390x.addFCPActions = function() {
@@ -199,34 +230,10 @@ gingers390x.retrieveLunsList = function() {
   opts['gridId'] = "fcp-luns-table-grid";
   gingers390x.hideBootgridData(opts);
   gingers390x.showBootgridLoading(opts);
-  gingers390x.clearFilterData();
-  gingers390x.clearBootgridData(opts);
   gingers390x.disableAllFCPStorageDevicesButtons();
 
-  gingers390x.listFCPluns(function(result) {
-    var formattedResult = [];
-
-    for (var i = 0; i < result.length; i++) {
-      var lunsDetails = result[i];
-      lunsDetails["Srno"] = i;
-      formattedResult.push(lunsDetails);
-    }
-    gingers390x.loadBootgridData(opts, formattedResult);
-
-    if(formattedResult.length==0){
-      gingers390x.showBootgridData(opts);
-      gingers390x.hideBootgridLoading(opts);
-    }
-    gingers390x.enableAllFCPStorageDevicesButtons();
-
-    if(gingers390x.lunsScanStatus){
-      gingers390x.disablerefreshLunsButton();
-    }
-    }, function(error) {
-      gingers390x.hideBootgridLoading(opts);
-      gingers390x.enableAllFCPStorageDevicesButtons();
-      wok.message.error(error.responseJSON.reason, '#alert-modal-storage-container', true);
-    });
+  // rows of the current page are requested again by the grid
+  gingers390x.reloadBootgridData(opts);
 };
 
 gingers390x.createActionList = function(settings) {
@@ -286,37 +293,43 @@ gingers390x.lunsDiscoveryHandler = function() {
   }, onTaskAccepted);
 };
 gingers390x.addAllhandler = function() {
-  var opts = {};
-  opts['gridId'] = 'fcp-luns-table-grid';
-  var selectedRowDetails = gingers390x.getCurrentRows(opts);
   var rowIndex = 0;
   var failedlLuns = [];
   var successLuns = [];
   var isConfigured = null;
   var lunsDetails = '';
-  var TrackNum = selectedRowDetails.length;
 
-  $.each(selectedRowDetails, function(i, row) {
-    var lunAddDetails = {
-      'hbaId': row['hbaId'],
-      'remoteWwpn': row['remoteWwpn'],
-      'lunId': row['lunId']
+  // the grid only holds the current page, so add every LUN listed with
+  // the filters of the grid, and reload it once all of them are added
+  gingers390x.listFCPluns(gingers390x.fcpLunsFilters, function(selectedRowDetails) {
+    var TrackNum = selectedRowDetails.length;
+    if (TrackNum == 0) {
+      gingers390x.retrieveLunsList();
     }
-    gingers390x.addLuns(lunAddDetails, function(result) {
-      wok.message.success(lunAddDetails.hbaId+':'+lunAddDetails.remoteWwpn+':'+lunAddDetails.lunId+' '+i18n["GS390XFCLN0014E"], '#alert-modal-storage-container');
-      TrackNum = TrackNum - 1;
-      if(TrackNum == 0){
-        ginger.initStorageDevicesGridData();
-      }
-    }, function(result) {
-      wok.message.error(i18n['GS390XFCLN0017E'], '#alert-modal-storage-container');
-      TrackNum = TrackNum - 1;
-      if(TrackNum == 0){
-        ginger.initStorageDevicesGridData();
+
+    $.each(selectedRowDetails, function(i, row) {
+      var lunAddDetails = {
+        'hbaId': row['hbaId'],
+        'remoteWwpn': row['remoteWwpn'],
+        'lunId': row['lunId']
       }
+      gingers390x.addLuns(lunAddDetails, function(result) {
+        wok.message.success(lunAddDetails.hbaId+':'+lunAddDetails.remoteWwpn+':'+lunAddDetails.lunId+' '+i18n["GS390XFCLN0014E"], '#alert-modal-storage-container');
+        TrackNum = TrackNum - 1;
+        if(TrackNum == 0){
+          ginger.initStorageDevicesGridData();
+          gingers390x.retrieveLunsList();
+        }
+      }, function(result) {
+        wok.message.error(i18n['GS390XFCLN0017E'], '#alert-modal-storage-container');
+        TrackNum = TrackNum - 1;
+        if(TrackNum == 0){
+          ginger.initStorageDevicesGridData();
+          gingers390x.retrieveLunsList();
+        }
+      });
     });
   });
-  gingers390x.retrieveLunsList();
 }
 
 gingers390x.disablerefreshLunsButton = function(){